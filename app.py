@@ -2,8 +2,17 @@ import pandas as pd
 import streamlit as st
 import boto3
 import io
-import matplotlib.pyplot as plt
 import os
+import time
+import telemetryTiles
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.figure import Figure
+from lapStore import LapStore
+from s3Cache import FrameStore, S3ObjectCache
+
+# Loaded frames are shared by every session in the process; copy-on-write keeps views independent
+pd.set_option("mode.copy_on_write", True)
 
 # AWS Credentials & S3 Config
 aws_access_key_id = st.secrets["aws_access_key_id"]
@@ -13,132 +22,366 @@ s3_bucket = st.secrets["s3_bucket"]
 
 st.title("F1 Streamlit Dashboard")
 
-# 🔄 Add Refresh Button
-if st.button("🔄 Refresh Data from S3"):
-    st.cache_data.clear()
-    st.experimental_rerun()
-
-# Create S3 client
+# Parallel download settings (override with env vars)
+MAX_WORKERS = int(os.environ.get("F1_LOADER_MAX_WORKERS", "16"))
+# Layout written by transformation.py: 'csv' or 'parquet' (partitioned as column=value/)
+TRANSFORMED_FORMAT = os.environ.get("F1_TRANSFORMED_FORMAT", "csv")
+# Local copy of transformed objects, reused across restarts and refreshed by ETag
+CACHE_DIR = os.environ.get("F1_CACHE_DIR", os.path.expanduser("~/.cache/f1_dashboard"))
+# Memory ceiling for the shared in-process frame cache, and how many joined sessions to keep
+FRAME_CACHE_MB = int(os.environ.get("F1_FRAME_CACHE_MB", "1024"))
+LAP_STORE_SESSIONS = int(os.environ.get("F1_LAP_STORE_SESSIONS", "8"))
+# Rendered chart PNGs kept per process (least recently used are evicted first)
+CHART_CACHE_ENTRIES = int(os.environ.get("F1_CHART_CACHE_ENTRIES", "256"))
+# Telemetry tile levels written by transformation.py (TELEMETRY_TILE_LEVELS) and how many points a
+# telemetry chart aims to draw; the level is picked so a window never needs more than ~4x that
+TELEMETRY_LEVELS = [int(n) for n in os.environ.get("F1_TELEMETRY_TILE_LEVELS", "512,2048,8192").split(",")]
+TELEMETRY_POINTS = int(os.environ.get("F1_TELEMETRY_POINTS", "400"))
+
+# Create S3 client (connection pool sized to the worker pool so threads don't queue on sockets)
 s3 = boto3.client(
     "s3",
     aws_access_key_id=aws_access_key_id,
     aws_secret_access_key=aws_secret_access_key,
-    region_name=aws_region
+    region_name=aws_region,
+    config=Config(max_pool_connections=MAX_WORKERS * 4)
 )
 
 # --------- Step 1: Load Data from S3 ---------
-@st.cache_data
-def load_all_data():
-    data = {}
-
-    def load_from_prefix(prefix):
-        dfs = []
-        res = s3.list_objects_v2(Bucket=s3_bucket, Prefix=prefix)
-        for obj in res.get('Contents', []):
-            key = obj['Key']
-            if key.endswith('.csv'):
-                file = s3.get_object(Bucket=s3_bucket, Key=key)
-                df = pd.read_csv(io.BytesIO(file['Body'].read()))
-                dfs.append(df)
-        return pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
-
-    data['meetings'] = load_from_prefix("transformed_data/meetings_transformed/")
-    data['sessions'] = load_from_prefix("transformed_data/sessions_transformed/")
-    data['drivers'] = load_from_prefix("transformed_data/drivers_transformed/")
-    data['laps'] = load_from_prefix("transformed_data/laps_transformed/")
-
-    return data
+DATASET_PREFIXES = {
+    "meetings": "transformed_data/meetings_transformed/",
+    "sessions": "transformed_data/sessions_transformed/",
+    "drivers": "transformed_data/drivers_transformed/",
+    "laps": "transformed_data/laps_transformed/",
+    "sector_stats": "transformed_data/sector_stats/",
+    "car_data_tiles": "transformed_data/telemetry_tiles/",
+    "location_tiles": "transformed_data/telemetry_tiles/"
+}
+PARTITION_COLUMNS = {
+    "meetings": "meeting_key",
+    "sessions": "meeting_key",
+    "drivers": "session_key",
+    "laps": "session_key",
+    "sector_stats": "session_key",
+    "car_data_tiles": "session_key",
+    "location_tiles": "session_key"
+}
+# Only the columns the dashboard actually uses are read
+DATASET_COLUMNS = {
+    "meetings": ["meeting_key", "meeting_name"],
+    "sessions": ["session_key", "meeting_key", "session_type", "session_name"],
+    "drivers": ["session_key", "driver_number", "full_name"],
+    "laps": ["session_key", "driver_number", "lap_number",
+             "duration_sector_1", "duration_sector_2", "duration_sector_3"],
+    "sector_stats": ["session_key", "driver_number", "sector", "lap_number", "duration",
+                     "p50", "p85", "p95", "delta_from_p85", "is_slow"],
+    "car_data_tiles": ["date", "samples", "speed_min", "speed_max", "speed_mean", "rpm_min", "rpm_max", "rpm_mean",
+                       "throttle_min", "throttle_max", "throttle_mean", "brake_max", "brake_mean",
+                       "n_gear_min", "n_gear_max"],
+    "location_tiles": ["date", "samples", "x_mean", "y_mean"]
+}
+DATA_FILE_SUFFIX = ".parquet" if TRANSFORMED_FORMAT == "parquet" else ".csv"
+
+def partition_prefix(name, value):
+    prefix = DATASET_PREFIXES[name]
+    if TRANSFORMED_FORMAT == "parquet":
+        return f"{prefix}{PARTITION_COLUMNS[name]}={value}/"
+    # CSV files mirror the raw layout, which already nests by meeting/session key
+    return f"{prefix}{value}/"
+
+@st.cache_resource
+def get_file_executor():
+    # One bounded pool, shared across reruns, does all listing and downloads
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+@st.cache_resource
+def get_frame_store():
+    # Process-wide: frames persist across reruns and are refreshed incrementally
+    return FrameStore(S3ObjectCache(s3, s3_bucket, CACHE_DIR, get_file_executor()), FRAME_CACHE_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_lap_store():
+    # Joined and indexed views over the frame store's frames, rebuilt only after a refresh
+    return LapStore(LAP_STORE_SESSIONS)
+
+def figure_png(fig):
+    # Figures are built without pyplot, so nothing registers them globally; free them once encoded
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    fig.clear()
+    return buffer.getvalue()
+
+# Charts are keyed by (session, version, driver, sector); the underscored frames are not hashed,
+# the SessionLaps version changes whenever its data is rebuilt after a refresh
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def render_sector_chart(session_key, version, driver, sector, sector_label, _driver_laps_df):
+    driver_laps_df = _driver_laps_df
+    p85_value = driver_laps_df["p85"].iloc[0]
+    slow_laps_df = driver_laps_df[driver_laps_df["is_slow"]]
+
+    fig = Figure(figsize=(10, 5))
+    ax = fig.subplots()
+
+    # Plot all laps
+    ax.plot(driver_laps_df["lap_number"], driver_laps_df["duration"], label="Sector Time", color="blue", marker="o")
+
+    # Highlight slow laps
+    ax.scatter(slow_laps_df["lap_number"], slow_laps_df["duration"], color="red", label="Slow Laps")
+
+    # Add 85th percentile line
+    ax.axhline(y=p85_value, color="orange", linestyle="--", label=f"85th Percentile ({p85_value:.2f}s)")
+
+    # Format
+    ax.set_title(f"{driver} - {sector_label}")
+    ax.set_xlabel("Lap Number")
+    ax.set_ylabel("Sector Duration (s)")
+    ax.set_xticks(range(0, int(driver_laps_df["lap_number"].max()) + 1, 10))
+    ax.set_yticks(range(0, int(driver_laps_df["duration"].max()) + 5, 5))
+    ax.legend()
+    ax.grid(True)
+    return figure_png(fig)
+
+# Telemetry charts are keyed by the tile level and window as well; a window only ever holds a
+# bounded number of buckets, so rendering costs the same for a sprint and a 2-hour race
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def render_telemetry_chart(session_key, version, driver, channel, channel_label, buckets, window, _tiles):
+    tiles = _tiles
+    fig = Figure(figsize=(10, 4))
+    ax = fig.subplots()
+
+    # Shaded min..max band keeps the spikes each bucket averaged away; the line is the bucket mean
+    if f"{channel}_min" in tiles and f"{channel}_max" in tiles:
+        ax.fill_between(tiles["date"], tiles[f"{channel}_min"], tiles[f"{channel}_max"],
+                        color="blue", alpha=0.2, step="post", label="Min-max")
+    line = f"{channel}_mean" if f"{channel}_mean" in tiles else f"{channel}_max"
+    ax.step(tiles["date"], tiles[line], where="post", color="blue", label=line.rsplit("_", 1)[1].capitalize())
+
+    ax.set_title(f"{driver} - {channel_label}")
+    ax.set_xlabel("Time (UTC)")
+    ax.set_ylabel(channel_label)
+    ax.legend()
+    ax.grid(True)
+    return figure_png(fig)
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def render_track_map(session_key, version, driver, buckets, window, _tiles):
+    tiles = _tiles
+    fig = Figure(figsize=(5, 5))
+    ax = fig.subplots()
+    ax.plot(tiles["x_mean"], tiles["y_mean"], color="gray", linewidth=1)
+    if not tiles.empty:
+        ax.scatter(tiles["x_mean"].iloc[[0, -1]], tiles["y_mean"].iloc[[0, -1]], color=["green", "red"], zorder=3)
+    ax.set_title(f"{driver} - position")
+    ax.set_aspect("equal")
+    ax.axis("off")
+    return figure_png(fig)
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def render_grid_heatmap(session_key, version, sector_labels, _heatmap):
+    heatmap = _heatmap
+    fig = Figure(figsize=(8, max(4, 0.35 * len(heatmap))))
+    ax = fig.subplots()
+    image = ax.imshow(heatmap.to_numpy(dtype=float), cmap="Reds", aspect="auto")
+    ax.set_xticks(range(len(sector_labels)))
+    ax.set_xticklabels(sector_labels)
+    ax.set_yticks(range(len(heatmap)))
+    ax.set_yticklabels(heatmap.index)
+    ax.set_title("Laps slower than the driver's 85th percentile")
+    fig.colorbar(image, ax=ax, label="Slow laps")
+    return figure_png(fig)
+
+def timed_load(name, prefixes, timings):
+    start = time.perf_counter()
+    df, stats = get_frame_store().load(name, prefixes, DATASET_COLUMNS[name], DATA_FILE_SUFFIX)
+    timings[name] = {**stats, "rows": len(df), "seconds": round(time.perf_counter() - start, 3)}
+    print(f"⏱️ Loaded {name}: {stats['files']} files ({stats['downloaded']} downloaded), "
+          f"{len(df)} rows in {timings[name]['seconds']}s")
+    return df
+
+def load_parallel(requests):
+    # A small outer pool runs the datasets side by side on the shared file pool
+    data, timings = {}, {}
+    with ThreadPoolExecutor(max_workers=len(requests)) as dataset_executor:
+        futures = {
+            name: dataset_executor.submit(timed_load, name, prefixes, timings)
+            for name, prefixes in requests.items()
+        }
+        for name, future in futures.items():
+            data[name] = future.result()
+    return data, timings
+
+def load_dimensions():
+    # Only the small meetings/sessions tables are loaded up front
+    return load_parallel({
+        "meetings": [DATASET_PREFIXES["meetings"]],
+        "sessions": [DATASET_PREFIXES["sessions"]]
+    })
+
+def load_session_laps(session_key):
+    # Kept per session_key in the frame store, so each race is fetched once, on first selection
+    return load_parallel({
+        "drivers": [partition_prefix("drivers", session_key)],
+        "laps": [partition_prefix("laps", session_key)],
+        "sector_stats": [partition_prefix("sector_stats", session_key)]
+    })
+
+def load_telemetry_tiles(session_key, driver_number, buckets):
+    # One level of one driver's tiles; every (driver, level) file is a separate frame store entry
+    data, timings = load_parallel({
+        name: [f"{partition_prefix(name, session_key)}{driver_number}/{name[:-len('_tiles')]}_{buckets}{DATA_FILE_SUFFIX}"]
+        for name in ("car_data_tiles", "location_tiles")
+    })
+    return {name: telemetryTiles.prepare(df) for name, df in data.items()}, timings
+
+# 🔄 Add Refresh Button: re-list the bucket and fetch only new or changed objects
+if st.button("🔄 Refresh Data from S3"):
+    with st.spinner("Refreshing from S3..."):
+        summary = get_frame_store().refresh()
+    st.success(f"Refreshed {summary['files']} files: {summary['downloaded']} downloaded, {summary['removed']} removed")
 
 # --------- Step 2: Load Data ---------
 with st.spinner("Loading F1 data..."):
-    data = load_all_data()
+    data, load_timings = load_dimensions()
     meetings_df = data['meetings']
     sessions_df = data['sessions']
-    drivers_df = data['drivers']
-    laps_df = data['laps']
 
 st.success("Data loaded successfully!")
 
 # --------- Step 3: Interactive Dashboard ---------
 st.header("Sector-wise Driver Performance (RACE only)")
 
+dimensions = get_lap_store().dimensions(
+    (load_timings["meetings"]["version"], load_timings["sessions"]["version"]), meetings_df, sessions_df
+)
+
 # --- Select Race ---
-selected_race = st.selectbox("Select Race", meetings_df["meeting_name"].dropna().unique())
+selected_race = st.selectbox("Select Race", dimensions.meeting_names)
 
-# Get meeting_key for selected race
-selected_meeting = meetings_df[meetings_df["meeting_name"] == selected_race]
-if selected_meeting.empty:
+if selected_race not in dimensions.meeting_keys:
     st.warning("No data found for this race.")
     st.stop()
 
-meeting_key = selected_meeting["meeting_key"].values[0]
-
-# --- Filter sessions to only Race session ---
-race_sessions = sessions_df[
-    (sessions_df["meeting_key"] == meeting_key) &
-    (sessions_df["session_type"].str.lower() == "race")
-]["session_key"].unique()
+# --- Race sessions of the meeting ---
+race_session_names = dimensions.races_for(selected_race)
 
-if len(race_sessions) == 0:
+if not race_session_names:
     st.warning("No Race session found for this meeting.")
     st.stop()
 
-# Filter laps only for Race session
-filtered_laps_df = laps_df[laps_df["session_key"].isin(race_sessions)]
-
-# Join with drivers
-filtered_laps_df = filtered_laps_df.merge(drivers_df, on="driver_number", how="left")
+# Sprint weekends have two Race-type sessions; sector stats are computed per session
+session_key = list(race_session_names)[0]
+if len(race_session_names) > 1:
+    session_key = st.selectbox("Select Session", list(race_session_names), format_func=lambda k: race_session_names[k])
+
+# Fetch laps, drivers and precomputed sector stats for the selected Race session only
+with st.spinner("Loading race laps..."):
+    session_data, session_timings = load_session_laps(int(session_key))
+    session_laps = get_lap_store().session(
+        int(session_key),
+        tuple(session_timings[name]["version"] for name in ("drivers", "laps", "sector_stats")),
+        session_data['drivers'], session_data['laps'], session_data['sector_stats']
+    )
+    load_timings.update({f"{name} ({session_key})": t for name, t in session_timings.items()})
+
+with st.expander("⏱️ Load timings"):
+    st.dataframe(pd.DataFrame(load_timings).T, use_container_width=True)
+    cache_stats = get_frame_store().stats()
+    st.caption(
+        f"Frame cache: {cache_stats['entries']} entries, {cache_stats['bytes'] / 1e6:.1f} MB of {FRAME_CACHE_MB} MB, "
+        f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, {cache_stats['evictions']} evictions"
+    )
 
-# --- Select Driver ---
-available_drivers = filtered_laps_df["full_name"].dropna().unique()
-selected_driver = st.selectbox("Select Driver", available_drivers)
-
-# --- Select Sector ---
-sector_options = ["duration_sector_1", "duration_sector_2", "duration_sector_3"]
 sector_labels = {"duration_sector_1": "Sector 1", "duration_sector_2": "Sector 2", "duration_sector_3": "Sector 3"}
-selected_sector = st.selectbox("Select Sector", sector_options, format_func=lambda x: sector_labels[x])
 
-# --- Filter by Driver ---
-driver_laps_df = filtered_laps_df[filtered_laps_df["full_name"] == selected_driver].copy()
+view_mode = st.radio("View", ["Driver detail", "Whole grid", "Telemetry"], horizontal=True)
 
-# Ensure numeric lap numbers and drop any rows missing needed data
-driver_laps_df['lap_number'] = pd.to_numeric(driver_laps_df['lap_number'], errors='coerce')
-driver_laps_df = driver_laps_df.dropna(subset=['lap_number', selected_sector])
+if view_mode == "Whole grid":
+    start = time.perf_counter()
+    grid = session_laps.sector_grid()
+    grid_ms = (time.perf_counter() - start) * 1000
 
-# Sort by lap number
-driver_laps_df = driver_laps_df.sort_values("lap_number")
+    if grid.empty:
+        st.warning("No sector stats found for this session yet. They are built by the transformation job.")
+        st.stop()
 
-# Deduplicate to ensure one row per lap and sector to avoid duplicate slow lap entries
-driver_laps_df = driver_laps_df.drop_duplicates(subset=["lap_number", selected_sector])
+    st.subheader("Whole-grid sector comparison")
+    st.caption(f"{len(grid)} driver-sector groups computed in {grid_ms:.1f} ms")
 
-# Calculate 85th percentile & delta
-p85_value = driver_laps_df[selected_sector].quantile(0.85)
-driver_laps_df["delta_from_p85"] = driver_laps_df[selected_sector] - p85_value
-driver_laps_df["is_slow"] = driver_laps_df["delta_from_p85"] > 0
+    # One row per driver, one column group per sector; click a header to sort
+    comparison = grid.assign(sector=grid["sector"].map(sector_labels)).pivot(
+        index="full_name", columns="sector", values=["p85", "slow_laps", "total_slow_delta"]
+    )
+    comparison = comparison.swaplevel(axis=1).sort_index(axis=1)
+    comparison.columns = [f"{sector} {metric}" for sector, metric in comparison.columns]
+    st.dataframe(comparison.round(3), use_container_width=True)
 
-# Plot with slow laps highlighted
-fig, ax = plt.subplots(figsize=(10, 5))
+    heatmap = grid.pivot(index="full_name", columns="sector", values="slow_laps").reindex(columns=list(sector_labels))
+    st.image(render_grid_heatmap(int(session_key), session_laps.version, list(sector_labels.values()), heatmap))
+    st.stop()
 
-# Plot all laps
-ax.plot(driver_laps_df["lap_number"], driver_laps_df[selected_sector], label="Sector Time", color="blue", marker="o")
+if view_mode == "Telemetry":
+    telemetry_driver = st.selectbox("Select Driver", session_laps.driver_names)
+    driver_numbers = session_laps.driver_numbers.get(telemetry_driver, [])
+    channel_labels = {"speed": "Speed (km/h)", "rpm": "RPM", "throttle": "Throttle (%)", "brake": "Brake (%)",
+                      "n_gear": "Gear"}
+    channel = st.selectbox("Channel", list(channel_labels), format_func=lambda x: channel_labels[x])
+    if not driver_numbers:
+        st.warning("No telemetry found for this driver yet.")
+        st.stop()
+    driver_number = int(driver_numbers[0])
+
+    # The coarsest level is always loaded: it spans the whole session and sets the slider range
+    with st.spinner("Loading telemetry..."):
+        tiles, tile_timings = load_telemetry_tiles(int(session_key), driver_number, min(TELEMETRY_LEVELS))
+    overview = tiles["car_data_tiles"]
+    if overview.empty:
+        st.warning("No telemetry tiles found for this driver yet. They are built by the transformation job.")
+        st.stop()
+
+    first, last = overview["date"].iloc[0], overview["date"].iloc[-1]
+    session_minutes = max(1, int((last - first).total_seconds() // 60) + 1)
+    window = st.slider("Window (minutes from the first sample)", 0, session_minutes, (0, session_minutes))
+    start, end = first + pd.Timedelta(minutes=window[0]), first + pd.Timedelta(minutes=window[1])
+
+    # Zooming in switches to a finer level, so the window keeps roughly TELEMETRY_POINTS buckets
+    buckets = telemetryTiles.pick_level(TELEMETRY_LEVELS, (window[1] - window[0]) / session_minutes, TELEMETRY_POINTS)
+    if buckets != min(TELEMETRY_LEVELS):
+        with st.spinner("Loading telemetry..."):
+            tiles, tile_timings = load_telemetry_tiles(int(session_key), driver_number, buckets)
+    version = tuple(tile_timings[name]["version"] for name in ("car_data_tiles", "location_tiles"))
+
+    car_data = telemetryTiles.in_window(tiles["car_data_tiles"], start, end)
+    st.image(render_telemetry_chart(
+        int(session_key), version, telemetry_driver, channel, channel_labels[channel], buckets, window, car_data
+    ))
+    st.caption(f"{len(car_data)} points from {int(car_data['samples'].sum())} samples "
+               f"({buckets} buckets per session)")
+
+    location = telemetryTiles.in_window(tiles["location_tiles"], start, end)
+    if not location.empty:
+        st.image(render_track_map(int(session_key), version, telemetry_driver, buckets, window, location))
+    st.stop()
 
-# Highlight slow laps
-slow_laps_df = driver_laps_df[driver_laps_df["is_slow"]]
-ax.scatter(slow_laps_df["lap_number"], slow_laps_df[selected_sector], color="red", label="Slow Laps")
+# --- Select Driver ---
+selected_driver = st.selectbox("Select Driver", session_laps.driver_names)
+
+# --- Select Sector ---
+sector_options = list(sector_labels)
+selected_sector = st.selectbox("Select Sector", sector_options, format_func=lambda x: sector_labels[x])
 
-# Add 85th percentile line
-ax.axhline(y=p85_value, color="orange", linestyle="--", label=f"85th Percentile ({p85_value:.2f}s)")
+# --- Look up the precomputed, deduplicated and lap-sorted sector times for the driver ---
+driver_laps_df = session_laps.driver_sector_stats(selected_driver, selected_sector)
 
-# Format
-ax.set_title(f"{selected_driver} - {sector_labels[selected_sector]}")
-ax.set_xlabel("Lap Number")
-ax.set_ylabel("Sector Duration (s)")
-ax.set_xticks(range(0, int(driver_laps_df["lap_number"].max()) + 1, 10))
-ax.set_yticks(range(0, int(driver_laps_df[selected_sector].max()) + 5, 5))
-ax.legend()
-ax.grid(True)
+if driver_laps_df.empty:
+    st.warning("No sector stats found for this driver yet. They are built by the transformation job.")
+    st.stop()
 
-st.pyplot(fig)
+# Plot with slow laps highlighted; served from the chart cache after the first render
+st.image(render_sector_chart(
+    int(session_key), session_laps.version, selected_driver, selected_sector,
+    sector_labels[selected_sector], driver_laps_df
+))
+slow_laps_df = driver_laps_df[driver_laps_df["is_slow"]]
 
 # --- Display Slow Laps Table ---
 st.subheader("Laps Slower than 85th Percentile")
@@ -146,10 +389,10 @@ st.subheader("Laps Slower than 85th Percentile")
 if slow_laps_df.empty:
     st.info("No slow laps detected (above 85th percentile).")
 else:
-    display_cols = ["lap_number", selected_sector, "delta_from_p85"]
+    display_cols = ["lap_number", "duration", "delta_from_p85"]
     slow_laps_display = slow_laps_df[display_cols].rename(columns={
         "lap_number": "Lap Number",
-        selected_sector: "Sector Time (s)",
+        "duration": "Sector Time (s)",
         "delta_from_p85": "Delta from P85 (s)"
     })
     slow_laps_display["Sector Time (s)"] = slow_laps_display["Sector Time (s)"].round(3)
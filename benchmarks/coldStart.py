@@ -0,0 +1,139 @@
+"""Measure import time and first-invocation latency of each Lambda handler in a fresh interpreter.
+
+Usage: python benchmarks/coldStart.py [--repeat 5] [--handlers transformation,compaction]
+
+Every measurement runs in a new Python process with F1_STORAGE_BACKEND=memory and the
+synthetic OpenF1 season, as a cold Lambda container would. It reports the median
+module import time, the median latency of the first invocation, and whether pandas
+ended up loaded. "transformation" receives only meetings, sessions and drivers
+files (the plain CSV path). "transformation_laps" also receives a laps file, which
+needs pandas for the sector stats. The interpreter's own start-up time is reported
+for reference.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+HANDLERS = [
+    "meetingIdIngestion", "sessionKeyIngestion", "driverListIngestion", "endPointsIngestion",
+    "transformation", "transformation_laps", "compaction"
+]
+
+
+def records_event(bodies):
+    return {"Records": [{"messageId": str(i), "body": json.dumps(body)} for i, body in enumerate(bodies)]}
+
+
+def prepare(name, module):
+    # Wires the synthetic API / stored inputs and returns the event for the first invocation
+    import metrics
+    from rawCodec import put_records
+    from syntheticSeason import SyntheticSeason
+
+    season = SyntheticSeason(meetings=1, sessions_per_meeting=3)
+    if hasattr(module, "http"):
+        module.http = metrics.InstrumentedHttp(season)
+    if name == "meetingIdIngestion":
+        return {}
+    if name == "sessionKeyIngestion":
+        return records_event([{"meeting_key": 1250}])
+    if name == "driverListIngestion":
+        return records_event([{"meeting_key": 1250, "session_key": 9002}])
+    if name == "endPointsIngestion":
+        return records_event([{"session_key": 9002, "driver_number": 1}])
+    if name.startswith("transformation"):
+        raw_keys = [
+            put_records(module.s3, module.S3_BUCKET, "raw_data/meetings_raw/2025_Synthetic_1250",
+                        season.records("meetings", {})[1:]),
+            put_records(module.s3, module.S3_BUCKET, "raw_data/sessions_raw/1250/9002",
+                        season.records("sessions", {"meeting_key": "1250"})[2:]),
+            put_records(module.s3, module.S3_BUCKET, "raw_data/drivers_raw/9002/drivers_2025-03-16",
+                        season.records("drivers", {"session_key": "9002"}))
+        ]
+        if name == "transformation_laps":
+            raw_keys.append(put_records(module.s3, module.S3_BUCKET, "raw_data/laps_raw/9002/1/laps_2025-03-16",
+                                        season.records("laps", {"session_key": "9002", "driver_number": "1"})))
+        return records_event([{"raw_keys": raw_keys}])
+    if name == "compaction":
+        unit = "transformed_data/meetings_transformed/"
+        for i in range(2):
+            module.s3.put_object(Bucket=module.S3_BUCKET, Key=f"{unit}2025_Synthetic_{1250 + i}.csv",
+                                 Body=f"meeting_key,meeting_name\n{1250 + i},Synthetic {i}\n")
+        return records_event([{"units": [unit]}])
+    raise ValueError(name)
+
+
+def child(name):
+    # Runs in the fresh interpreter; prints one JSON result line
+    os.environ["F1_STORAGE_BACKEND"] = "memory"
+    os.environ["METRICS_ENABLED"] = "0"
+    sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "lambdaFunctions"))
+    sys.path.insert(0, BENCHMARKS_DIR)
+    module_name = name.split("_")[0]
+
+    start = time.perf_counter()
+    module = __import__(module_name)
+    import_ms = (time.perf_counter() - start) * 1000
+    pandas_after_import = "pandas" in sys.modules
+
+    event = prepare(name, module)
+    output = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, output
+    try:
+        start = time.perf_counter()
+        module.lambda_handler(event, None)
+        first_ms = (time.perf_counter() - start) * 1000
+    finally:
+        sys.stdout = stdout
+        output.close()
+    print(json.dumps({
+        "import_ms": import_ms,
+        "first_ms": first_ms,
+        "pandas_at_import": pandas_after_import,
+        "pandas_after_call": "pandas" in sys.modules
+    }))
+
+
+def run_child(name):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--handlers", default=",".join(HANDLERS))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    interpreter = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        interpreter.append((time.perf_counter() - start) * 1000)
+    print(f"interpreter start-up: {statistics.median(interpreter):.0f} ms (median of {args.repeat})\n")
+
+    print(f"{'handler':<22} {'import ms':>10} {'first call ms':>14} {'cold total ms':>14} {'pandas loaded':>14}")
+    for name in args.handlers.split(","):
+        results = [run_child(name) for _ in range(args.repeat)]
+        import_ms = statistics.median(r["import_ms"] for r in results)
+        first_ms = statistics.median(r["first_ms"] for r in results)
+        pandas = "at import" if results[0]["pandas_at_import"] else (
+            "on call" if results[0]["pandas_after_call"] else "no"
+        )
+        print(f"{name:<22} {import_ms:>10.0f} {first_ms:>14.0f} {import_ms + first_ms:>14.0f} {pandas:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare the CSV and Parquet transformed-laps layouts as the dashboard reads them.
+
+Usage: python benchmarks/csvVsParquet.py [--sessions 24] [--drivers 20] [--laps 57]
+
+Builds synthetic OpenF1-shaped lap records, writes them the way transformation.py
+does in each OUTPUT_FORMAT (one file per driver per session), then reads every file
+back with the dashboard's column projection and reports bytes read, parse time,
+peak traced memory and the resident size of the loaded frame.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+# The lambda modules create their clients at import; keep them offline
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+from transformation import SCHEMAS, apply_schema  # noqa: E402
+from transformedData import PARQUET_COMPRESSION  # noqa: E402
+
+LAP_COLUMNS = ["session_key", "driver_number", "lap_number",
+               "duration_sector_1", "duration_sector_2", "duration_sector_3"]
+
+
+def synthetic_laps(session_key, driver_number, n_laps, rng):
+    start = datetime(2025, 3, 16, 4, 3, tzinfo=timezone.utc)
+    laps = []
+    for lap_number in range(1, n_laps + 1):
+        sectors = [round(rng.uniform(25, 35), 3) for _ in range(3)]
+        laps.append({
+            "meeting_key": 1254,
+            "session_key": session_key,
+            "driver_number": driver_number,
+            "lap_number": lap_number,
+            "date_start": (start + timedelta(seconds=92 * lap_number)).isoformat(),
+            "duration_sector_1": sectors[0],
+            "duration_sector_2": sectors[1],
+            "duration_sector_3": sectors[2],
+            "i1_speed": rng.randint(250, 320),
+            "i2_speed": rng.randint(250, 320),
+            "is_pit_out_lap": lap_number == 1,
+            "lap_duration": round(sum(sectors), 3),
+            "segments_sector_1": [2049, 2049, 2051, 2049],
+            "segments_sector_2": [2049, 2049, 2049, 2051],
+            "segments_sector_3": [2049, 2048, 2049, 2049],
+            "st_speed": rng.randint(280, 340)
+        })
+    return laps
+
+
+def build_files(args):
+    rng = random.Random(42)
+    csv_files, parquet_files = [], []
+    for session_key in range(9000, 9000 + args.sessions):
+        for driver_number in range(1, args.drivers + 1):
+            records = synthetic_laps(session_key, driver_number, args.laps, rng)
+
+            csv_buffer = io.StringIO()
+            pd.DataFrame(records).to_csv(csv_buffer, index=False)
+            csv_files.append(csv_buffer.getvalue().encode("utf-8"))
+
+            parquet_buffer = io.BytesIO()
+            df = apply_schema(pd.DataFrame(records), SCHEMAS["laps_raw"])
+            df.to_parquet(parquet_buffer, index=False, compression=PARQUET_COMPRESSION)
+            parquet_files.append(parquet_buffer.getvalue())
+    return csv_files, parquet_files
+
+
+def measure(name, files, read_one):
+    tracemalloc.start()
+    start = time.perf_counter()
+    df = pd.concat([read_one(body) for body in files], ignore_index=True)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "format": name,
+        "files": len(files),
+        "rows": len(df),
+        "bytes_read": sum(len(body) for body in files),
+        "parse_seconds": round(elapsed, 3),
+        "peak_traced_mb": round(peak / 2**20, 2),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 2**20, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=24)
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=57)
+    args = parser.parse_args()
+
+    csv_files, parquet_files = build_files(args)
+    results = [
+        measure("csv", csv_files,
+                lambda body: pd.read_csv(io.BytesIO(body), usecols=lambda c: c in LAP_COLUMNS)),
+        measure("parquet", parquet_files,
+                lambda body: pd.read_parquet(io.BytesIO(body), columns=LAP_COLUMNS))
+    ]
+    print(pd.DataFrame(results).set_index("format").to_string())
+
+
+if __name__ == "__main__":
+    main()
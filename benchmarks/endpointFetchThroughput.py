@@ -0,0 +1,116 @@
+"""Measure endPointsIngestion throughput in (session, driver, endpoint) items per Lambda-second.
+
+Usage: python benchmarks/endpointFetchThroughput.py [--drivers 20] [--http-latency 0.15] [--s3-latency 0.04]
+
+The OpenF1 API and S3 are replaced by stand-ins that sleep for a fixed latency, so
+the numbers isolate how well the handler overlaps I/O. Each run uses one SQS batch
+of (session, driver) messages and compares a sequential configuration (one request
+in flight) against the concurrent limits given on the command line, in both the
+per-driver and the per-session (FETCH_MODE=session) fetch modes.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+# The lambda modules create their clients at import; keep them offline
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+import endPointsIngestion  # noqa: E402
+from storageBackends import InMemoryS3  # noqa: E402
+
+
+class SlowResponse:
+    def __init__(self, payload):
+        self.status = 200
+        self.data = payload
+        self.headers = {}
+
+    def stream(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def release_conn(self):
+        pass
+
+
+class SlowHttp:
+    def __init__(self, latency, drivers):
+        self.latency = latency
+        self.calls = 0
+        self.driver_payload = json.dumps(
+            [{"session_key": 9999, "driver_number": 1, "value": i} for i in range(200)]
+        ).encode()
+        self.session_payload = json.dumps(
+            [{"session_key": 9999, "driver_number": d, "value": i} for d in range(1, drivers + 1) for i in range(200)]
+        ).encode()
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SlowResponse(self.driver_payload if "driver_number=" in url else self.session_payload)
+
+
+class SlowS3(InMemoryS3):
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def put_object(self, **kwargs):
+        time.sleep(self.latency)
+        return super().put_object(**kwargs)
+
+
+class NullSqs:
+    def send_message_batch(self, QueueUrl, Entries):
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+def run(args, http_limit, s3_limit, mode):
+    endPointsIngestion.http = SlowHttp(args.http_latency, args.drivers)
+    endPointsIngestion.FETCH_MODE = mode
+    endPointsIngestion.s3 = SlowS3(args.s3_latency)
+    endPointsIngestion.sqs = NullSqs()
+    endPointsIngestion.HTTP_MAX_IN_FLIGHT = http_limit
+    endPointsIngestion.S3_MAX_IN_FLIGHT = s3_limit
+
+    event = {"Records": [
+        {"body": json.dumps({"session_key": 9999, "driver_number": driver})}
+        for driver in range(1, args.drivers + 1)
+    ]}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        endPointsIngestion.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    items = args.drivers * len(endPointsIngestion.ENDPOINTS)
+    return items, elapsed, endPointsIngestion.http.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--http-latency", type=float, default=0.15)
+    parser.add_argument("--s3-latency", type=float, default=0.04)
+    parser.add_argument("--http-limit", type=int, default=endPointsIngestion.HTTP_MAX_IN_FLIGHT)
+    parser.add_argument("--s3-limit", type=int, default=endPointsIngestion.S3_MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    results = {}
+    runs = [
+        ("sequential", 1, 1, "driver"),
+        ("concurrent", args.http_limit, args.s3_limit, "driver"),
+        ("session", args.http_limit, args.s3_limit, "session")
+    ]
+    for name, http_limit, s3_limit, mode in runs:
+        items, elapsed, calls = run(args, http_limit, s3_limit, mode)
+        results[name] = items / elapsed
+        print(f"{name:>10}: mode={mode} http={http_limit} s3={s3_limit} -> {items} items, {calls} API calls "
+              f"in {elapsed:.2f}s = {results[name]:.1f} items per Lambda-second")
+    for name in ("concurrent", "session"):
+        print(f"{name} speedup over sequential: {results[name] / results['sequential']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Run the whole ingestion -> transformation -> compaction -> dashboard load chain offline.
+
+Usage: python benchmarks/pipelineEndToEnd.py [--backend memory|local] [--meetings 3] [--drivers 20]
+       [--telemetry-rows 2000] [--http-latency 0] [--output-format csv|parquet] [--metrics-log FILE]
+
+The Lambdas run unchanged against storageBackends (F1_STORAGE_BACKEND=memory or local)
+with a synthetic OpenF1 season as their HTTP pool. Each stage drains the queue the
+previous stage filled, in deployment order, and the dashboard's loads run through
+s3Cache at the end. For every stage the run reports invocations, messages,
+throughput, invocation latency percentiles and peak traced memory. The per-stage
+metric lines the Lambdas print are summarized as summarizeMetrics.py would, and can
+be kept with --metrics-log.
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCHMARKS_DIR, "..")
+
+# Dataset prefixes and columns the dashboard reads (app.py)
+DASHBOARD_COLUMNS = {
+    "meetings": ["meeting_key", "meeting_name"],
+    "sessions": ["session_key", "meeting_key", "session_type", "session_name"],
+    "drivers": ["session_key", "driver_number", "full_name"],
+    "laps": ["session_key", "driver_number", "lap_number",
+             "duration_sector_1", "duration_sector_2", "duration_sector_3"],
+    "sector_stats": ["session_key", "driver_number", "sector", "lap_number", "duration", "p85", "is_slow"]
+}
+DASHBOARD_PREFIXES = {
+    "meetings": "transformed_data/meetings_transformed/",
+    "sessions": "transformed_data/sessions_transformed/",
+    "drivers": "transformed_data/drivers_transformed/",
+    "laps": "transformed_data/laps_transformed/",
+    "sector_stats": "transformed_data/sector_stats/"
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["memory", "local"], default="memory")
+    parser.add_argument("--meetings", type=int, default=3)
+    parser.add_argument("--sessions", type=int, default=3, help="sessions per meeting (at most 3)")
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=57)
+    parser.add_argument("--telemetry-rows", type=int, default=2000, help="car_data/location rows per driver")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds per synthetic API request")
+    parser.add_argument("--output-format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--metrics-log", help="also write the Lambdas' metric lines to this file")
+    return parser.parse_args()
+
+
+class StageReport:
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.messages = 0
+        self.peak_bytes = 0
+        self.failures = 0
+        self.retried = 0
+
+
+def run_stage(report, handler, events, log_lines):
+    # Lambda output is captured: status prints are dropped, metric lines are kept for the summary
+    for event in events:
+        output = io.StringIO()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                response = handler(event, None)
+            # Messages reported in batchItemFailures would be redelivered by SQS
+            report.retried += len(response.get("batchItemFailures", []))
+        except Exception as e:
+            report.failures += 1
+            print(f"❌ {report.name} invocation failed: {e}")
+        report.latencies.append(time.perf_counter() - start)
+        report.peak_bytes = max(report.peak_bytes, tracemalloc.get_traced_memory()[1])
+        report.messages += len(event.get("Records", []))
+        log_lines.extend(line for line in output.getvalue().splitlines() if '"_aws"' in line)
+
+
+def load_dashboard_data(s3, bucket, cache_dir, transformed_format):
+    # What the dashboard loads on first use: meetings and sessions, then each race's tables
+    from lapStore import Dimensions
+    from s3Cache import FrameStore, S3ObjectCache
+
+    suffix = ".parquet" if transformed_format == "parquet" else ".csv"
+
+    def prefix(name, session_key):
+        if transformed_format == "parquet":
+            return f"{DASHBOARD_PREFIXES[name]}session_key={session_key}/"
+        return f"{DASHBOARD_PREFIXES[name]}{session_key}/"
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        store = FrameStore(S3ObjectCache(s3, bucket, cache_dir, executor))
+        meetings, _ = store.load("meetings", [DASHBOARD_PREFIXES["meetings"]], DASHBOARD_COLUMNS["meetings"], suffix)
+        sessions, _ = store.load("sessions", [DASHBOARD_PREFIXES["sessions"]], DASHBOARD_COLUMNS["sessions"], suffix)
+        dimensions = Dimensions(meetings, sessions)
+        rows = 0
+        for meeting_name in dimensions.meeting_names:
+            for session_key in dimensions.races_for(meeting_name):
+                for name in ("drivers", "laps", "sector_stats"):
+                    df, _ = store.load(name, [prefix(name, session_key)], DASHBOARD_COLUMNS[name], suffix)
+                    rows += len(df)
+    return rows
+
+
+def main():
+    args = parse_args()
+    storage_dir = tempfile.TemporaryDirectory(prefix="f1-pipeline-")
+    # The Lambdas pick their clients and output format at import time
+    os.environ["F1_STORAGE_BACKEND"] = args.backend
+    os.environ["F1_LOCAL_STORAGE_DIR"] = os.path.join(storage_dir.name, "s3")
+    os.environ["OUTPUT_FORMAT"] = args.output_format
+    sys.path.insert(0, os.path.join(REPO_DIR, "lambdaFunctions"))
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, BENCHMARKS_DIR)
+
+    import compaction
+    import driverListIngestion
+    import endPointsIngestion
+    import meetingIdIngestion
+    import metrics
+    import sessionKeyIngestion
+    import transformation
+    from storageBackends import client
+    from summarizeMetrics import format_table, summarize
+    from syntheticSeason import SyntheticSeason
+
+    season = SyntheticSeason(args.meetings, args.sessions, args.drivers, args.laps, args.telemetry_rows,
+                             args.http_latency)
+    for module in (meetingIdIngestion, sessionKeyIngestion, driverListIngestion, endPointsIngestion):
+        module.http = metrics.InstrumentedHttp(season)
+    queues = client('sqs')
+
+    stages = [
+        ("meetingIdIngestion", meetingIdIngestion.lambda_handler, lambda: [{}]),
+        ("sessionKeyIngestion", sessionKeyIngestion.lambda_handler,
+         lambda: queues.drain(meetingIdIngestion.QUEUE_URL)),
+        ("driverListIngestion", driverListIngestion.lambda_handler,
+         lambda: queues.drain(sessionKeyIngestion.SESSION_QUEUE_URL)),
+        ("endPointsIngestion", endPointsIngestion.lambda_handler,
+         lambda: queues.drain(driverListIngestion.DRIVER_ID_QUEUE_URL)),
+        # Every ingestion stage queued the raw keys it wrote for transformation
+        ("transformation", transformation.lambda_handler,
+         lambda: queues.drain(meetingIdIngestion.TRANSFORM_QUEUE_URL)),
+        ("compaction", compaction.lambda_handler, lambda: queues.drain(transformation.COMPACT_QUEUE_URL))
+    ]
+
+    tracemalloc.start()
+    reports, log_lines = [], []
+    total_start = time.perf_counter()
+    for name, handler, events in stages:
+        report = StageReport(name)
+        run_stage(report, handler, events(), log_lines)
+        reports.append(report)
+
+    report = StageReport("dashboardLoad")
+    start = time.perf_counter()
+    tracemalloc.reset_peak()
+    dashboard_rows = load_dashboard_data(
+        client('s3'), compaction.S3_BUCKET, os.path.join(storage_dir.name, "cache"), args.output_format
+    )
+    report.latencies.append(time.perf_counter() - start)
+    report.peak_bytes = tracemalloc.get_traced_memory()[1]
+    reports.append(report)
+    total_seconds = time.perf_counter() - total_start
+    tracemalloc.stop()
+
+    print(f"{args.backend} backend, {args.output_format} output: {args.meetings} meetings x {args.sessions} "
+          f"sessions x {args.drivers} drivers, {args.telemetry_rows} telemetry rows per driver")
+    print(f"{season.requests} API requests ({season.bytes_served / 1e6:.1f} MB), "
+          f"{dashboard_rows} dashboard rows loaded, {total_seconds:.2f}s end to end\n")
+    print(f"{'stage':<20} {'invocations':>11} {'messages':>9} {'seconds':>8} {'msg/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'peak MB':>8} {'failed':>6} {'retry':>6}")
+    for report in reports:
+        latencies = sorted(report.latencies) or [0.0]
+        seconds = sum(report.latencies)
+        rate = f"{report.messages / seconds:.1f}" if report.messages and seconds else "-"
+        print(f"{report.name:<20} {len(report.latencies):>11} {report.messages:>9} {seconds:>8.3f} {rate:>8} "
+              f"{metrics.percentile(latencies, 50) * 1000:>8.1f} {metrics.percentile(latencies, 95) * 1000:>8.1f} "
+              f"{latencies[-1] * 1000:>8.1f} {report.peak_bytes / 1e6:>8.1f} {report.failures:>6} {report.retried:>6}")
+
+    print()
+    print(format_table(*summarize(log_lines)))
+    if args.metrics_log:
+        with open(args.metrics_log, "w") as f:
+            f.write("\n".join(log_lines) + "\n")
+    storage_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
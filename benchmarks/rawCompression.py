@@ -0,0 +1,79 @@
+"""Measure what compressed NDJSON saves in the raw zone compared with plain JSON arrays.
+
+Usage: python benchmarks/rawCompression.py [--samples 40000] [--mbps 200]
+
+Generates one driver's worth of OpenF1-shaped car_data for a race and, for each
+raw format, reports stored bytes, encode time, estimated PUT/GET transfer time at
+the given bandwidth, and transform time (decode + pd.DataFrame, as transformation.py
+reads the object).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+import rawCodec  # noqa: E402
+
+
+def synthetic_car_data(n_samples):
+    rng = random.Random(7)
+    start = datetime(2025, 3, 16, 4, 3, tzinfo=timezone.utc)
+    return [{
+        "brake": rng.choice([0, 0, 0, 100]),
+        "date": (start + timedelta(milliseconds=270 * i)).isoformat(),
+        "driver_number": 1,
+        "drs": rng.choice([0, 1, 8, 10, 12, 14]),
+        "meeting_key": 1254,
+        "n_gear": rng.randint(1, 8),
+        "rpm": rng.randint(9000, 12500),
+        "session_key": 9693,
+        "speed": rng.randint(80, 330),
+        "throttle": rng.randint(0, 100)
+    } for i in range(n_samples)]
+
+
+def measure(name, encode, records, mbps):
+    start = time.perf_counter()
+    body = encode(records)
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = (body[i:i + rawCodec.STREAM_CHUNK_SIZE] for i in range(0, len(body), rawCodec.STREAM_CHUNK_SIZE))
+    df = pd.DataFrame(list(rawCodec.iter_records(chunks)))
+    transform_seconds = time.perf_counter() - start
+    assert len(df) == len(records)
+
+    return {
+        "format": name,
+        "bytes": len(body),
+        "encode_s": round(encode_seconds, 3),
+        "transfer_s": round(len(body) * 8 / (mbps * 1e6), 3),
+        "transform_s": round(transform_seconds, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=40000)
+    parser.add_argument("--mbps", type=float, default=200, help="assumed Lambda <-> S3 bandwidth")
+    args = parser.parse_args()
+
+    records = synthetic_car_data(args.samples)
+    results = [measure("json", lambda r: json.dumps(r).encode("utf-8"), records, args.mbps)]
+    for compression in ["none", "gzip"] + (["zstd"] if rawCodec.zstandard else []):
+        rawCodec.RAW_COMPRESSION = compression
+        results.append(measure(f"ndjson+{compression}", rawCodec.encode_records, records, args.mbps))
+
+    df = pd.DataFrame(results).set_index("format")
+    df["size_vs_json"] = (df["bytes"] / df.loc["json", "bytes"]).round(3)
+    print(df.to_string())
+
+
+if __name__ == "__main__":
+    main()
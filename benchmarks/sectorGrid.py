@@ -0,0 +1,85 @@
+"""Time the whole-grid sector analysis against one filter + quantile pass per driver and sector.
+
+Usage: python benchmarks/sectorGrid.py [--drivers 20] [--laps 57] [--repeat 20]
+
+Builds a synthetic race in the shape of the transformed laps and drivers tables, plus
+its sector stats from transformation.build_sector_stats, and compares
+lapStore.SessionLaps.sector_grid (one groupby over the sector stats for every driver
+and sector) with the per-selection approach the dashboard used, repeated for all
+driver x sector combinations.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+# transformation creates its clients at import; keep them offline
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+from lapStore import SessionLaps  # noqa: E402
+from transformation import SECTOR_COLUMNS, SECTOR_QUANTILES, build_sector_stats  # noqa: E402
+
+SESSION_KEY = 9693
+
+
+def synthetic_race(n_drivers, n_laps):
+    rng = random.Random(3)
+    drivers = pd.DataFrame({
+        "session_key": SESSION_KEY,
+        "driver_number": range(1, n_drivers + 1),
+        "full_name": [f"Driver {d}" for d in range(1, n_drivers + 1)]
+    })
+    laps = pd.DataFrame([{
+        "session_key": SESSION_KEY,
+        "driver_number": d,
+        "lap_number": lap,
+        **{column: 25 + i * 5 + rng.gauss(0, 0.4) for i, column in enumerate(SECTOR_COLUMNS)}
+    } for d in range(1, n_drivers + 1) for lap in range(1, n_laps + 1)])
+    return drivers, laps
+
+
+def per_selection(laps):
+    # What each driver/sector selection cost before: filter, quantile and slow-lap mask
+    results = []
+    for name in laps["full_name"].dropna().unique():
+        driver_laps = laps[laps["full_name"] == name]
+        for column in SECTOR_COLUMNS:
+            durations = driver_laps[column].dropna()
+            p85 = durations.quantile(SECTOR_QUANTILES["p85"])
+            results.append((name, column, p85, int((durations > p85).sum())))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drivers", type=int, default=20)
+    parser.add_argument("--laps", type=int, default=57)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    drivers, laps = synthetic_race(args.drivers, args.laps)
+    stats = build_sector_stats(laps)
+
+    timings = {"per_selection": [], "sector_grid": []}
+    for _ in range(args.repeat):
+        session = SessionLaps(SESSION_KEY, drivers, laps, stats)
+        start = time.perf_counter()
+        per_selection(session.laps)
+        timings["per_selection"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        grid = session.sector_grid()
+        timings["sector_grid"].append(time.perf_counter() - start)
+
+    assert len(grid) == args.drivers * len(SECTOR_COLUMNS)
+    print(f"{args.drivers} drivers x {args.laps} laps x {len(SECTOR_COLUMNS)} sectors, best of {args.repeat}")
+    for name, seconds in timings.items():
+        print(f"{name:>14}: {min(seconds) * 1000:.1f} ms")
+    print(f"speedup: {min(timings['per_selection']) / min(timings['sector_grid']):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Stress the sharded state store with many concurrent consumers against a local S3 stand-in.
+
+Usage: python benchmarks/stateStoreStress.py [--consumers 16] [--items 400] [--shards 4] [--compact-threshold 3]
+
+Each consumer thread gets its own ShardedStateStore (as separate Lambda invocations
+would) on one shared InMemoryS3. Consumers walk overlapping item lists in random
+order, claim each item, "process" it, add it to state and flush after every few
+items. A low compaction threshold forces compactions to race with appends.
+
+Checks, exiting non-zero on failure:
+  - no item was claimed by two consumers (no duplicate fetches)
+  - every processed item is present in a freshly loaded store (no lost state)
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+import stateStore  # noqa: E402
+from storageBackends import InMemoryS3  # noqa: E402
+
+BUCKET = "f1-stress"
+PREFIX = "metadata/stress/"
+
+
+def consumer(s3, worker, items, flush_every, processed, lock):
+    rng = random.Random(worker)
+    order = list(items)
+    rng.shuffle(order)
+    state = stateStore.ShardedStateStore(s3, BUCKET, PREFIX)
+    done = 0
+    for shard, item in order:
+        if state.contains(shard, item) or not state.claim(shard, item):
+            continue
+        with lock:
+            processed[(shard, item)] += 1
+        time.sleep(rng.random() / 1000)
+        state.add(shard, item)
+        done += 1
+        if done % flush_every == 0:
+            state.flush()
+            # Later checks see other consumers' progress, as a new invocation would
+            state.shards.clear()
+    state.flush()
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--consumers", type=int, default=16)
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--flush-every", type=int, default=5)
+    parser.add_argument("--compact-threshold", type=int, default=3)
+    args = parser.parse_args()
+
+    stateStore.COMPACT_THRESHOLD = args.compact_threshold
+    s3 = InMemoryS3()
+    items = [(f"shard{i % args.shards}", f"item{i}") for i in range(args.items)]
+    processed = Counter()
+    lock = threading.Lock()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.consumers) as executor:
+        futures = [
+            executor.submit(consumer, s3, worker, items, args.flush_every, processed, lock)
+            for worker in range(args.consumers)
+        ]
+        per_consumer = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    final = stateStore.ShardedStateStore(s3, BUCKET, PREFIX)
+    lost = [(shard, item) for shard, item in items if not final.contains(shard, item)]
+    duplicates = [key for key, count in processed.items() if count > 1]
+
+    print(f"⏱️ {args.consumers} consumers processed {sum(per_consumer)} items in {elapsed:.2f}s "
+          f"(per consumer: min {min(per_consumer)}, max {max(per_consumer)})")
+    print(f"🔍 lost entries: {len(lost)}, duplicate claims: {len(duplicates)}, "
+          f"unprocessed: {args.items - len(processed)}")
+    if lost or duplicates or len(processed) != args.items:
+        print("❌ State store stress test failed")
+        sys.exit(1)
+    print("✅ No lost entries and no duplicate processing")
+
+
+if __name__ == "__main__":
+    main()
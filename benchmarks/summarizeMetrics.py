@@ -0,0 +1,84 @@
+"""Summarize the per-stage metric lines the Lambdas print, by function and stage.
+
+Usage: python benchmarks/summarizeMetrics.py [LOG_FILE ...]   (reads stdin without files)
+
+Picks the CloudWatch Embedded Metric Format lines written by lambdaFunctions/metrics.py
+out of Lambda logs or benchmark output (other lines are ignored). For each function
+and stage it totals calls, busy seconds, bytes, retries and errors, and keeps the
+worst per-invocation p95. Each stage's seconds are also shown as a share of the
+function's handler time. Stages can nest and run on several threads, so shares can
+add up to more than 100%.
+"""
+import argparse
+import json
+import sys
+
+
+def parse_lines(lines):
+    for line in lines:
+        line = line.strip()
+        if not line.startswith('{') or '"_aws"' not in line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+
+def summarize(lines):
+    # {(function, stage): totals}, plus the number of invocations per function
+    totals, invocations = {}, {}
+    for metric in parse_lines(lines):
+        function, stage = metric["Function"], metric["Stage"]
+        if stage == "handler":
+            invocations[function] = invocations.get(function, 0) + 1
+        row = totals.setdefault((function, stage), {
+            "calls": 0, "seconds": 0.0, "bytes": 0, "retries": 0, "errors": 0, "p95_ms": 0.0
+        })
+        row["calls"] += metric["Calls"]
+        row["seconds"] += metric["Seconds"]
+        row["bytes"] += metric["Bytes"]
+        row["retries"] += metric["Retries"]
+        row["errors"] += metric["Errors"]
+        row["p95_ms"] = max(row["p95_ms"], metric["P95Ms"])
+    return totals, invocations
+
+
+def format_table(totals, invocations):
+    header = f"{'function':<28} {'stage':<24} {'calls':>8} {'seconds':>9} {'share':>7} {'MB':>9} " \
+             f"{'retries':>7} {'errors':>6} {'p95 ms':>9}"
+    lines = [header, "-" * len(header)]
+    for function in sorted({function for function, _ in totals}):
+        handler = totals.get((function, "handler"), {}).get("seconds", 0.0)
+        rows = sorted(
+            ((stage, row) for (name, stage), row in totals.items() if name == function),
+            key=lambda item: -item[1]["seconds"]
+        )
+        label = f"{function} ({invocations.get(function, 0)}x)"
+        for stage, row in rows:
+            share = f"{row['seconds'] / handler:.0%}" if handler else "-"
+            lines.append(
+                f"{label:<28} {stage:<24} {row['calls']:>8} {row['seconds']:>9.3f} {share:>7} "
+                f"{row['bytes'] / 1e6:>9.2f} {row['retries']:>7} {row['errors']:>6} {row['p95_ms']:>9.1f}"
+            )
+            label = ""
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*")
+    args = parser.parse_args()
+
+    if args.files:
+        lines = []
+        for path in args.files:
+            with open(path) as f:
+                lines.extend(f)
+    else:
+        lines = sys.stdin
+    print(format_table(*summarize(lines)))
+
+
+if __name__ == "__main__":
+    main()
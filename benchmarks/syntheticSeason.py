@@ -0,0 +1,210 @@
+"""A synthetic OpenF1 season served in place of the urllib3 pool the ingestion Lambdas use.
+
+Used by pipelineEndToEnd.py. SyntheticSeason(...).request("GET", url) answers the
+meetings, sessions, drivers, weather, position, laps and telemetry endpoints with
+deterministic OpenF1-shaped records. The sizes are set by the constructor and an
+optional per-request latency simulates the network. Responses carry an ETag and
+If-None-Match is answered with 304.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+SEASON_START = datetime(2025, 3, 14, 1, 30, tzinfo=timezone.utc)
+SESSION_TYPES = [("Practice 1", "Practice"), ("Qualifying", "Qualifying"), ("Race", "Race")]
+TEAMS = [("Red Bull Racing", "3671C6"), ("Ferrari", "E8002D"), ("McLaren", "FF8000"), ("Mercedes", "27F4D2"),
+         ("Aston Martin", "229971"), ("Alpine", "0093CC"), ("Williams", "64C4FF"), ("Haas F1 Team", "B6BABD"),
+         ("Kick Sauber", "52E252"), ("Racing Bulls", "6692FF")]
+
+
+class SyntheticResponse:
+    def __init__(self, status, data, headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+    def stream(self, chunk_size=65536):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def read(self, amt=None):
+        return self.data
+
+    def release_conn(self):
+        pass
+
+    def drain_conn(self):
+        pass
+
+
+class SyntheticSeason:
+    # meetings x sessions_per_meeting sessions, each with `drivers` drivers; laps per driver in
+    # every session and telemetry_rows samples per driver for each telemetry endpoint
+
+    def __init__(self, meetings=3, sessions_per_meeting=3, drivers=20, laps=57, telemetry_rows=2000,
+                 latency=0.0):
+        self.meetings = meetings
+        self.sessions_per_meeting = min(sessions_per_meeting, len(SESSION_TYPES))
+        self.drivers = drivers
+        self.laps = laps
+        self.telemetry_rows = telemetry_rows
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_served = 0
+
+    def meeting_keys(self):
+        return [1250 + i for i in range(self.meetings)]
+
+    def session_keys(self, meeting_key):
+        base = 9000 + (meeting_key - 1250) * 10
+        return [base + i for i in range(self.sessions_per_meeting)]
+
+    def driver_numbers(self):
+        return list(range(1, self.drivers + 1))
+
+    def _meetings(self):
+        # One earlier-season meeting checks the SEASON filter of meetingIdIngestion
+        rows = [{"meeting_key": 1229, "meeting_name": "Abu Dhabi Grand Prix", "date_start": "2024-12-06T09:30:00+00:00",
+                 "year": 2024}]
+        for i, meeting_key in enumerate(self.meeting_keys()):
+            rows.append({
+                "meeting_key": meeting_key,
+                "meeting_name": f"Synthetic Grand Prix {i + 1}",
+                "meeting_official_name": f"FORMULA 1 SYNTHETIC GRAND PRIX {i + 1} 2025",
+                "location": f"Circuit {i + 1}",
+                "country_key": 100 + i,
+                "country_code": "SYN",
+                "country_name": "Synthetica",
+                "circuit_key": 60 + i,
+                "circuit_short_name": f"Circuit {i + 1}",
+                "date_start": (SEASON_START + timedelta(weeks=2 * i)).isoformat(),
+                "gmt_offset": "00:00:00",
+                "year": 2025
+            })
+        return rows
+
+    def _session_start(self, session_key):
+        return SEASON_START + timedelta(weeks=2 * ((session_key - 9000) // 10), days=(session_key - 9000) % 10)
+
+    def _sessions(self, meeting_key):
+        return [{
+            "session_key": session_key,
+            "meeting_key": meeting_key,
+            "session_name": SESSION_TYPES[i][0],
+            "session_type": SESSION_TYPES[i][1],
+            "date_start": self._session_start(session_key).isoformat(),
+            "date_end": (self._session_start(session_key) + timedelta(hours=2)).isoformat(),
+            "year": 2025
+        } for i, session_key in enumerate(self.session_keys(meeting_key))]
+
+    def _drivers(self, session_key):
+        rows = []
+        for number in self.driver_numbers():
+            team, colour = TEAMS[(number - 1) // 2 % len(TEAMS)]
+            rows.append({
+                "session_key": session_key,
+                "meeting_key": 1250 + (session_key - 9000) // 10,
+                "driver_number": number,
+                "broadcast_name": f"D DRIVER{number}",
+                "full_name": f"Driver {number}",
+                "first_name": "Driver",
+                "last_name": str(number),
+                "name_acronym": f"D{number:02d}",
+                "team_name": team,
+                "team_colour": colour,
+                "country_code": "SYN"
+            })
+        return rows
+
+    def _samples(self, session_key, driver_numbers, count, make):
+        rng = random.Random(session_key)
+        start = SEASON_START + timedelta(hours=1)
+        return [
+            {"session_key": session_key, "meeting_key": 1250 + (session_key - 9000) // 10, "driver_number": number,
+             "date": (start + timedelta(milliseconds=270 * i)).isoformat(), **make(rng, i)}
+            for number in driver_numbers for i in range(count)
+        ]
+
+    def _laps(self, session_key, driver_numbers):
+        rng = random.Random(session_key)
+        start = self._session_start(session_key)
+        return [{
+            "session_key": session_key,
+            "meeting_key": 1250 + (session_key - 9000) // 10,
+            "driver_number": number,
+            "lap_number": lap,
+            "date_start": (start + timedelta(seconds=85 * (lap - 1))).isoformat(),
+            "duration_sector_1": round(rng.gauss(28, 0.5), 3),
+            "duration_sector_2": round(rng.gauss(33, 0.5), 3),
+            "duration_sector_3": round(rng.gauss(24, 0.5), 3),
+            "lap_duration": round(rng.gauss(85, 1.0), 3),
+            "is_pit_out_lap": lap == 1
+        } for number in driver_numbers for lap in range(1, self.laps + 1)]
+
+    def records(self, endpoint, params):
+        session_key = int(params["session_key"]) if "session_key" in params else None
+        numbers = [int(params["driver_number"])] if "driver_number" in params else self.driver_numbers()
+        rows = self.telemetry_rows
+        if endpoint == "meetings":
+            return self._meetings()
+        if endpoint == "sessions":
+            return self._sessions(int(params["meeting_key"]))
+        if endpoint == "drivers":
+            return self._drivers(session_key)
+        if endpoint == "laps":
+            return self._laps(session_key, numbers)
+        if endpoint == "weather":
+            # One sample a minute over a 2-hour session, like OpenF1
+            start = self._session_start(session_key)
+            return [{"session_key": session_key, "date": (start + timedelta(minutes=i, seconds=30)).isoformat(),
+                     "air_temperature": 24 + i % 5, "track_temperature": 38 + i % 7, "rainfall": int(i >= 90)}
+                    for i in range(120)]
+        if endpoint == "position":
+            return self._samples(session_key, numbers, max(1, rows // 100), lambda rng, i: {"position": rng.randint(1, 20)})
+        if endpoint == "car_data":
+            return self._samples(session_key, numbers, rows, lambda rng, i: {
+                "speed": rng.randint(80, 330), "rpm": rng.randint(9000, 12500), "n_gear": rng.randint(1, 8),
+                "throttle": rng.randint(0, 100), "brake": rng.choice([0, 0, 100]), "drs": rng.choice([0, 8, 12])
+            })
+        if endpoint == "location":
+            return self._samples(session_key, numbers, rows, lambda rng, i: {
+                "x": rng.randint(-9000, 9000), "y": rng.randint(-9000, 9000), "z": rng.randint(0, 200)
+            })
+        if endpoint == "intervals":
+            return self._samples(session_key, numbers, max(1, rows // 10), lambda rng, i: {
+                "gap_to_leader": round(rng.uniform(0, 60), 3), "interval": round(rng.uniform(0, 3), 3)
+            })
+        if endpoint == "stints":
+            return [{"session_key": session_key, "driver_number": number, "stint_number": stint,
+                     "lap_start": 1 + (stint - 1) * 20, "lap_end": stint * 20, "compound": "MEDIUM",
+                     "tyre_age_at_start": 0} for number in numbers for stint in (1, 2)]
+        if endpoint == "pit":
+            return [{"session_key": session_key, "driver_number": number, "lap_number": 20,
+                     "date": SEASON_START.isoformat(), "pit_duration": 22.5} for number in numbers]
+        if endpoint in ("race_control", "team_radio"):
+            return [{"session_key": session_key, "driver_number": number, "date": SEASON_START.isoformat()}
+                    for number in numbers]
+        return None
+
+    def request(self, method, url, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        parsed = urlparse(url)
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        records = self.records(parsed.path.rsplit('/', 1)[-1], params)
+        if records is None:
+            return SyntheticResponse(404, b'{"detail": "Not Found"}')
+        data = json.dumps(records).encode('utf-8')
+        # Payloads are deterministic, so their hash works as the ETag for conditional requests
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self.lock:
+            self.requests += 1
+            if (kwargs.get('headers') or {}).get('If-None-Match') == etag:
+                return SyntheticResponse(304, b'', {"ETag": etag})
+            self.bytes_served += len(data)
+        return SyntheticResponse(200, data, {"ETag": etag})
@@ -0,0 +1,85 @@
+"""Compare the in-memory size of raw vs typed telemetry frames built by transformation.py.
+
+Usage: python benchmarks/telemetryMemory.py [--rows 1000000] [--chunk-rows 100000]
+
+Generates OpenF1-shaped car_data and reports, for a plain pd.DataFrame of the
+records (what the dashboard got from untyped CSV) and for the chunked, schema-typed
+frames transformation.write_chunked produces, the deep memory usage, the build time
+and the largest single frame held at once.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+# The lambda modules create their clients at import; keep them offline
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambdaFunctions"))
+import transformation  # noqa: E402
+
+
+def synthetic_car_data(n_rows):
+    rng = random.Random(11)
+    start = datetime(2025, 3, 16, 4, 3, tzinfo=timezone.utc)
+    for i in range(n_rows):
+        yield {
+            "brake": rng.choice([0, 0, 0, 100]),
+            "date": (start + timedelta(milliseconds=270 * (i // 20))).isoformat(),
+            "driver_number": 1 + i % 20,
+            "drs": rng.choice([0, 1, 8, 10, 12, 14]),
+            "meeting_key": 1254,
+            "n_gear": rng.randint(1, 8),
+            "rpm": rng.randint(9000, 12500),
+            "session_key": 9693,
+            "speed": rng.randint(80, 330),
+            "throttle": rng.randint(0, 100)
+        }
+
+
+def mb(n_bytes):
+    return round(n_bytes / 1e6, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=transformation.TRANSFORM_CHUNK_ROWS)
+    args = parser.parse_args()
+    schema = transformation.SCHEMAS["car_data_raw"]
+
+    start = time.perf_counter()
+    untyped = pd.DataFrame(list(synthetic_car_data(args.rows)))
+    untyped_seconds = time.perf_counter() - start
+    untyped_bytes = untyped.memory_usage(deep=True).sum()
+    del untyped
+
+    start = time.perf_counter()
+    records = synthetic_car_data(args.rows)
+    typed_bytes, largest_chunk = 0, 0
+    while True:
+        chunk = [record for _, record in zip(range(args.chunk_rows), records)]
+        if not chunk:
+            break
+        df = transformation.apply_schema(pd.DataFrame(chunk), schema)[list(schema)]
+        chunk_bytes = df.memory_usage(deep=True).sum()
+        typed_bytes += chunk_bytes
+        largest_chunk = max(largest_chunk, chunk_bytes)
+    typed_seconds = time.perf_counter() - start
+
+    results = pd.DataFrame([
+        {"frame": "untyped", "memory_mb": mb(untyped_bytes), "peak_frame_mb": mb(untyped_bytes),
+         "build_s": round(untyped_seconds, 2)},
+        {"frame": "typed_chunks", "memory_mb": mb(typed_bytes), "peak_frame_mb": mb(largest_chunk),
+         "build_s": round(typed_seconds, 2)}
+    ]).set_index("frame")
+    results["size_vs_untyped"] = (results["memory_mb"] / results.loc["untyped", "memory_mb"]).round(3)
+    print(f"{args.rows} car_data rows, chunks of {args.chunk_rows}")
+    print(results.to_string())
+
+
+if __name__ == "__main__":
+    main()
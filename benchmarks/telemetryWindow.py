@@ -0,0 +1,83 @@
+"""Compare the points a telemetry chart draws from the multi-resolution tiles with the raw samples.
+
+Usage: python benchmarks/telemetryWindow.py [--minutes 30,60,120,240] [--hz 3.7] [--repeat 20]
+
+For one driver's synthetic car_data of each session length, builds every tile level
+with transformation.build_telemetry_tiles and then, for windows from the whole
+session down to two minutes, times what the dashboard does per rerun: pick the
+level, parse it and slice the window (telemetryTiles). The raw column shows how
+many samples the same window holds. Points per chart should stay flat as the
+session gets longer.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+os.environ.setdefault("METRICS_ENABLED", "0")
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, ".."))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, "..", "lambdaFunctions"))
+import telemetryTiles  # noqa: E402
+from transformation import TELEMETRY_TILE_CHANNELS, TELEMETRY_TILE_LEVELS, build_telemetry_tiles  # noqa: E402
+
+START = pd.Timestamp("2025-03-16T04:00:00Z")
+TARGET_POINTS = 400
+
+
+def synthetic_car_data(minutes, hz):
+    rng = random.Random(minutes)
+    rows = int(minutes * 60 * hz)
+    return pd.DataFrame({
+        "date": START + pd.to_timedelta([i / hz for i in range(rows)], unit="s"),
+        "speed": pd.array([rng.randint(80, 330) for _ in range(rows)], dtype="Int16"),
+        "rpm": pd.array([rng.randint(9000, 12500) for _ in range(rows)], dtype="Int16"),
+        "throttle": pd.array([rng.randint(0, 100) for _ in range(rows)], dtype="Int16"),
+        "brake": pd.array([rng.choice([0, 0, 100]) for _ in range(rows)], dtype="Int16"),
+        "n_gear": pd.array([rng.randint(1, 8) for _ in range(rows)], dtype="Int8")
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--minutes", default="30,60,120,240")
+    parser.add_argument("--hz", type=float, default=3.7)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"levels {TELEMETRY_TILE_LEVELS}, target {TARGET_POINTS} points per chart\n")
+    print(f"{'session min':>11} {'raw rows':>9} {'build ms':>9} {'window min':>10} {'level':>6} "
+          f"{'points':>7} {'raw':>7} {'view ms':>8}")
+    for minutes in [int(m) for m in args.minutes.split(",")]:
+        samples = synthetic_car_data(minutes, args.hz)
+        start = time.perf_counter()
+        # Stored as CSV-like frames, as the dashboard reads them back
+        levels = {
+            buckets: build_telemetry_tiles(samples, TELEMETRY_TILE_CHANNELS["car_data_raw"], buckets)
+            .assign(date=lambda df: df["date"].map(pd.Timestamp.isoformat))
+            for buckets in TELEMETRY_TILE_LEVELS
+        }
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for window in [minutes, minutes // 4, minutes // 16, 2]:
+            offset = (minutes - window) // 2
+            window_start = START + pd.Timedelta(minutes=offset)
+            window_end = window_start + pd.Timedelta(minutes=window)
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                buckets = telemetryTiles.pick_level(TELEMETRY_TILE_LEVELS, window / minutes, TARGET_POINTS)
+                view = telemetryTiles.in_window(telemetryTiles.prepare(levels[buckets]), window_start, window_end)
+                timings.append((time.perf_counter() - start) * 1000)
+            raw = samples["date"].between(window_start, window_end).sum()
+            print(f"{minutes:>11} {len(samples):>9} {build_ms:>9.0f} {window:>10} {buckets:>6} "
+                  f"{len(view):>7} {raw:>7} {statistics.median(timings):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import json
+import metrics
+import os
+import time
+
+# Per-message outcome of an SQS-triggered invocation. Handlers return response(), whose
+# batchItemFailures make SQS redeliver only the failed messages (the event source mapping
+# needs FunctionResponseTypes=["ReportBatchItemFailures"]). A message that has already been
+# received MAX_RECEIVES times, or that can never succeed, is written to the dead-letter store
+# instead and counts as handled, so it stops coming back.
+#
+# A message waiting on an item another consumer has claimed is not failed: a crashed consumer's
+# claim only expires after stateStore.CLAIM_TTL_SECONDS, which can outlast MAX_RECEIVES
+# redeliveries. It is sent back to its queue as a new message, delayed by CLAIM_RETRY_DELAY_SECONDS,
+# so waiting never uses up deliveries.
+#
+# Layout: dead_letters/{function}/{messageId}.json  {"body", "error", "receive_count", "failed_at"}
+DEAD_LETTER_PREFIX = 'dead_letters/'
+MAX_RECEIVES = int(os.environ.get('MAX_RECEIVES', '5'))
+# SQS caps DelaySeconds at 15 minutes
+CLAIM_RETRY_DELAY_SECONDS = min(900, int(os.environ.get('CLAIM_RETRY_DELAY_SECONDS', '60')))
+
+
+def receive_count(record):
+    return int(record.get('attributes', {}).get('ApproximateReceiveCount', '1'))
+
+
+def source_queue_url(record):
+    # arn:aws:sqs:{region}:{account}:{name} -> https://sqs.{region}.amazonaws.com/{account}/{name}
+    parts = record.get('eventSourceARN', '').split(':')
+    if len(parts) != 6 or parts[2] != 'sqs':
+        return None
+    return f"https://sqs.{parts[3]}.amazonaws.com/{parts[4]}/{parts[5]}"
+
+
+class BatchResult:
+    def __init__(self, s3, bucket, function):
+        self.s3 = s3
+        self.bucket = bucket
+        self.function = function
+        self.failed = []
+        self.dead_lettered = 0
+        self.deferred = 0
+
+    def fail(self, record, error):
+        # Retry the message, unless it has used up its deliveries
+        if receive_count(record) >= MAX_RECEIVES:
+            self.dead_letter(record, f"gave up after {receive_count(record)} deliveries: {error}")
+            return
+        print(f"🔁 Message {record['messageId']} failed, will be retried: {error}")
+        self.failed.append(record['messageId'])
+
+    def dead_letter(self, record, error):
+        # For messages a retry can't fix (malformed bodies) or that keep failing
+        key = f"{DEAD_LETTER_PREFIX}{self.function}/{record['messageId']}.json"
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=json.dumps({
+                "body": record.get('body'),
+                "error": str(error),
+                "receive_count": receive_count(record),
+                "failed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            }),
+            ContentType="application/json"
+        )
+        self.dead_lettered += 1
+        metrics.record("dead_letter", calls=1, errors=1)
+        print(f"🪦 Message {record['messageId']} moved to {key}: {error}")
+
+    def retry_later(self, record, sqs, reason):
+        # For messages waiting on another consumer's claim; falls back to fail() when the message
+        # can't be re-sent (no source queue in the event, or the send fails)
+        queue_url = source_queue_url(record)
+        if queue_url is None:
+            self.fail(record, reason)
+            return
+        try:
+            sqs.send_message(QueueUrl=queue_url, MessageBody=record['body'], DelaySeconds=CLAIM_RETRY_DELAY_SECONDS)
+        except Exception as e:
+            self.fail(record, f"{reason} (re-sending failed: {e})")
+            return
+        self.deferred += 1
+        print(f"⏳ Message {record['messageId']} re-sent with a {CLAIM_RETRY_DELAY_SECONDS}s delay: {reason}")
+
+    def response(self, body):
+        if self.failed or self.dead_lettered or self.deferred:
+            body += (f" Messages: {len(self.failed)} to retry, {self.deferred} re-sent for later, "
+                     f"{self.dead_lettered} dead-lettered.")
+        return {
+            "statusCode": 200,
+            "body": body,
+            "batchItemFailures": [{"itemIdentifier": message_id} for message_id in self.failed]
+        }
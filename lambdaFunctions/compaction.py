@@ -0,0 +1,187 @@
+import io
+import json
+import metrics
+import os
+import time
+import uuid
+from storageBackends import CONFLICT_CODES, client
+from transformedData import DATASETS, dataset_of, unit_prefix, write_frame
+
+s3 = metrics.InstrumentedS3(client('s3'))
+# pandas is imported where frames are read and merged
+
+S3_BUCKET = 'f1-75'
+
+DATA_SUFFIXES = ('.csv', '.parquet')
+# Units with fewer new fragments than this are left alone until more data arrives
+COMPACT_MIN_FRAGMENTS = int(os.environ.get('COMPACT_MIN_FRAGMENTS', '2'))
+
+# Layout inside a unit:
+#   {unit}_manifest.json         {"compacted": key, "fragments": {key: etag}, "keys": [...], "replace": [...]};
+#                                the atomic switch for readers
+#   {unit}_compacted/{id}.{ext}  the merged file; only the one the manifest names is visible
+# Fragments listed in the manifest with a matching ETag are hidden from readers, so the switch
+# is a single PUT and the fragments can be deleted afterwards at leisure. The dataset's keys and
+# replace columns are copied into the manifest so readers can merge late fragments the same way.
+MANIFEST_NAME = "_manifest.json"
+COMPACTED_DIR = "_compacted/"
+
+def list_unit(unit):
+    fragments, compacted = {}, []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=unit):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if not key.endswith(DATA_SUFFIXES):
+                continue
+            if key.startswith(f"{unit}{COMPACTED_DIR}"):
+                compacted.append(key)
+            elif unit_prefix(key) == unit:
+                fragments[key] = obj
+    return fragments, compacted
+
+def read_manifest(unit):
+    try:
+        obj = s3.get_object(Bucket=S3_BUCKET, Key=f"{unit}{MANIFEST_NAME}")
+    except s3.exceptions.NoSuchKey:
+        return None, None
+    return json.loads(obj['Body'].read()), obj['ETag']
+
+def read_frame(key):
+    import pandas as pd
+    body = io.BytesIO(s3.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read())
+    with metrics.timed("pandas.read") as span:
+        span.bytes = body.getbuffer().nbytes
+        if key.endswith('.parquet'):
+            return pd.read_parquet(body)
+        return pd.read_csv(body)
+
+def merge(config, compacted_df, fragment_dfs):
+    with metrics.timed("pandas.merge"):
+        return _merge(config, compacted_df, fragment_dfs)
+
+def _merge(config, compacted_df, fragment_dfs):
+    import pandas as pd
+    fragments = pd.concat(fragment_dfs, ignore_index=True)
+    replace = config.get("replace")
+    if compacted_df is not None and replace:
+        replaced = fragments[replace].drop_duplicates()
+        compacted_df = compacted_df.merge(replaced, on=replace, how="left", indicator=True)
+        compacted_df = compacted_df[compacted_df["_merge"] == "left_only"].drop(columns="_merge")
+    frames = [df for df in (compacted_df, fragments) if df is not None and not df.empty]
+    merged = pd.concat(frames, ignore_index=True) if frames else fragments
+
+    keys = [column for column in config["keys"] if column in merged.columns]
+    if keys:
+        merged = merged.drop_duplicates(subset=keys, keep="last").sort_values(keys, kind="stable")
+    return merged.reset_index(drop=True)
+
+def delete_fragment(key, etag):
+    # Only the version that was listed and merged: per-driver fragments (sector_stats, laps_weather)
+    # are rewritten at the same key, and a rewrite since the listing must survive for the next run
+    try:
+        s3.delete_object(Bucket=S3_BUCKET, Key=key, IfMatch=etag)
+    except s3.exceptions.ClientError as e:
+        code = e.response['Error']['Code']
+        if code in ("NoSuchKey", "404"):
+            return
+        if code not in CONFLICT_CODES:
+            raise
+        print(f"⚠️ {key} was rewritten after it was merged, keeping it for the next compaction")
+
+def compact_unit(unit):
+    config = DATASETS[dataset_of(unit)]
+    manifest, manifest_etag = read_manifest(unit)
+    merged_before = manifest["fragments"] if manifest else {}
+    current = manifest["compacted"] if manifest else None
+
+    fragments, compacted_files = list_unit(unit)
+    # Fragments already in the current compacted file are only waiting to be deleted
+    pending_delete = [key for key, obj in fragments.items() if merged_before.get(key) == obj['ETag']]
+    new_fragments = sorted(
+        (key for key in fragments if key not in pending_delete),
+        key=lambda key: (fragments[key]['LastModified'], key)
+    )
+
+    # Late files for an already compacted unit are folded in right away
+    if not new_fragments or (len(new_fragments) < COMPACT_MIN_FRAGMENTS and current is None):
+        for key in pending_delete:
+            delete_fragment(key, fragments[key]['ETag'])
+        return 0
+
+    suffix = os.path.splitext(new_fragments[0])[1]
+    compacted_df = read_frame(current) if current else None
+    merged = merge(config, compacted_df, [read_frame(key) for key in new_fragments])
+
+    new_compacted = f"{unit}{COMPACTED_DIR}{int(time.time() * 1000)}-{uuid.uuid4().hex}{suffix}"
+    write_frame(s3, S3_BUCKET, new_compacted, merged)
+
+    # Atomic switch: readers see either the old manifest (old file + fragments) or the new one
+    new_manifest = {
+        "compacted": new_compacted,
+        "fragments": {key: fragments[key]['ETag'] for key in pending_delete + new_fragments},
+        "keys": config["keys"],
+        "replace": config.get("replace")
+    }
+    condition = {"IfMatch": manifest_etag} if manifest_etag else {"IfNoneMatch": "*"}
+    try:
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=f"{unit}{MANIFEST_NAME}",
+            Body=json.dumps(new_manifest),
+            ContentType="application/json",
+            **condition
+        )
+    except s3.exceptions.ClientError as e:
+        if e.response['Error']['Code'] not in CONFLICT_CODES:
+            raise
+        # Another run compacted this unit first; its result already covers or will cover these fragments
+        s3.delete_object(Bucket=S3_BUCKET, Key=new_compacted)
+        print(f"🔁 {unit} was compacted concurrently, skipping")
+        return 0
+
+    # Readers no longer need the fragments or older compacted files
+    for key in pending_delete + new_fragments:
+        delete_fragment(key, fragments[key]['ETag'])
+    for key in compacted_files:
+        if key != new_compacted:
+            s3.delete_object(Bucket=S3_BUCKET, Key=key)
+    print(f"🗜️ Compacted {len(new_fragments)} files into {new_compacted} ({len(merged)} rows)")
+    return len(new_fragments)
+
+def list_units(dataset):
+    units = set()
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=dataset):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith(DATA_SUFFIXES):
+                units.add(unit_prefix(obj['Key']))
+    return units
+
+@metrics.instrumented("compaction")
+def lambda_handler(event, context):
+    # Messages from transformation name the units that received new files;
+    # {"sweep": true} (e.g. from a schedule) checks every unit of every dataset.
+    units = set()
+    for record in event.get('Records', []):
+        body = json.loads(record['body'])
+        units.update(unit for unit in body.get("units", []) if dataset_of(unit))
+        if body.get("sweep"):
+            for dataset in DATASETS:
+                units.update(list_units(dataset))
+
+    compacted, merged_files = 0, 0
+    for unit in sorted(units):
+        try:
+            merged = compact_unit(unit)
+        except Exception as e:
+            print(f"❌ Failed compacting {unit}: {e}")
+            continue
+        if merged:
+            compacted += 1
+            merged_files += merged
+
+    return {
+        "statusCode": 200,
+        "body": f"✅ Compacted {compacted} of {len(units)} units, merging {merged_files} files."
+    }
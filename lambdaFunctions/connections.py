@@ -0,0 +1,41 @@
+import os
+
+# Connection settings shared by every Lambda. Pools are built once per container at import time
+# and kept alive across warm invocations, so repeat requests to api.openf1.org and S3 reuse
+# open TLS connections instead of handshaking again.
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '8'))
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '60'))
+AWS_POOL_CONNECTIONS = int(os.environ.get('AWS_POOL_CONNECTIONS', '10'))
+AWS_MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '5'))
+# OpenF1 JSON compresses ~10x; urllib3 decodes it transparently
+REQUEST_HEADERS = {"Accept-Encoding": "gzip"}
+# OpenF1 statuses worth retrying: throttling and server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def request_headers(extra=None):
+    # Passing headers to a request replaces the pool's defaults, so callers merge them here
+    return {**REQUEST_HEADERS, **(extra or {})}
+
+
+def http_pool(maxsize=HTTP_POOL_SIZE):
+    import urllib3
+    return urllib3.PoolManager(
+        maxsize=maxsize,
+        # Threads wait for a pooled connection rather than opening throwaway ones past maxsize
+        block=True,
+        timeout=urllib3.Timeout(connect=HTTP_CONNECT_TIMEOUT, read=HTTP_READ_TIMEOUT),
+        headers=REQUEST_HEADERS
+    )
+
+
+def aws_config(max_pool_connections=AWS_POOL_CONNECTIONS):
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
+        connect_timeout=HTTP_CONNECT_TIMEOUT,
+        read_timeout=HTTP_READ_TIMEOUT,
+        retries={"mode": "standard", "max_attempts": AWS_MAX_ATTEMPTS}
+    )
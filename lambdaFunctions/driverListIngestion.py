@@ -1,117 +1,132 @@
-import boto3
 import json
-import urllib3
+import metrics
+from batchResults import BatchResult
+from connections import RETRYABLE_STATUSES, http_pool, request_headers
 from datetime import datetime
+from rawCodec import put_records
+from responseCache import ResponseCache, sha256_of
+from sqsBatch import BatchPublisher, send_raw_keys
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import client
 
-http = urllib3.PoolManager()
-sqs = boto3.client('sqs')
-s3 = boto3.client('s3')
+http = metrics.InstrumentedHttp(http_pool())
+sqs = metrics.InstrumentedSQS(client('sqs'))
+s3 = metrics.InstrumentedS3(client('s3'))
 
 DRIVER_ID_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Driver_id_Q'
+TRANSFORM_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Transform_Q'
 S3_BUCKET = 'f1-75'
-METADATA_KEY = 'metadata/processed_drivers.json'
-
-def read_metadata():
-    try:
-        response = s3.get_object(Bucket=S3_BUCKET, Key=METADATA_KEY)
-        data = response['Body'].read()
-        processed = json.loads(data)
-        print(f"📋 Loaded metadata with {len(processed)} driver session keys")
-        return processed
-    except s3.exceptions.NoSuchKey:
-        print("⚠️ Metadata file not found, initializing empty list")
-        return []
-    except Exception as e:
-        print(f"❌ Error reading metadata: {e}")
-        return []
-
-def write_metadata(processed):
-    try:
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=METADATA_KEY,
-            Body=json.dumps(processed)
+# Processed "{meeting_key}_{session_key}" ids, sharded by meeting_key
+STATE_PREFIX = 'metadata/drivers/'
+LEGACY_METADATA_KEY = 'metadata/processed_drivers.json'
+
+def store_if_changed(cache, session_key, url, base_key, label):
+    # Returns the raw key written, or None if the fetch failed or matched the last stored response.
+    # Throttling and server errors raise, so the message is retried.
+    response = http.request('GET', url, headers=request_headers(cache.conditional_headers(session_key, url)))
+    if response.status == 304:
+        print(f"♻️ {label} for session {session_key} not modified")
+        return None
+    if response.status in RETRYABLE_STATUSES:
+        raise RuntimeError(f"❌ Fetching {label} for session {session_key} returned {response.status}")
+    if response.status != 200:
+        print(f"❌ Failed to fetch {label} for session {session_key}")
+        return None
+    digest = sha256_of(response.data)
+    if cache.unchanged(session_key, url, digest):
+        print(f"♻️ {label} for session {session_key} unchanged, not stored again")
+        return None
+    key = put_records(s3, S3_BUCKET, base_key, json.loads(response.data.decode('utf-8')))
+    cache.record(session_key, url, digest, response.headers)
+    print(f"✅ Stored {label} data for session {session_key}")
+    return key
+
+def process_session(meeting_key, session_key, cache, publisher, new_raw_keys):
+    # Stores drivers and weather and queues the session's drivers; raises if the message should be retried
+    date_today = datetime.utcnow().strftime("%Y-%m-%d")
+
+    # ✅ Fetch and store drivers list and weather data, unless unchanged since the last fetch
+    cache.load(session_key)
+    for endpoint in ("drivers", "weather"):
+        raw_key = store_if_changed(
+            cache, session_key,
+            f"https://api.openf1.org/v1/{endpoint}?session_key={session_key}",
+            f"raw_data/{endpoint}_raw/{session_key}/{endpoint}_{date_today}",
+            endpoint
         )
-        print(f"✅ Updated metadata with {len(processed)} driver session keys")
-    except Exception as e:
-        print(f"❌ Error writing metadata: {e}")
-
+        if raw_key:
+            new_raw_keys.append(raw_key)
+
+    # ✅ Fetch driver numbers from position data and push to Driver_id_Q
+    pos_url = f"https://api.openf1.org/v1/position?session_key={session_key}"
+    pos_resp = http.request('GET', pos_url)
+    if pos_resp.status != 200:
+        raise RuntimeError(f"❌ Failed to fetch positions for session_key {session_key}: status {pos_resp.status}")
+
+    positions = json.loads(pos_resp.data.decode('utf-8'))
+    driver_numbers = list(set([item.get('driver_number') for item in positions if 'driver_number' in item]))
+
+    for driver_number in driver_numbers:
+        msg = {
+            "session_key": session_key,
+            "driver_number": driver_number
+        }
+        publisher.send(msg)
+        print(f"📤 Queued for Driver_id_Q: session={session_key}, driver={driver_number}")
+    return len(driver_numbers)
+
+@metrics.instrumented("driverListIngestion")
 def lambda_handler(event, context):
-    processed = read_metadata()
+    state = ShardedStateStore(s3, S3_BUCKET, STATE_PREFIX)
+    import_legacy(s3, S3_BUCKET, LEGACY_METADATA_KEY, state, lambda session_id: session_id.split('_')[0])
+    cache = ResponseCache(s3, S3_BUCKET)
+    publisher = BatchPublisher(sqs, DRIVER_ID_QUEUE_URL)
+    result = BatchResult(s3, S3_BUCKET, "driverListIngestion")
+    new_raw_keys = []
     count_sent = 0
 
+    # Each message succeeds or fails on its own; only failed ones are redelivered
     for record in event['Records']:
-        body = json.loads(record['body'])
-        meeting_key = body.get('meeting_key')
-        session_key = body.get('session_key')
+        try:
+            body = json.loads(record['body'])
+            meeting_key = body.get('meeting_key')
+            session_key = body.get('session_key')
+        except (json.JSONDecodeError, AttributeError) as e:
+            result.dead_letter(record, f"unreadable body: {e}")
+            continue
 
         if not meeting_key or not session_key:
             print("❌ Missing meeting_key or session_key in message body.")
+            result.dead_letter(record, "no meeting_key or session_key in message")
             continue
 
         session_id = f"{meeting_key}_{session_key}"
-        if session_id in processed:
+        if state.contains(meeting_key, session_id):
             print(f"📂 Drivers for session {session_id} already processed, skipping...")
             continue
-
-        date_today = datetime.utcnow().strftime("%Y-%m-%d")
-
-        # ✅ Fetch and store drivers list
-        drivers_url = f"https://api.openf1.org/v1/drivers?session_key={session_key}"
-        drivers_resp = http.request('GET', drivers_url)
-        if drivers_resp.status == 200:
-            drivers_data = json.loads(drivers_resp.data.decode('utf-8'))
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=f"raw_data/drivers_raw/{session_key}/drivers_{date_today}.json",
-                Body=json.dumps(drivers_data)
-            )
-            print(f"✅ Stored drivers data for session {session_key}")
-        else:
-            print(f"❌ Failed to fetch drivers for session {session_key}")
-
-        # ✅ Fetch and store weather data
-        weather_url = f"https://api.openf1.org/v1/weather?session_key={session_key}"
-        weather_resp = http.request('GET', weather_url)
-        if weather_resp.status == 200:
-            weather_data = json.loads(weather_resp.data.decode('utf-8'))
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=f"raw_data/weather_raw/{session_key}/weather_{date_today}.json",
-                Body=json.dumps(weather_data)
-            )
-            print(f"✅ Stored weather data for session {session_key}")
-        else:
-            print(f"❌ Failed to fetch weather for session {session_key}")
-
-        # ✅ Fetch driver numbers from position data and push to Driver_id_Q
-        pos_url = f"https://api.openf1.org/v1/position?session_key={session_key}"
-        pos_resp = http.request('GET', pos_url)
-        if pos_resp.status != 200:
-            print(f"❌ Failed to fetch positions for session_key: {session_key}")
+        if not state.claim(meeting_key, session_id):
+            # Retried once the other consumer finishes or its claim expires, in case it crashed
+            print(f"🔒 Drivers for session {session_id} are being processed by another consumer")
+            result.retry_later(record, sqs, f"session {session_id} is claimed by another consumer")
             continue
 
-        positions = json.loads(pos_resp.data.decode('utf-8'))
-        driver_numbers = list(set([item.get('driver_number') for item in positions if 'driver_number' in item]))
-
-        for driver_number in driver_numbers:
-            msg = {
-                "session_key": session_key,
-                "driver_number": driver_number
-            }
-            sqs.send_message(
-                QueueUrl=DRIVER_ID_QUEUE_URL,
-                MessageBody=json.dumps(msg)
-            )
-            print(f"📤 Sent to Driver_id_Q: session={session_key}, driver={driver_number}")
-            count_sent += 1
-
-        processed.append(session_id)
-
-    write_metadata(processed)
+        try:
+            count_sent += process_session(meeting_key, session_key, cache, publisher, new_raw_keys)
+        except Exception as e:
+            state.release(meeting_key, session_id)
+            result.fail(record, e)
+            continue
+        state.add(meeting_key, session_id)
 
-    return {
-        "statusCode": 200,
-        "body": f"✅ Processed {count_sent} drivers and added driver/weather data."
-    }
+    # Send any partial batch before recording the sessions as processed
+    publisher.flush()
+    transform_publisher = BatchPublisher(sqs, TRANSFORM_QUEUE_URL)
+    send_raw_keys(transform_publisher, new_raw_keys)
+    transform_publisher.flush()
+    try:
+        state.flush()
+        cache.flush()
+    except Exception as e:
+        print(f"❌ Error writing metadata: {e}")
 
+    return result.response(f"✅ Processed {count_sent} drivers and added driver/weather data.")
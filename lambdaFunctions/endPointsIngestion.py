@@ -1,11 +1,36 @@
-import boto3
+import hashlib
 import json
+import metrics
+import os
+import threading
+import time
 import urllib3
+from batchResults import BatchResult
+from concurrent.futures import ThreadPoolExecutor
+from connections import RETRYABLE_STATUSES, aws_config, http_pool, request_headers
 from datetime import datetime
+from rawCodec import STREAM_CHUNK_SIZE, RecordUpload, iter_records
+from responseCache import ResponseCache
+from sqsBatch import BatchPublisher, send_raw_keys
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import client
 
-http = urllib3.PoolManager()
-s3 = boto3.client('s3')
-sqs = boto3.client('sqs')
+# Concurrency limits (override with Lambda env vars). HTTP_MAX_IN_FLIGHT bounds open OpenF1 responses;
+# S3_MAX_IN_FLIGHT bounds multipart part uploads and is taken only around each part. A response is
+# streamed straight into its uploads, so it keeps its HTTP slot while its parts upload: uploads
+# never exceed the open streams, and slow S3 writes slow down how fast HTTP slots free up.
+HTTP_MAX_IN_FLIGHT = int(os.environ.get('HTTP_MAX_IN_FLIGHT', '8'))
+S3_MAX_IN_FLIGHT = int(os.environ.get('S3_MAX_IN_FLIGHT', '8'))
+# Attempts per request, including the first; anything below 1 still makes one attempt
+FETCH_MAX_RETRIES = max(1, int(os.environ.get('FETCH_MAX_RETRIES', '3')))
+RETRY_BACKOFF_SECONDS = float(os.environ.get('RETRY_BACKOFF_SECONDS', '0.5'))
+# 'driver': one request per (session, driver, endpoint)
+# 'session': one request per (session, endpoint), split by driver_number in memory
+FETCH_MODE = os.environ.get('FETCH_MODE', 'driver')
+
+http = metrics.InstrumentedHttp(http_pool(HTTP_MAX_IN_FLIGHT))
+s3 = metrics.InstrumentedS3(client('s3', config=aws_config(S3_MAX_IN_FLIGHT)))
+sqs = metrics.InstrumentedSQS(client('sqs'))
 
 S3_BUCKET = 'f1-75'
 TRANSFORM_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Transform_Q'
@@ -16,88 +41,288 @@ ENDPOINTS = [
     "location", "team_radio"
 ]
 
-METADATA_KEY = 'metadata/processed_ingestion.json'
+# Processed (session, driver, endpoint) triplets, sharded by session_key
+STATE_PREFIX = 'metadata/ingestion/'
+LEGACY_METADATA_KEY = 'metadata/processed_ingestion.json'
 
-def load_metadata():
-    try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=METADATA_KEY)
-        return json.loads(obj['Body'].read().decode('utf-8'))
-    except s3.exceptions.ClientError as e:
-        if e.response['Error']['Code'] == "NoSuchKey":
-            return {}
+def session_of(key_triplet):
+    return key_triplet.split('_')[0]
+
+def fetch_with_retry(url, http_slots, headers=None):
+    # Retries are per request, so one flaky endpoint never fails the rest of the batch.
+    # The response is returned holding one of http_slots, which the caller releases once the body
+    # is consumed; the slot is given back during each backoff so a throttled endpoint never idles it
+    for attempt in range(1, FETCH_MAX_RETRIES + 1):
+        http_slots.acquire()
+        try:
+            response = http.request('GET', url, headers=request_headers(headers), retries=False, preload_content=False)
+        except Exception as e:
+            http_slots.release()
+            if not isinstance(e, urllib3.exceptions.HTTPError) or attempt == FETCH_MAX_RETRIES:
+                raise
+            metrics.retry("http.fetch")
+            print(f"🔁 Retrying {url} after {e} (attempt {attempt})")
         else:
-            raise
+            if response.status not in RETRYABLE_STATUSES or attempt == FETCH_MAX_RETRIES:
+                return response
+            response.drain_conn()
+            response.release_conn()
+            http_slots.release()
+            metrics.retry("http.fetch")
+            print(f"🔁 Retrying {url} after status {response.status} (attempt {attempt})")
+        time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
 
-def save_metadata(metadata):
-    s3.put_object(
-        Bucket=S3_BUCKET,
-        Key=METADATA_KEY,
-        Body=json.dumps(metadata)
-    )
+def raw_key_for(session_key, driver_number, endpoint):
+    # rawCodec adds the extension for the configured compression
+    date_today = datetime.utcnow().strftime("%Y-%m-%d")
+    return f"raw_data/{endpoint}_raw/{session_key}/{driver_number}/{endpoint}_{date_today}"
+
+def new_upload(session_key, driver_number, endpoint, s3_slots):
+    return RecordUpload(s3, S3_BUCKET, raw_key_for(session_key, driver_number, endpoint), s3_slots)
+
+def hashed(chunks, digest):
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+def stream_to_uploads(response, uploads, upload_for, keep=lambda digest: True):
+    # Records are parsed as the body streams in and uploaded in fixed-size multipart parts,
+    # so peak memory is about one part per open upload regardless of payload size. The caller's
+    # HTTP slot stays held throughout, as the connection is open until the last part is sent.
+    # upload_for(item) returns the upload an item belongs to, or None to drop it.
+    # keep(sha256 of the body) decides at the end whether the uploads are completed or aborted;
+    # returns the digest if they were completed, None if not
+    digest = hashlib.sha256()
+    try:
+        for item in iter_records(hashed(response.stream(STREAM_CHUNK_SIZE), digest)):
+            upload = upload_for(item)
+            if upload is not None:
+                upload.write(item)
+        if not keep(digest.hexdigest()):
+            for upload in uploads.values():
+                upload.abort()
+            return None
+        for upload in uploads.values():
+            upload.complete()
+        return digest.hexdigest()
+    except Exception:
+        for upload in uploads.values():
+            upload.abort()
+        raise
+    finally:
+        response.release_conn()
+
+def check_status(response, url):
+    # Throttling and server errors that outlasted the retries fail the item so its message is retried;
+    # any other status (e.g. 404 when an endpoint has no data for a driver) won't change on a retry
+    if response.status in RETRYABLE_STATUSES:
+        raise RuntimeError(f"❌ Fetching {url} returned {response.status}")
+
+def fetch_cached(cache, session_key, url, http_slots):
+    # The response (holding an HTTP slot), or None when the API confirms (304) that the cached
+    # response is still current
+    response = fetch_with_retry(url, http_slots, cache.conditional_headers(session_key, url))
+    if response.status == 304:
+        response.release_conn()
+        http_slots.release()
+        return None
+    return response
+
+def fetch_and_store(session_key, driver_number, endpoint, cache, http_slots, s3_slots):
+    # Returns {key triplet: raw key}; the raw key is None when the response is unchanged since the last
+    # fetch or the API has nothing to store for it
+    url = f"https://api.openf1.org/v1/{endpoint}?session_key={session_key}&driver_number={driver_number}"
+    key_triplet = f"{session_key}_{driver_number}_{endpoint}"
+    print(f"📡 Fetching {endpoint} for session={session_key}, driver={driver_number}")
+    response = fetch_cached(cache, session_key, url, http_slots)
+    if response is None:
+        print(f"♻️ {endpoint} for session={session_key}, driver={driver_number} not modified")
+        return {key_triplet: None}
+
+    try:
+        if response.status != 200:
+            response.release_conn()
+            check_status(response, url)
+            print(f"⚠️ No {endpoint} for session={session_key}, driver={driver_number}. Status: {response.status}")
+            return {key_triplet: None}
+
+        upload = new_upload(session_key, driver_number, endpoint, s3_slots)
+        digest = stream_to_uploads(
+            response, {driver_number: upload}, lambda item: upload,
+            lambda digest: not cache.unchanged(session_key, url, digest)
+        )
+    finally:
+        http_slots.release()
 
+    if digest is None:
+        print(f"♻️ {endpoint} for session={session_key}, driver={driver_number} unchanged, not stored again")
+        return {key_triplet: None}
+    cache.record(session_key, url, digest, response.headers)
+    print(f"✅ Stored {endpoint} at {upload.key}")
+    return {key_triplet: upload.key}
+
+def fetch_session_and_fan_out(session_key, endpoint, driver_numbers, processed, cache, http_slots, s3_slots):
+    # One request for the whole session, written back out per driver in the usual layout
+    url = f"https://api.openf1.org/v1/{endpoint}?session_key={session_key}"
+    print(f"📡 Fetching {endpoint} for session={session_key} ({len(driver_numbers)} drivers requested)")
+    response = fetch_cached(cache, session_key, url, http_slots)
+    if response is None:
+        print(f"♻️ {endpoint} for session={session_key} not modified")
+        return {f"{session_key}_{driver_number}_{endpoint}": None for driver_number in driver_numbers}
+
+    try:
+        if response.status != 200:
+            response.release_conn()
+            check_status(response, url)
+            print(f"⚠️ No {endpoint} for session={session_key}. Status: {response.status}")
+            return {f"{session_key}_{driver_number}_{endpoint}": None for driver_number in driver_numbers}
+
+        uploads = {
+            str(driver_number): new_upload(session_key, driver_number, endpoint, s3_slots)
+            for driver_number in driver_numbers
+        }
+
+        def upload_for(item):
+            driver_number = item.get('driver_number')
+            if driver_number is None:
+                return None
+            if str(driver_number) not in uploads:
+                # Drivers not in this batch are stored too, so their own messages become no-ops
+                if f"{session_key}_{driver_number}_{endpoint}" in processed:
+                    return None
+                uploads[str(driver_number)] = new_upload(session_key, driver_number, endpoint, s3_slots)
+            return uploads[str(driver_number)]
+
+        digest = stream_to_uploads(
+            response, uploads, upload_for, lambda digest: not cache.unchanged(session_key, url, digest)
+        )
+    finally:
+        http_slots.release()
+
+    if digest is None:
+        print(f"♻️ {endpoint} for session={session_key} unchanged, not stored again")
+        return {f"{session_key}_{driver_number}_{endpoint}": None for driver_number in driver_numbers}
+    cache.record(session_key, url, digest, response.headers)
+    print(f"✅ Stored {endpoint} for session={session_key}, {len(uploads)} drivers")
+    return {f"{session_key}_{driver_number}_{endpoint}": upload.key for driver_number, upload in uploads.items()}
+
+@metrics.instrumented("endPointsIngestion")
 def lambda_handler(event, context):
-    metadata = load_metadata()
-    processed = metadata.get("ingested", [])
-    new_entries = []
+    state = ShardedStateStore(s3, S3_BUCKET, STATE_PREFIX)
+    import_legacy(s3, S3_BUCKET, LEGACY_METADATA_KEY, state, session_of, lambda metadata: metadata.get("ingested", []))
+    cache = ResponseCache(s3, S3_BUCKET)
+    result = BatchResult(s3, S3_BUCKET, "endPointsIngestion")
+    processed_set = set()
+    # key triplet -> raw key written, or None if the response matched the stored one or had no data
+    new_entries = {}
+    # message -> the key triplets it asked for, to report failures per message
+    record_triplets = []
 
+    items = []
     for record in event['Records']:
-        body = json.loads(record['body'])
-        session_key = body.get('session_key')
-        driver_number = body.get('driver_number')
+        try:
+            body = json.loads(record['body'])
+            session_key = body.get('session_key')
+            driver_number = body.get('driver_number')
+        except (json.JSONDecodeError, AttributeError) as e:
+            result.dead_letter(record, f"unreadable body: {e}")
+            continue
 
         if not session_key or not driver_number:
             print(f"❌ Missing session_key or driver_number: {body}")
+            result.dead_letter(record, "no session_key or driver_number in message")
             continue
 
+        triplets = []
         for endpoint in ENDPOINTS:
             key_triplet = f"{session_key}_{driver_number}_{endpoint}"
-            if key_triplet in processed:
+            if key_triplet in processed_set or state.contains(session_key, key_triplet):
                 print(f"⚠️ Already processed {key_triplet}, skipping.")
                 continue
+            processed_set.add(key_triplet)
+            items.append((session_key, driver_number, endpoint))
+            triplets.append(key_triplet)
+        record_triplets.append((record, triplets))
 
-            url = f"https://api.openf1.org/v1/{endpoint}?session_key={session_key}&driver_number={driver_number}"
-            print(f"📡 Fetching {endpoint} for session={session_key}, driver={driver_number}")
-            response = http.request('GET', url)
+    # Fetch and store concurrently: separate in-flight limits for the OpenF1 API and for S3 uploads
+    start = time.perf_counter()
+    http_slots = threading.BoundedSemaphore(HTTP_MAX_IN_FLIGHT)
+    s3_slots = threading.BoundedSemaphore(S3_MAX_IN_FLIGHT)
+    with ThreadPoolExecutor(max_workers=HTTP_MAX_IN_FLIGHT + S3_MAX_IN_FLIGHT) as executor:
+        # Claim items first so consumers running in parallel never fetch the same item twice
+        claims = executor.map(lambda item: state.claim(item[0], f"{item[0]}_{item[1]}_{item[2]}"), items)
+        claims = list(zip(items, claims))
+        # Items claimed by another consumer are retried with their message, in case that consumer crashed
+        held = {f"{item[0]}_{item[1]}_{item[2]}" for item, is_claimed in claims if not is_claimed}
+        if held:
+            print(f"🔒 {len(held)} items are being processed by another consumer, retrying their messages.")
+        items = [item for item, is_claimed in claims if is_claimed]
+        # Cache shards are loaded here so the worker threads only read them
+        for session_key in {item[0] for item in items}:
+            cache.load(session_key)
 
-            if response.status != 200:
-                print(f"❌ Failed to fetch {endpoint}. Status: {response.status}")
-                continue
+        if FETCH_MODE == 'session':
+            session_endpoints = {}
+            for session_key, driver_number, endpoint in items:
+                session_endpoints.setdefault((session_key, endpoint), []).append(driver_number)
+            # Shards are loaded up front; the worker threads only read this set
+            for session_key, _ in session_endpoints:
+                processed_set.update(state.load(session_key))
+            futures = {
+                executor.submit(
+                    fetch_session_and_fan_out, session_key, endpoint, driver_numbers,
+                    processed_set, cache, http_slots, s3_slots
+                ): f"{session_key}_{endpoint}"
+                for (session_key, endpoint), driver_numbers in session_endpoints.items()
+            }
+        else:
+            futures = {
+                executor.submit(fetch_and_store, session_key, driver_number, endpoint, cache, http_slots, s3_slots):
+                    f"{session_key}_{driver_number}_{endpoint}"
+                for session_key, driver_number, endpoint in items
+            }
+        for future, item_key in futures.items():
+            try:
+                new_entries.update(future.result())
+            except Exception as e:
+                print(f"❌ Failed {item_key}: {e}")
+    elapsed = time.perf_counter() - start
 
-            data = json.loads(response.data.decode('utf-8'))
-            date_today = datetime.utcnow().strftime("%Y-%m-%d")
+    # Release the claims of failed items so the next delivery can retry them right away
+    failed = set()
+    for session_key, driver_number, endpoint in items:
+        if f"{session_key}_{driver_number}_{endpoint}" not in new_entries:
+            state.release(session_key, f"{session_key}_{driver_number}_{endpoint}")
+            failed.add(f"{session_key}_{driver_number}_{endpoint}")
 
-            s3_key = f"raw_data/{endpoint}_raw/{session_key}/{driver_number}/{endpoint}_{date_today}.json"
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key,
-                Body=json.dumps(data)
-            )
-            print(f"✅ Stored {endpoint} at {s3_key}")
+    # Only messages with a failed or held item come back; their stored items are skipped next time
+    for record, triplets in record_triplets:
+        failed_triplets = [key_triplet for key_triplet in triplets if key_triplet in failed]
+        held_triplets = [key_triplet for key_triplet in triplets if key_triplet in held]
+        if failed_triplets:
+            result.fail(record, f"{len(failed_triplets)} of {len(triplets)} endpoints failed: {failed_triplets}")
+        elif held_triplets:
+            result.retry_later(record, sqs, f"{len(held_triplets)} endpoints claimed by another consumer: {held_triplets}")
 
-            new_entries.append(key_triplet)
+    raw_keys = sorted(key for key in new_entries.values() if key is not None)
+    print(f"⏱️ Stored {len(raw_keys)} of {len(new_entries)} items from {len(futures)} requests in {elapsed:.2f}s "
+          f"({len(new_entries) / elapsed if elapsed else 0:.1f} items/s)")
 
-    # 🔁 Save updated metadata
-    processed.extend(new_entries)
-    metadata['ingested'] = processed
-    save_metadata(metadata)
+    # 🔁 Append the new entries to their session shards
+    for key_triplet in new_entries:
+        state.add(session_of(key_triplet), key_triplet)
+    state.flush()
     print(f"📝 Updated metadata with {len(new_entries)} new entries.")
+    # Only after the data and state are stored, so a failed run is never mistaken for cached
+    cache.flush()
 
-    # 📤 Send message to Transformation_Q (only once per batch)
-    transformation_message = {
-        "meetings_raw": True,
-        "sessions_raw": True,
-        "drivers_raw": True,
-        "laps_raw": True
-    }
-
-    sqs.send_message(
-        QueueUrl=TRANSFORM_QUEUE_URL,
-        MessageBody=json.dumps(transformation_message)
-    )
-    print(f"📤 Sent transformation trigger to SQS: {transformation_message}")
+    # 📤 Send the exact raw keys written to Transformation_Q; unchanged responses need no transform
+    publisher = BatchPublisher(sqs, TRANSFORM_QUEUE_URL)
+    send_raw_keys(publisher, raw_keys)
+    publisher.flush()
 
-    return {
-        "statusCode": 200,
-        "body": f"✅ Processed {len(new_entries)} new (session, driver, endpoint) items"
-    }
+    return result.response(
+        f"✅ Processed {len(new_entries)} new (session, driver, endpoint) items, "
+        f"{len(new_entries) - len(raw_keys)} unchanged."
+    )
 
@@ -1,41 +1,25 @@
-import boto3
 import json
-import urllib3
+import metrics
+from connections import http_pool
+from rawCodec import put_records
+from sqsBatch import BatchPublisher, send_raw_keys
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import client
 
-sqs = boto3.client('sqs')
-s3 = boto3.client('s3')
-http = urllib3.PoolManager()
+sqs = metrics.InstrumentedSQS(client('sqs'))
+s3 = metrics.InstrumentedS3(client('s3'))
+http = metrics.InstrumentedHttp(http_pool())
 
 QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Meeting_id_Q'
+TRANSFORM_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Transform_Q'
 S3_BUCKET = 'f1-75'
 S3_FOLDER = 'raw_data/meetings_raw/'
-METADATA_KEY = 'metadata/processed_meetings.json'
-
-def read_metadata():
-    try:
-        response = s3.get_object(Bucket=S3_BUCKET, Key=METADATA_KEY)
-        data = response['Body'].read()
-        processed_meetings = json.loads(data)
-        print(f"📋 Loaded metadata with {len(processed_meetings)} meetings")
-        return processed_meetings
-    except s3.exceptions.NoSuchKey:
-        print("⚠️ Metadata file not found, initializing empty list")
-        return []
-    except Exception as e:
-        print(f"❌ Error reading metadata: {e}")
-        return []
-
-def write_metadata(processed_meetings):
-    try:
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=METADATA_KEY,
-            Body=json.dumps(processed_meetings)
-        )
-        print(f"✅ Updated metadata with {len(processed_meetings)} meetings")
-    except Exception as e:
-        print(f"❌ Error writing metadata: {e}")
+# Processed meeting keys, sharded by season
+STATE_PREFIX = 'metadata/meetings/'
+LEGACY_METADATA_KEY = 'metadata/processed_meetings.json'
+SEASON = "2025"
 
+@metrics.instrumented("meetingIdIngestion")
 def lambda_handler(event, context):
     url = 'https://api.openf1.org/v1/meetings'
     response = http.request('GET', url)
@@ -44,28 +28,28 @@ def lambda_handler(event, context):
         raise Exception("Failed to fetch meetings")
 
     meetings = json.loads(response.data.decode('utf-8'))
-    meetings_2025 = [m for m in meetings if m.get('date_start', '').startswith("2025")]
+    meetings_2025 = [m for m in meetings if m.get('date_start', '').startswith(SEASON)]
 
-    processed_meetings = read_metadata()
+    state = ShardedStateStore(s3, S3_BUCKET, STATE_PREFIX)
+    import_legacy(s3, S3_BUCKET, LEGACY_METADATA_KEY, state, lambda meeting_key: SEASON)
+    publisher = BatchPublisher(sqs, QUEUE_URL)
+    new_raw_keys = []
     count_sent = 0
     for meeting in meetings_2025:
         meeting_key = meeting["meeting_key"]
         
-        if meeting_key in processed_meetings:
+        if state.contains(SEASON, meeting_key):
             print(f"📂 Meeting {meeting_key} already processed, skipping...")
             continue
 
-        # Construct S3 key correctly (you missed year and meeting name in your snippet)
+        # raw_data/meetings_raw/{year}_{meeting_name}_{meeting_key}; the meeting is recorded in the
+        # sharded state store (season shard) only after it is stored and queued
         year = meeting.get("date_start", "")[:4]
         meeting_name = meeting.get("meeting_name", "").replace(" ", "_")
-        s3_key = f"{S3_FOLDER}{year}_{meeting_name}_{meeting_key}.json"
+        s3_key = f"{S3_FOLDER}{year}_{meeting_name}_{meeting_key}"
 
-        # Save meeting JSON to S3
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=s3_key,
-            Body=json.dumps(meeting)
-        )
+        # Save meeting as compressed NDJSON to S3
+        new_raw_keys.append(put_records(s3, S3_BUCKET, s3_key, [meeting]))
         print(f"✅ Stored meeting {meeting_key} in S3")
 
         # Send message to SQS
@@ -73,17 +57,23 @@ def lambda_handler(event, context):
             "meeting_key": meeting_key,
             "meeting_name": meeting.get("meeting_name")
         }
-        sqs.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps(message)
-        )
-        print(f"📤 Sent meeting {meeting_key} to SQS")
+        publisher.send(message)
+        print(f"📤 Queued meeting {meeting_key} for SQS")
 
-        processed_meetings.append(meeting_key)
+        state.add(SEASON, meeting_key)
         count_sent += 1
 
-    # Update metadata after processing all
-    write_metadata(processed_meetings)
+    # Send any partial batch before recording the meetings as processed
+    publisher.flush()
+    transform_publisher = BatchPublisher(sqs, TRANSFORM_QUEUE_URL)
+    send_raw_keys(transform_publisher, new_raw_keys)
+    transform_publisher.flush()
+
+    # Append the new meetings to the season shard as one delta object
+    try:
+        state.flush()
+    except Exception as e:
+        print(f"❌ Error writing metadata: {e}")
 
     return {
         "statusCode": 200,
@@ -0,0 +1,279 @@
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+# Per-invocation stage metrics: calls, busy seconds, bytes, retries and errors per stage
+# (http.fetch, s3.get, s3.put, s3.list, sqs.send, state.load, state.save, pandas.*, ...).
+# Stages can nest (state.load contains s3.list/s3.get) and threads add up, so stage seconds
+# are busy time, not shares of the wall clock; the "handler" stage is the wall clock.
+#
+# At the end of each invocation one JSON line per stage is printed in CloudWatch Embedded
+# Metric Format, so CloudWatch extracts the metrics from the logs and
+# benchmarks/summarizeMetrics.py can total them locally.
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'F1Pipeline')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+# Durations kept per stage for percentiles; later calls still count in the totals
+MAX_SAMPLES = 10000
+METRIC_FIELDS = {
+    "Calls": "Count",
+    "Seconds": "Seconds",
+    "Bytes": "Bytes",
+    "Retries": "Count",
+    "Errors": "Count",
+    "P50Ms": "Milliseconds",
+    "P95Ms": "Milliseconds",
+    "MaxMs": "Milliseconds"
+}
+MISSING_CODES = {"NoSuchKey", "404"}
+
+
+class Invocation:
+    def __init__(self, function):
+        self.function = function
+        self.lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, seconds=0.0, nbytes=0, calls=1, retries=0, errors=0):
+        with self.lock:
+            totals = self.stages.setdefault(
+                stage, {"calls": 0, "seconds": 0.0, "bytes": 0, "retries": 0, "errors": 0, "samples": []}
+            )
+            totals["calls"] += calls
+            totals["seconds"] += seconds
+            totals["bytes"] += nbytes
+            totals["retries"] += retries
+            totals["errors"] += errors
+            if calls and len(totals["samples"]) < MAX_SAMPLES:
+                totals["samples"].append(seconds)
+
+    def lines(self):
+        timestamp = int(time.time() * 1000)
+        with self.lock:
+            stages = sorted(self.stages.items())
+        for stage, totals in stages:
+            samples = sorted(totals["samples"]) or [0.0]
+            yield {
+                "_aws": {
+                    "Timestamp": timestamp,
+                    "CloudWatchMetrics": [{
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["Function", "Stage"]],
+                        "Metrics": [{"Name": name, "Unit": unit} for name, unit in METRIC_FIELDS.items()]
+                    }]
+                },
+                "Function": self.function,
+                "Stage": stage,
+                "Calls": totals["calls"],
+                "Seconds": round(totals["seconds"], 6),
+                "Bytes": totals["bytes"],
+                "Retries": totals["retries"],
+                "Errors": totals["errors"],
+                "P50Ms": round(percentile(samples, 50) * 1000, 3),
+                "P95Ms": round(percentile(samples, 95) * 1000, 3),
+                "MaxMs": round(samples[-1] * 1000, 3)
+            }
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile of an already sorted, non-empty list
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+_current = Invocation("unknown")
+
+
+def record(stage, seconds=0.0, nbytes=0, calls=1, retries=0, errors=0):
+    _current.record(stage, seconds, nbytes, calls, retries, errors)
+
+
+def retry(stage):
+    record(stage, calls=0, retries=1)
+
+
+class Span:
+    # Handed out by timed(); set .bytes once the size is known
+    def __init__(self):
+        self.bytes = 0
+
+
+class timed:
+    # with metrics.timed("pandas.to_csv") as span: ...; span.bytes = n
+    def __init__(self, stage):
+        self.stage = stage
+        self.span = Span()
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        record(self.stage, time.perf_counter() - self.start, self.span.bytes, errors=int(exc_type is not None))
+        return False
+
+
+def emit():
+    if not METRICS_ENABLED:
+        return
+    for line in _current.lines():
+        print(json.dumps(line))
+
+
+def instrumented(function):
+    # Decorates a lambda_handler: fresh metrics per invocation, emitted even when it raises
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            global _current
+            _current = Invocation(function)
+            try:
+                with timed("handler"):
+                    return handler(event, context)
+            finally:
+                emit()
+        return wrapper
+    return decorator
+
+
+def _body_size(body):
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    return 0
+
+
+class _TimedStream:
+    # Streaming bodies transfer after the call returns; their read time and bytes go to the same stage
+    def __init__(self, stream, stage):
+        self._stream = stream
+        self._stage = stage
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+    def _chunks(self, chunks):
+        chunks = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            if chunk is None:
+                return
+            record(self._stage, time.perf_counter() - start, len(chunk), calls=0)
+            yield chunk
+
+    def read(self, *args, **kwargs):
+        start = time.perf_counter()
+        data = self._stream.read(*args, **kwargs)
+        record(self._stage, time.perf_counter() - start, len(data), calls=0)
+        return data
+
+    def iter_chunks(self, *args, **kwargs):
+        return self._chunks(self._stream.iter_chunks(*args, **kwargs))
+
+    def stream(self, *args, **kwargs):
+        return self._chunks(self._stream.stream(*args, **kwargs))
+
+
+class InstrumentedS3:
+    # Proxy over an S3 client (boto3 or storageBackends) that records each call by stage
+    STAGES = {
+        "get_object": "s3.get",
+        "head_object": "s3.head",
+        "put_object": "s3.put",
+        "create_multipart_upload": "s3.put",
+        "upload_part": "s3.put",
+        "complete_multipart_upload": "s3.put",
+        "abort_multipart_upload": "s3.put",
+        "copy_object": "s3.put",
+        "delete_object": "s3.delete",
+        "list_objects_v2": "s3.list"
+    }
+
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        stage = self.STAGES.get(name)
+        if stage is None:
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                response = attr(*args, **kwargs)
+            except Exception as e:
+                # Looking up a key that isn't there is routine (state shards, legacy files), not a failure
+                code = getattr(e, 'response', {}).get('Error', {}).get('Code')
+                record(stage, time.perf_counter() - start, errors=int(code not in MISSING_CODES))
+                raise
+            record(stage, time.perf_counter() - start, _body_size(kwargs.get('Body')))
+            if 'Body' in response:
+                response['Body'] = _TimedStream(response['Body'], stage)
+            return response
+        return call
+
+    def get_paginator(self, operation_name):
+        return _InstrumentedPaginator(self._client.get_paginator(operation_name), self.STAGES[operation_name])
+
+
+class _InstrumentedPaginator:
+    def __init__(self, paginator, stage):
+        self._paginator = paginator
+        self._stage = stage
+
+    def paginate(self, **kwargs):
+        pages = iter(self._paginator.paginate(**kwargs))
+        while True:
+            start = time.perf_counter()
+            page = next(pages, None)
+            if page is None:
+                return
+            record(self._stage, time.perf_counter() - start)
+            yield page
+
+
+class InstrumentedSQS:
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in ("send_message", "send_message_batch"):
+            return attr
+
+        def call(*args, **kwargs):
+            bodies = [kwargs['MessageBody']] if 'MessageBody' in kwargs else [
+                entry['MessageBody'] for entry in kwargs.get('Entries', [])
+            ]
+            with timed("sqs.send") as span:
+                response = attr(*args, **kwargs)
+                span.bytes = sum(_body_size(body) for body in bodies)
+            if response.get('Failed'):
+                record("sqs.send", calls=0, errors=len(response['Failed']))
+            return response
+        return call
+
+
+class InstrumentedHttp:
+    # Proxy over a urllib3 PoolManager; streamed response bodies count toward http.fetch as they are read
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    def request(self, method, url, **kwargs):
+        with timed("http.fetch") as span:
+            response = self._pool.request(method, url, **kwargs)
+            if kwargs.get('preload_content', True):
+                span.bytes = len(response.data or b'')
+        if response.status >= 400:
+            record("http.fetch", calls=0, errors=1)
+        if not kwargs.get('preload_content', True):
+            return _TimedStream(response, "http.fetch")
+        return response
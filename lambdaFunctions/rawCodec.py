@@ -0,0 +1,219 @@
+import codecs
+import contextlib
+import json
+import metrics
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Raw objects are newline-delimited JSON, compressed with RAW_COMPRESSION: 'gzip', 'zstd' or 'none'
+RAW_COMPRESSION = os.environ.get('RAW_COMPRESSION', 'gzip')
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', '3'))
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', str(256 * 1024)))
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE', str(8 * 1024 * 1024)))
+
+if RAW_COMPRESSION == 'zstd' and zstandard is None:
+    print("⚠️ zstandard is not installed, falling back to gzip for raw objects")
+    RAW_COMPRESSION = 'gzip'
+
+RAW_SUFFIXES = {
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+    'none': '.ndjson'
+}
+# Everything a reader may find in the raw zone, including plain JSON written before compression
+RAW_KEY_SUFFIXES = ('.json', '.ndjson', '.ndjson.gz', '.ndjson.zst')
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def raw_key(base_key):
+    # base_key has no extension, e.g. raw_data/laps_raw/9158/1/laps_2025-03-16
+    return f"{base_key}{RAW_SUFFIXES[RAW_COMPRESSION]}"
+
+
+def is_raw_key(key):
+    return key.endswith(RAW_KEY_SUFFIXES)
+
+
+def strip_raw_suffix(key):
+    for suffix in sorted(RAW_KEY_SUFFIXES, key=len, reverse=True):
+        if key.endswith(suffix):
+            return key[:-len(suffix)]
+    return key
+
+
+def put_args():
+    args = {"ContentType": "application/x-ndjson"}
+    if RAW_COMPRESSION != 'none':
+        args["ContentEncoding"] = RAW_COMPRESSION
+    return args
+
+
+class _Identity:
+    def compress(self, data):
+        return data
+
+    def flush(self):
+        return b''
+
+
+def new_compressor():
+    if RAW_COMPRESSION == 'gzip':
+        return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    if RAW_COMPRESSION == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return _Identity()
+
+
+def encode_records(records):
+    compressor = new_compressor()
+    body = b''.join(compressor.compress(json.dumps(record).encode('utf-8') + b'\n') for record in records)
+    return body + compressor.flush()
+
+
+def put_records(s3, bucket, base_key, records):
+    key = raw_key(base_key)
+    with metrics.timed("json.encode") as span:
+        body = encode_records(records)
+        span.bytes = len(body)
+    s3.put_object(Bucket=bucket, Key=key, Body=body, **put_args())
+    return key
+
+
+def decompressed_chunks(chunks):
+    # Detect gzip/zstd from the magic bytes of the first chunk; anything else passes through
+    chunks = iter(chunks)
+    first = b''
+    for chunk in chunks:
+        first += chunk
+        if len(first) >= len(ZSTD_MAGIC):
+            break
+
+    if first.startswith(GZIP_MAGIC):
+        decompressor = zlib.decompressobj(47)
+    elif first.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed raw object found but zstandard is not installed")
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        yield first
+        yield from chunks
+        return
+
+    yield decompressor.decompress(first)
+    for chunk in chunks:
+        yield decompressor.decompress(chunk)
+    if hasattr(decompressor, 'flush'):
+        yield decompressor.flush()
+
+
+def iter_records(chunks):
+    # Yield records from a JSON array, a single JSON object or newline-delimited JSON as bytes stream in
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    started = False
+    chunks = decompressed_chunks(chunks)
+    while True:
+        chunk = next(chunks, None)
+        final = chunk is None
+        buffer = buffer[pos:] + text_decoder.decode(chunk or b'', final=final)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                break
+            if not started:
+                started = True
+                if buffer[pos] == '[':
+                    pos += 1
+                # Otherwise the values are read one after another (NDJSON or a single object)
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                break
+            if not isinstance(item, (dict, list)) and not final and (
+                    end == len(buffer) or buffer[end] not in ' \t\r\n,]'):
+                # A bare scalar is only complete once a delimiter follows it
+                break
+            yield item
+            pos = end
+        if final:
+            return
+
+
+def read_records(s3, bucket, key):
+    obj = s3.get_object(Bucket=bucket, Key=key)
+    return list(iter_records(obj['Body'].iter_chunks(STREAM_CHUNK_SIZE)))
+
+
+class RecordUpload:
+    # Streams records to S3 as compressed NDJSON: one PUT when small, fixed-size multipart parts when large
+
+    def __init__(self, s3, bucket, base_key, s3_slots=None):
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = raw_key(base_key)
+        self.s3_slots = s3_slots or contextlib.nullcontext()
+        self.compressor = new_compressor()
+        self.buffer = bytearray()
+        self.count = 0
+        self.upload_id = None
+        self.parts = []
+
+    def write(self, record):
+        self.buffer += self.compressor.compress(json.dumps(record).encode('utf-8') + b'\n')
+        self.count += 1
+        if len(self.buffer) >= MULTIPART_PART_SIZE:
+            self._upload_part(bytes(self.buffer[:MULTIPART_PART_SIZE]))
+            del self.buffer[:MULTIPART_PART_SIZE]
+
+    def _upload_part(self, body):
+        with self.s3_slots:
+            if self.upload_id is None:
+                self.upload_id = self.s3.create_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, **put_args()
+                )['UploadId']
+            part_number = len(self.parts) + 1
+            response = self.s3.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                PartNumber=part_number,
+                Body=body
+            )
+        self.parts.append({"ETag": response['ETag'], "PartNumber": part_number})
+
+    def complete(self):
+        self.buffer += self.compressor.flush()
+        if self.upload_id is None:
+            with self.s3_slots:
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer), **put_args())
+            return
+        self._upload_part(bytes(self.buffer))
+        with self.s3_slots:
+            self.s3.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts}
+            )
+        print(f"📦 Multipart upload of {self.key} completed in {len(self.parts)} parts")
+
+    def abort(self):
+        if self.upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
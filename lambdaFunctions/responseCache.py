@@ -0,0 +1,69 @@
+import hashlib
+import json
+import threading
+import time
+from stateStore import ShardedStateStore
+
+# What each OpenF1 request URL last returned: the SHA-256 of the body and the HTTP validators.
+# A fetch whose body hashes the same as last time is neither stored again nor transformed, and
+# the validators are sent back as If-None-Match / If-Modified-Since so the API can answer 304.
+#
+# Entries live in a ShardedStateStore (one shard per session_key), as JSON-encoded items
+# [url_hash, fetched_at_ms, sha256, etag, last_modified]; the newest entry per URL wins.
+CACHE_PREFIX = 'metadata/responses/'
+
+
+def url_hash(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+class ResponseCache:
+    # load() shards from one thread first; unchanged()/record() are then safe from worker threads
+
+    def __init__(self, s3, bucket, prefix=CACHE_PREFIX):
+        self.store = ShardedStateStore(s3, bucket, prefix)
+        self.lock = threading.Lock()
+        self.latest = {}
+
+    def load(self, shard):
+        shard = str(shard)
+        if shard not in self.latest:
+            entries = {}
+            for item in self.store.load(shard):
+                entry = json.loads(item)
+                if entry[0] not in entries or entry[1] > entries[entry[0]][1]:
+                    entries[entry[0]] = entry
+            self.latest[shard] = entries
+        return self.latest[shard]
+
+    def _entry(self, shard, url):
+        with self.lock:
+            return self.latest[str(shard)].get(url_hash(url))
+
+    def conditional_headers(self, shard, url):
+        entry = self._entry(shard, url)
+        headers = {}
+        if entry and entry[3]:
+            headers['If-None-Match'] = entry[3]
+        if entry and entry[4]:
+            headers['If-Modified-Since'] = entry[4]
+        return headers
+
+    def unchanged(self, shard, url, digest):
+        entry = self._entry(shard, url)
+        return entry is not None and entry[2] == digest
+
+    def record(self, shard, url, digest, headers):
+        # Call only once the body is safely stored; kept until flush()
+        entry = [url_hash(url), int(time.time() * 1000), digest,
+                 headers.get('ETag', ''), headers.get('Last-Modified', '')]
+        with self.lock:
+            self.latest[str(shard)][entry[0]] = entry
+            self.store.add(shard, json.dumps(entry))
+
+    def flush(self):
+        return self.store.flush()
+
+
+def sha256_of(data):
+    return hashlib.sha256(data).hexdigest()
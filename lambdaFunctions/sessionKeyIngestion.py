@@ -1,90 +1,94 @@
-import boto3
 import json
-import urllib3
-
-http = urllib3.PoolManager()
-sqs = boto3.client('sqs')
-s3 = boto3.client('s3')
+import metrics
+from batchResults import BatchResult
+from connections import http_pool
+from rawCodec import put_records, raw_key, strip_raw_suffix
+from sqsBatch import BatchPublisher, send_raw_keys
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import client
+
+http = metrics.InstrumentedHttp(http_pool())
+sqs = metrics.InstrumentedSQS(client('sqs'))
+s3 = metrics.InstrumentedS3(client('s3'))
 
 SESSION_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Session_id_Q'
+TRANSFORM_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Transform_Q'
 S3_BUCKET = 'f1-75'
 S3_FOLDER = 'raw_data/sessions_raw/'
-METADATA_KEY = 'metadata/processed_sessions.json'
-
-def read_metadata():
-    try:
-        response = s3.get_object(Bucket=S3_BUCKET, Key=METADATA_KEY)
-        data = response['Body'].read()
-        processed_sessions = json.loads(data)
-        print(f"📋 Loaded metadata with {len(processed_sessions)} sessions")
-        return processed_sessions
-    except s3.exceptions.NoSuchKey:
-        print("⚠️ Metadata file not found, initializing empty list")
-        return []
-    except Exception as e:
-        print(f"❌ Error reading metadata: {e}")
-        return []
-
-def write_metadata(processed_sessions):
-    try:
-        s3.put_object(
-            Bucket=S3_BUCKET,
-            Key=METADATA_KEY,
-            Body=json.dumps(processed_sessions)
-        )
-        print(f"✅ Updated metadata with {len(processed_sessions)} sessions")
-    except Exception as e:
-        print(f"❌ Error writing metadata: {e}")
-
-def lambda_handler(event, context):
-    processed_sessions = read_metadata()
+# Processed session keys, sharded by meeting_key
+STATE_PREFIX = 'metadata/sessions/'
+LEGACY_METADATA_KEY = 'metadata/processed_sessions.json'
+
+def stored_session_meetings():
+    # The legacy list has no meeting_key; recover it from raw_data/sessions_raw/{meeting_key}/{session_key}
+    meetings = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=S3_FOLDER):
+        for obj in page.get('Contents', []):
+            parts = strip_raw_suffix(obj['Key'][len(S3_FOLDER):]).split('/')
+            if len(parts) == 2:
+                meetings[parts[1]] = parts[0]
+    return meetings
+
+def migrate_legacy_state(state):
+    session_meetings = None
+
+    def meeting_of(session_key):
+        nonlocal session_meetings
+        if session_meetings is None:
+            session_meetings = stored_session_meetings()
+        return session_meetings.get(str(session_key))
+
+    import_legacy(s3, S3_BUCKET, LEGACY_METADATA_KEY, state, meeting_of)
+
+def process_meeting(meeting_key, state, publisher, new_raw_keys):
+    # Stores and queues the meeting's new sessions; raises if the meeting should be retried.
+    # Returns (sessions sent, sessions claimed by another consumer).
+    print(f"🔍 Fetching sessions for meeting_key: {meeting_key}")
+    url = f"https://api.openf1.org/v1/sessions?meeting_key={meeting_key}"
+    response = http.request('GET', url)
+
+    if response.status != 200:
+        raise RuntimeError(f"❌ Failed to fetch sessions for meeting_key {meeting_key}: status {response.status}")
+
+    sessions = json.loads(response.data.decode('utf-8'))
     count_sent = 0
+    held = []
 
-    for record in event['Records']:
-        body = json.loads(record['body'])
-        meeting_key = body.get('meeting_key')
-
-        if not meeting_key:
-            print("❌ No meeting_key found in message.")
+    for session in sessions:
+        session_key = session.get('session_key')
+        session_name = session.get('session_name')
+        if not session_key:
+            print("⚠️ Skipping session with missing session_key.")
             continue
 
-        print(f"🔍 Fetching sessions for meeting_key: {meeting_key}")
-        url = f"https://api.openf1.org/v1/sessions?meeting_key={meeting_key}"
-        response = http.request('GET', url)
-
-        if response.status != 200:
-            print(f"❌ Failed to fetch sessions for meeting_key: {meeting_key}")
+        if state.contains(meeting_key, session_key):
+            print(f"📂 Session {session_key} already processed, skipping...")
+            continue
+        if not state.claim(meeting_key, session_key):
+            print(f"🔒 Session {session_key} is being processed by another consumer")
+            held.append(session_key)
             continue
 
-        sessions = json.loads(response.data.decode('utf-8'))
-
-        for session in sessions:
-            session_key = session.get('session_key')
-            session_name = session.get('session_name')
-            if not session_key:
-                print("⚠️ Skipping session with missing session_key.")
-                continue
-
-            if session_key in processed_sessions:
-                print(f"📂 Session {session_key} already processed, skipping...")
-                continue
-
-            s3_key = f"{S3_FOLDER}{meeting_key}/{session_key}.json"
-            try:
-                s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
-                print(f"📂 Session {session_key} already in S3, skipping upload...")
-                continue
-            except s3.exceptions.ClientError as e:
-                if e.response['Error']['Code'] != "404":
-                    raise
-
-            # Upload session JSON to S3
-            s3.put_object(
-                Bucket=S3_BUCKET,
-                Key=s3_key,
-                Body=json.dumps(session)
-            )
-            print(f"✅ Stored session {session_key} in S3")
+        s3_key = f"{S3_FOLDER}{meeting_key}/{session_key}"
+        try:
+            s3.head_object(Bucket=S3_BUCKET, Key=raw_key(s3_key))
+            stored = True
+        except s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] != "404":
+                state.release(meeting_key, session_key)
+                raise
+            stored = False
+
+        try:
+            if stored:
+                # Stored by an earlier attempt that failed before the session was queued and recorded
+                print(f"📂 Session {session_key} already in S3, queuing it again...")
+                new_raw_keys.append(raw_key(s3_key))
+            else:
+                # Upload session as compressed NDJSON to S3
+                new_raw_keys.append(put_records(s3, S3_BUCKET, s3_key, [session]))
+                print(f"✅ Stored session {session_key} in S3")
 
             # Send message to SQS
             msg = {
@@ -92,20 +96,59 @@ def lambda_handler(event, context):
                 "session_key": session_key,
                 "session_name": session_name
             }
-            sqs.send_message(
-                QueueUrl=SESSION_QUEUE_URL,
-                MessageBody=json.dumps(msg)
-            )
-            print(f"📤 Sent session_key {session_key} to Session_id_Q")
+            publisher.send(msg)
+            print(f"📤 Queued session_key {session_key} for Session_id_Q")
+        except Exception:
+            # Free the session for the retry of this message
+            state.release(meeting_key, session_key)
+            raise
+
+        state.add(meeting_key, session_key)
+        count_sent += 1
+    return count_sent, held
+
+@metrics.instrumented("sessionKeyIngestion")
+def lambda_handler(event, context):
+    state = ShardedStateStore(s3, S3_BUCKET, STATE_PREFIX)
+    migrate_legacy_state(state)
+    publisher = BatchPublisher(sqs, SESSION_QUEUE_URL)
+    result = BatchResult(s3, S3_BUCKET, "sessionKeyIngestion")
+    new_raw_keys = []
+    count_sent = 0
 
-            processed_sessions.append(session_key)
-            count_sent += 1
+    # Each message succeeds or fails on its own; only failed ones are redelivered
+    for record in event['Records']:
+        try:
+            meeting_key = json.loads(record['body']).get('meeting_key')
+        except (json.JSONDecodeError, AttributeError) as e:
+            result.dead_letter(record, f"unreadable body: {e}")
+            continue
 
-    # Update metadata after processing all new sessions
-    write_metadata(processed_sessions)
+        if not meeting_key:
+            print("❌ No meeting_key found in message.")
+            result.dead_letter(record, "no meeting_key in message")
+            continue
 
-    return {
-        "statusCode": 200,
-        "body": f"✅ Processed sessions for all meeting_keys. Sent {count_sent} new sessions."
-    }
+        try:
+            sent, held = process_meeting(meeting_key, state, publisher, new_raw_keys)
+        except Exception as e:
+            result.fail(record, e)
+            continue
+        count_sent += sent
+        # Retried once the other consumer finishes or its claim expires, in case it crashed
+        if held:
+            result.retry_later(record, sqs, f"sessions {held} are claimed by another consumer")
+
+    # Send any partial batch before recording the sessions as processed
+    publisher.flush()
+    transform_publisher = BatchPublisher(sqs, TRANSFORM_QUEUE_URL)
+    send_raw_keys(transform_publisher, new_raw_keys)
+    transform_publisher.flush()
+
+    # Append the new sessions to their meeting shards
+    try:
+        state.flush()
+    except Exception as e:
+        print(f"❌ Error writing metadata: {e}")
 
+    return result.response(f"✅ Processed sessions for all meeting_keys. Sent {count_sent} new sessions.")
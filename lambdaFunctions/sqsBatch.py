@@ -0,0 +1,59 @@
+import json
+import metrics
+import time
+
+SQS_BATCH_SIZE = 10
+SEND_MAX_RETRIES = 3
+RETRY_BACKOFF_SECONDS = 0.2
+# Raw keys per transformation trigger; ten of these still fit the 256 KB batch limit
+RAW_KEYS_PER_MESSAGE = 200
+
+
+class BatchPublisher:
+    # Buffers messages and sends them in 10-entry send_message_batch calls
+
+    def __init__(self, sqs, queue_url):
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.pending = []
+        self.sent = 0
+        self.api_calls = 0
+
+    def send(self, message):
+        self.pending.append(json.dumps(message))
+        if len(self.pending) >= SQS_BATCH_SIZE:
+            self._send_batch(self.pending[:SQS_BATCH_SIZE])
+            del self.pending[:SQS_BATCH_SIZE]
+
+    def _send_batch(self, bodies):
+        entries = [{"Id": str(i), "MessageBody": body} for i, body in enumerate(bodies)]
+        for attempt in range(1, SEND_MAX_RETRIES + 1):
+            response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            self.api_calls += 1
+            self.sent += len(response.get('Successful', []))
+            failed = response.get('Failed', [])
+            if not failed:
+                return
+            # Only the failed entries are retried; sender faults will not succeed on retry
+            failed_ids = {f['Id'] for f in failed if not f.get('SenderFault')}
+            for f in failed:
+                print(f"⚠️ SQS entry {f['Id']} failed ({f.get('Code')}): {f.get('Message')}")
+            entries = [entry for entry in entries if entry["Id"] in failed_ids]
+            if not entries or attempt == SEND_MAX_RETRIES:
+                break
+            metrics.retry("sqs.send")
+            time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        raise RuntimeError(f"❌ Failed to send {len(failed)} messages to {self.queue_url}")
+
+    def flush(self):
+        while self.pending:
+            self._send_batch(self.pending[:SQS_BATCH_SIZE])
+            del self.pending[:SQS_BATCH_SIZE]
+        print(f"📤 Sent {self.sent} messages in {self.api_calls} batch calls to {self.queue_url}")
+
+
+def send_raw_keys(publisher, raw_keys):
+    # Tells transformation exactly which raw objects are new, so it never rescans the raw zone
+    raw_keys = list(raw_keys)
+    for i in range(0, len(raw_keys), RAW_KEYS_PER_MESSAGE):
+        publisher.send({"raw_keys": raw_keys[i:i + RAW_KEYS_PER_MESSAGE]})
@@ -0,0 +1,193 @@
+import json
+import metrics
+import os
+import time
+import uuid
+from storageBackends import CONFLICT_CODES
+
+# Compact a shard once a flush sees this many delta objects
+COMPACT_THRESHOLD = int(os.environ.get('STATE_COMPACT_THRESHOLD', '50'))
+COMPACT_MAX_RETRIES = 5
+# A claim older than this is treated as abandoned (longer than the Lambda timeout)
+CLAIM_TTL_SECONDS = int(os.environ.get('STATE_CLAIM_TTL_SECONDS', '900'))
+LOAD_MAX_RETRIES = 5
+BASE_NAME = "_base.json"
+
+
+class ShardedStateStore:
+    # Processed keys sharded by session/meeting. Only the shards a handler touches are loaded,
+    # membership is a set lookup, and each flush appends one small delta object per changed shard.
+    #
+    # Layout: {prefix}{shard}/{timestamp}-{uuid}.json   deltas, JSON lists of items (never overwritten)
+    #         {prefix}{shard}/_base.json               compacted deltas, replaced only with If-Match
+    #         {prefix}_claims/{shard}/{item}           in-progress markers, created with If-None-Match
+    #
+    # Deltas have unique keys, so concurrent consumers never overwrite each other's entries.
+    # The _claims/ prefix should have a short S3 lifecycle expiration.
+
+    def __init__(self, s3, bucket, prefix):
+        self.s3 = s3
+        self.bucket = bucket
+        self.prefix = prefix
+        self.shards = {}
+        self.delta_counts = {}
+        self.pending = {}
+
+    def _shard_prefix(self, shard):
+        return f"{self.prefix}{shard}/"
+
+    def _is_conflict(self, error):
+        return error.response['Error']['Code'] in CONFLICT_CODES
+
+    def _read_shard(self, shard):
+        # Returns (items, base ETag or None, delta keys). A compaction running concurrently may delete
+        # a delta between LIST and GET; its entries are then in the new base, so the read restarts.
+        for _ in range(LOAD_MAX_RETRIES):
+            keys = []
+            paginator = self.s3.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=self._shard_prefix(shard)):
+                for obj in page.get('Contents', []):
+                    if obj['Key'].endswith('.json'):
+                        keys.append(obj['Key'])
+
+            items, base_etag, delta_keys = set(), None, []
+            try:
+                for key in keys:
+                    obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+                    items.update(str(item) for item in json.loads(obj['Body'].read()))
+                    if key.endswith(f"/{BASE_NAME}"):
+                        base_etag = obj['ETag']
+                    else:
+                        delta_keys.append(key)
+            except self.s3.exceptions.NoSuchKey:
+                metrics.retry("state.load")
+                continue
+            return items, base_etag, delta_keys
+        raise RuntimeError(f"❌ State shard {self.prefix}{shard} kept changing while loading")
+
+    def load(self, shard):
+        shard = str(shard)
+        if shard not in self.shards:
+            with metrics.timed("state.load"):
+                items, _, delta_keys = self._read_shard(shard)
+            self.shards[shard] = items
+            self.delta_counts[shard] = len(delta_keys)
+            print(f"📋 Loaded state shard {self.prefix}{shard} with {len(items)} entries")
+        return self.shards[shard]
+
+    def contains(self, shard, item):
+        return str(item) in self.load(shard)
+
+    def add(self, shard, item):
+        shard, item = str(shard), str(item)
+        if item in self.load(shard):
+            return
+        self.shards[shard].add(item)
+        self.pending.setdefault(shard, []).append(item)
+
+    def flush(self):
+        count = 0
+        for shard, items in self.pending.items():
+            key = f"{self._shard_prefix(shard)}{int(time.time() * 1000)}-{uuid.uuid4().hex}.json"
+            with metrics.timed("state.save") as span:
+                body = json.dumps(items)
+                span.bytes = len(body)
+                self.s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+            count += len(items)
+            self.delta_counts[shard] = self.delta_counts.get(shard, 0) + 1
+            if self.delta_counts[shard] >= COMPACT_THRESHOLD:
+                self.compact(shard)
+        if self.pending:
+            print(f"✅ Appended {count} entries to {len(self.pending)} state shards under {self.prefix}")
+        self.pending = {}
+        return count
+
+    def compact(self, shard):
+        with metrics.timed("state.compact"):
+            return self._compact(shard)
+
+    def _compact(self, shard):
+        # Fold the deltas into _base.json with a conditional write; on a conflict re-read and merge again
+        base_key = f"{self._shard_prefix(shard)}{BASE_NAME}"
+        for attempt in range(1, COMPACT_MAX_RETRIES + 1):
+            items, base_etag, delta_keys = self._read_shard(shard)
+            condition = {"IfMatch": base_etag} if base_etag else {"IfNoneMatch": "*"}
+            try:
+                self.s3.put_object(Bucket=self.bucket, Key=base_key, Body=json.dumps(sorted(items)), **condition)
+            except self.s3.exceptions.ClientError as e:
+                if not self._is_conflict(e):
+                    raise
+                metrics.retry("state.compact")
+                print(f"🔁 Compaction of {self.prefix}{shard} lost a race, merging again (attempt {attempt})")
+                continue
+            # Only the deltas folded into this base are removed; newer ones stay
+            for key in delta_keys:
+                self.s3.delete_object(Bucket=self.bucket, Key=key)
+            self.shards[str(shard)] = self.shards.get(str(shard), set()) | items
+            self.delta_counts[str(shard)] = 0
+            print(f"🗜️ Compacted {len(delta_keys)} deltas into {base_key}")
+            return True
+        return False
+
+    def _claim_key(self, shard, item):
+        return f"{self.prefix}_claims/{shard}/{item}"
+
+    def claim(self, shard, item):
+        # Marks an item as in progress so parallel consumers don't fetch it twice; False if already claimed
+        with metrics.timed("state.claim"):
+            return self._claim(shard, item)
+
+    def _claim(self, shard, item):
+        key = self._claim_key(shard, item)
+        body = json.dumps({"claimed_at": time.time()})
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, IfNoneMatch="*")
+            return True
+        except self.s3.exceptions.ClientError as e:
+            if not self._is_conflict(e):
+                raise
+
+        # Take over an abandoned claim, again conditionally so only one consumer wins
+        try:
+            obj = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return False
+        if time.time() - json.loads(obj['Body'].read())["claimed_at"] < CLAIM_TTL_SECONDS:
+            return False
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, IfMatch=obj['ETag'])
+            return True
+        except self.s3.exceptions.ClientError as e:
+            if not self._is_conflict(e) and e.response['Error']['Code'] != "NoSuchKey":
+                raise
+            return False
+
+    def release(self, shard, item):
+        # Give up a claim after a failure so a retry can pick the item up immediately
+        self.s3.delete_object(Bucket=self.bucket, Key=self._claim_key(shard, item))
+
+
+def import_legacy(s3, bucket, legacy_key, store, shard_for, extract=lambda data: data):
+    # One-off move of a whole-file metadata object into the sharded store; a no-op once migrated
+    try:
+        obj = s3.get_object(Bucket=bucket, Key=legacy_key)
+    except s3.exceptions.NoSuchKey:
+        return 0
+    items = extract(json.loads(obj['Body'].read()))
+
+    skipped = 0
+    for item in items:
+        shard = shard_for(item)
+        if shard is None:
+            skipped += 1
+            continue
+        store.add(shard, item)
+    count = store.flush()
+
+    try:
+        s3.copy_object(Bucket=bucket, Key=f"{legacy_key}.migrated", CopySource={"Bucket": bucket, "Key": legacy_key})
+        s3.delete_object(Bucket=bucket, Key=legacy_key)
+    except s3.exceptions.NoSuchKey:
+        pass  # a concurrent invocation finished the migration first
+    print(f"📦 Migrated {count} entries from {legacy_key} ({skipped} without a shard)")
+    return count
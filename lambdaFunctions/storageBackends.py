@@ -0,0 +1,328 @@
+import hashlib
+import io
+import os
+import threading
+import uuid
+from connections import aws_config
+from datetime import datetime, timezone
+
+# Local stand-ins for the parts of the boto3 S3 and SQS clients the pipeline uses, for
+# offline runs, benchmarks and concurrency tests. Errors mirror botocore's shape
+# (e.response['Error']['Code']) so handler code is unchanged.
+#
+# F1_STORAGE_BACKEND picks what client() returns:
+#   'aws'    (default) real boto3 clients
+#   'memory' one process-wide InMemoryS3 / InMemorySQS shared by every module
+#   'local'  LocalFileS3 under F1_LOCAL_STORAGE_DIR, with the in-memory SQS
+
+STORAGE_BACKEND = os.environ.get('F1_STORAGE_BACKEND', 'aws')
+LOCAL_STORAGE_DIR = os.environ.get('F1_LOCAL_STORAGE_DIR', os.path.join(os.getcwd(), '.f1_storage'))
+LIST_PAGE_SIZE = 1000
+# Error codes S3 (and the backends here) return when a conditional write or delete loses a race
+CONFLICT_CODES = {"PreconditionFailed", "ConditionalRequestConflict", "412", "409"}
+
+
+class ClientError(Exception):
+    def __init__(self, code, operation, message="", status=400):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message}")
+        self.response = {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status}
+        }
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, operation, key):
+        super().__init__("NoSuchKey", operation, f"The specified key does not exist: {key}", 404)
+
+
+class _Exceptions:
+    ClientError = ClientError
+    NoSuchKey = NoSuchKey
+
+
+class StreamingBody:
+    def __init__(self, data):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class _Paginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix=""):
+        token = None
+        while True:
+            page = self.client.list_objects_v2(Bucket=Bucket, Prefix=Prefix, ContinuationToken=token)
+            yield page
+            token = page.get("NextContinuationToken")
+            if not token:
+                return
+
+
+def _to_bytes(body):
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    if hasattr(body, "read"):
+        return body.read()
+    return bytes(body)
+
+
+class InMemoryS3:
+    # Thread-safe, process-local S3 with ETags, conditional writes, pagination and multipart uploads
+
+    exceptions = _Exceptions
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.uploads = {}
+
+    def _keys(self, bucket, prefix):
+        return [key for b, key in self.objects if b == bucket and key.startswith(prefix)]
+
+    def _describe(self, bucket, key):
+        obj = self.objects[(bucket, key)]
+        return {"ETag": obj["ETag"], "LastModified": obj["LastModified"], "Size": len(obj["Body"])}
+
+    def _store(self, bucket, key, data, extra):
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        self.objects[(bucket, key)] = {
+            "Body": data,
+            "ETag": etag,
+            "LastModified": datetime.now(timezone.utc),
+            "ContentType": extra.get("ContentType"),
+            "ContentEncoding": extra.get("ContentEncoding")
+        }
+        return {"ETag": etag}
+
+    def put_object(self, Bucket, Key, Body=b"", IfMatch=None, IfNoneMatch=None, **extra):
+        data = _to_bytes(Body)
+        with self.lock:
+            current = self.objects.get((Bucket, Key))
+            if IfNoneMatch == "*" and current is not None:
+                raise ClientError("PreconditionFailed", "PutObject", "At least one of the pre-conditions you specified did not hold", 412)
+            if IfMatch is not None and (current is None or current["ETag"] != IfMatch):
+                if current is None:
+                    raise NoSuchKey("PutObject", Key)
+                raise ClientError("PreconditionFailed", "PutObject", "At least one of the pre-conditions you specified did not hold", 412)
+            return self._store(Bucket, Key, data, extra)
+
+    def get_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise NoSuchKey("GetObject", Key)
+        return {
+            "Body": StreamingBody(obj["Body"]),
+            "ETag": obj["ETag"],
+            "LastModified": obj["LastModified"],
+            "ContentLength": len(obj["Body"]),
+            "ContentType": obj["ContentType"],
+            "ContentEncoding": obj["ContentEncoding"]
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise ClientError("404", "HeadObject", "Not Found", 404)
+        return {"ETag": obj["ETag"], "LastModified": obj["LastModified"], "ContentLength": len(obj["Body"])}
+
+    def delete_object(self, Bucket, Key, IfMatch=None, **kwargs):
+        with self.lock:
+            if IfMatch is not None:
+                current = self.objects.get((Bucket, Key))
+                if current is None:
+                    raise NoSuchKey("DeleteObject", Key)
+                if current["ETag"] != IfMatch:
+                    raise ClientError("PreconditionFailed", "DeleteObject", "At least one of the pre-conditions you specified did not hold", 412)
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def copy_object(self, Bucket, Key, CopySource, **extra):
+        with self.lock:
+            source = self.objects.get((CopySource["Bucket"], CopySource["Key"]))
+            if source is None:
+                raise NoSuchKey("CopyObject", CopySource["Key"])
+            return {"CopyObjectResult": self._store(Bucket, Key, source["Body"], extra)}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=LIST_PAGE_SIZE, **kwargs):
+        with self.lock:
+            keys = sorted(self._keys(Bucket, Prefix))
+            if ContinuationToken:
+                keys = [key for key in keys if key > ContinuationToken]
+            page = keys[:MaxKeys]
+            contents = [{"Key": key, **self._describe(Bucket, key)} for key in page]
+        response = {"KeyCount": len(contents), "IsTruncated": len(keys) > MaxKeys}
+        if contents:
+            response["Contents"] = contents
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return _Paginator(self)
+
+    def create_multipart_upload(self, Bucket, Key, **extra):
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[upload_id] = {"Bucket": Bucket, "Key": Key, "Parts": {}, "Extra": extra}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        data = _to_bytes(Body)
+        with self.lock:
+            self.uploads[UploadId]["Parts"][PartNumber] = data
+        return {"ETag": f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        with self.lock:
+            upload = self.uploads.pop(UploadId)
+            data = b"".join(upload["Parts"][part["PartNumber"]] for part in MultipartUpload["Parts"])
+            return self._store(Bucket, Key, data, upload["Extra"])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self.lock:
+            self.uploads.pop(UploadId, None)
+        return {}
+
+
+class _FileObjects:
+    # The InMemoryS3 object table, kept as files under root/{bucket}/{key}
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def stat(self, bucket_key):
+        # ETags come from size and mtime, so listing never has to read file contents
+        stat = os.stat(self.path(*bucket_key))
+        return {
+            "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            "Size": stat.st_size
+        }
+
+    def get(self, bucket_key, default=None):
+        try:
+            with open(self.path(*bucket_key), "rb") as f:
+                data = f.read()
+            stat = self.stat(bucket_key)
+        except FileNotFoundError:
+            return default
+        return {
+            "Body": data,
+            "ETag": stat["ETag"],
+            "LastModified": stat["LastModified"],
+            "ContentType": None,
+            "ContentEncoding": None
+        }
+
+    def __setitem__(self, bucket_key, obj):
+        path = self.path(*bucket_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(obj["Body"])
+        os.replace(tmp_path, path)
+
+    def pop(self, bucket_key, default=None):
+        obj = self.get(bucket_key, default)
+        try:
+            os.remove(self.path(*bucket_key))
+        except FileNotFoundError:
+            pass
+        return obj
+
+
+class LocalFileS3(InMemoryS3):
+    # Same API on the local filesystem, so data survives between runs and can be inspected.
+    # Conditional writes are atomic within one process only.
+
+    def __init__(self, root=LOCAL_STORAGE_DIR):
+        super().__init__()
+        self.objects = _FileObjects(root)
+
+    def _keys(self, bucket, prefix):
+        base = os.path.join(self.objects.root, bucket)
+        keys = []
+        for directory, _, files in os.walk(base):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                key = os.path.relpath(os.path.join(directory, name), base).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        return keys
+
+    def _describe(self, bucket, key):
+        return self.objects.stat((bucket, key))
+
+    def _store(self, bucket, key, data, extra):
+        self.objects[(bucket, key)] = {"Body": data}
+        return {"ETag": self.objects.stat((bucket, key))["ETag"]}
+
+
+class InMemorySQS:
+    # Queues keyed by URL; the offline pipeline drains them to drive the next stage
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = {}
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        with self.lock:
+            self.queues.setdefault(QueueUrl, []).append(MessageBody)
+        return {"MessageId": uuid.uuid4().hex}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            self.queues.setdefault(QueueUrl, []).extend(entry["MessageBody"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"], "MessageId": uuid.uuid4().hex} for entry in Entries]}
+
+    def drain(self, queue_url, batch_size=10):
+        # Everything queued so far, as SQS-trigger events of up to batch_size records
+        with self.lock:
+            bodies = self.queues.pop(queue_url, [])
+        return [
+            {"Records": [{"messageId": uuid.uuid4().hex, "body": body} for body in bodies[i:i + batch_size]]}
+            for i in range(0, len(bodies), batch_size)
+        ]
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def client(service, **kwargs):
+    # Drop-in for boto3.client(service, **kwargs) that honours F1_STORAGE_BACKEND
+    if STORAGE_BACKEND == 'aws':
+        import boto3
+        kwargs.setdefault('config', aws_config())
+        return boto3.client(service, **kwargs)
+    if service not in ('s3', 'sqs'):
+        raise ValueError(f"No local backend for {service}")
+    with _shared_lock:
+        if service not in _shared:
+            if service == 'sqs':
+                _shared[service] = InMemorySQS()
+            elif STORAGE_BACKEND == 'local':
+                _shared[service] = LocalFileS3()
+            else:
+                _shared[service] = InMemoryS3()
+        return _shared[service]
@@ -1,112 +1,794 @@
-import boto3
-import json
-import pandas as pd
+import csv
 import io
+import itertools
+import json
 import os
+from urllib.parse import unquote_plus
+import metrics
+from batchResults import BatchResult
+from rawCodec import STREAM_CHUNK_SIZE, is_raw_key, iter_records, read_records, strip_raw_suffix
+from sqsBatch import RAW_KEYS_PER_MESSAGE, BatchPublisher
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import client
+from transformedData import PARQUET_COMPRESSION, unit_prefix, write_frame
+
+s3 = metrics.InstrumentedS3(client('s3'))
+sqs = metrics.InstrumentedSQS(client('sqs'))
 
-s3 = boto3.client('s3')
+# pandas (and pyarrow) are imported inside the functions that type, partition or aggregate frames.
+# Plain record-to-CSV files (meetings, sessions, drivers, laps, ...) are written with the csv module,
+# so invocations that only carry those never pay pandas' import time.
 
 S3_BUCKET = 'f1-75'
+COMPACT_QUEUE_URL = 'https://sqs.us-east-2.amazonaws.com/253613561634/Compact_Q'
 RAW_FOLDER_PREFIXES = {
     "meetings_raw": "raw_data/meetings_raw/",
     "sessions_raw": "raw_data/sessions_raw/",
     "drivers_raw": "raw_data/drivers_raw/",
-    "laps_raw": "raw_data/laps_raw/"
+    "laps_raw": "raw_data/laps_raw/",
+    "weather_raw": "raw_data/weather_raw/",
+    "car_data_raw": "raw_data/car_data_raw/",
+    "location_raw": "raw_data/location_raw/",
+    "intervals_raw": "raw_data/intervals_raw/",
+    "position_raw": "raw_data/position_raw/",
+    "stints_raw": "raw_data/stints_raw/",
+    "pit_raw": "raw_data/pit_raw/"
 }
 TRANSFORMED_PREFIXES = {
     "meetings_raw": "transformed_data/meetings_transformed/",
     "sessions_raw": "transformed_data/sessions_transformed/",
     "drivers_raw": "transformed_data/drivers_transformed/",
-    "laps_raw": "transformed_data/laps_transformed/"
+    "laps_raw": "transformed_data/laps_transformed/",
+    "weather_raw": "transformed_data/weather_transformed/",
+    "car_data_raw": "transformed_data/car_data_transformed/",
+    "location_raw": "transformed_data/location_transformed/",
+    "intervals_raw": "transformed_data/intervals_transformed/",
+    "position_raw": "transformed_data/position_transformed/",
+    "stints_raw": "transformed_data/stints_transformed/",
+    "pit_raw": "transformed_data/pit_transformed/"
 }
-METADATA_KEY = 'metadata/processed_transformed.json'
-
-def load_metadata():
-    try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=METADATA_KEY)
-        return json.loads(obj['Body'].read().decode('utf-8'))
-    except s3.exceptions.ClientError as e:
-        if e.response['Error']['Code'] == "NoSuchKey":
-            return {"processed": []}
-        else:
-            raise
+# High-frequency endpoints (millions of rows per session) are read, typed and written chunk by chunk
+CHUNKED_SECTIONS = {"car_data_raw", "location_raw", "intervals_raw", "position_raw", "stints_raw", "pit_raw"}
+TRANSFORM_CHUNK_ROWS = int(os.environ.get('TRANSFORM_CHUNK_ROWS', '100000'))
+# Transformed raw keys, sharded by section and session/meeting
+STATE_PREFIX = 'metadata/transformed/'
+LEGACY_METADATA_KEY = 'metadata/processed_transformed.json'
 
-def save_metadata(metadata):
-    s3.put_object(
-        Bucket=S3_BUCKET,
-        Key=METADATA_KEY,
-        Body=json.dumps(metadata)
-    )
+# Derived per (session_key, driver_number, sector) table the dashboard reads instead of raw laps
+SECTOR_STATS_PREFIX = "transformed_data/sector_stats/"
+SECTOR_COLUMNS = ["duration_sector_1", "duration_sector_2", "duration_sector_3"]
+SECTOR_QUANTILES = {"p50": 0.5, "p85": 0.85, "p95": 0.95}
+
+# Laps with the session's weather as of each lap's start, per (session_key, driver_number): the
+# latest weather sample at or before date_start (OpenF1 samples about once a minute). weather_date
+# is the matched sample's time; laps without date_start or earlier weather have empty weather columns.
+LAPS_WEATHER_PREFIX = "transformed_data/laps_weather/"
+WEATHER_COLUMNS = ["air_temperature", "track_temperature", "humidity", "pressure", "rainfall",
+                   "wind_direction", "wind_speed"]
+
+# Multi-resolution summaries of the telemetry streams per (session_key, driver_number): one file per
+# level, each splitting the driver's session into that many equal time buckets. Every bucket keeps
+# the sample count and per-channel aggregates ({channel}_{agg} columns); min/max keep the spikes
+# (braking points, top speed) that averaging or point picking would smooth away. The dashboard
+# plots the coarsest level with enough buckets in its window, so a chart never has more than a
+# few thousand points however long the session is.
+TELEMETRY_TILES_PREFIX = "transformed_data/telemetry_tiles/"
+TELEMETRY_TILE_LEVELS = [int(n) for n in os.environ.get('TELEMETRY_TILE_LEVELS', '512,2048,8192').split(',')]
+TELEMETRY_TILE_CHANNELS = {
+    "car_data_raw": {
+        "speed": ["min", "max", "mean"],
+        "rpm": ["min", "max", "mean"],
+        "throttle": ["min", "max", "mean"],
+        "brake": ["max", "mean"],
+        "n_gear": ["min", "max"]
+    },
+    # The mean position of a bucket follows the racing line; its extremes aren't a shape
+    "location_raw": {"x": ["mean"], "y": ["mean"], "z": ["mean"]}
+}
+
+# Output format for transformed_data/: 'csv' (one file per raw file) or 'parquet' (typed, partitioned)
+OUTPUT_FORMAT = os.environ.get('OUTPUT_FORMAT', 'csv')
+# 'stdlib' (csv module) or 'pandas' for the plain CSV files; both produce the same columns and rows
+CSV_WRITER = os.environ.get('CSV_WRITER', 'stdlib')
+
+# Parquet files are laid out as {transformed_prefix}{column}={value}/...
+PARTITION_COLUMNS = {
+    "meetings_raw": "meeting_key",
+    "sessions_raw": "meeting_key",
+    "drivers_raw": "session_key",
+    "laps_raw": "session_key",
+    "weather_raw": "session_key",
+    "car_data_raw": "session_key",
+    "location_raw": "session_key",
+    "intervals_raw": "session_key",
+    "position_raw": "session_key",
+    "stints_raw": "session_key",
+    "pit_raw": "session_key"
+}
+
+# Explicit column dtypes; columns not listed keep pandas' inferred type. Telemetry uses the
+# smallest integer/float types that hold OpenF1's ranges and categoricals for repeated codes.
+SCHEMAS = {
+    "meetings_raw": {
+        "meeting_key": "Int32",
+        "meeting_name": "string",
+        "meeting_official_name": "string",
+        "location": "string",
+        "country_key": "Int32",
+        "country_code": "string",
+        "country_name": "string",
+        "circuit_key": "Int32",
+        "circuit_short_name": "string",
+        "date_start": "datetime",
+        "gmt_offset": "string",
+        "year": "Int16"
+    },
+    "sessions_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "session_name": "string",
+        "session_type": "string",
+        "date_start": "datetime",
+        "date_end": "datetime",
+        "circuit_key": "Int32",
+        "circuit_short_name": "string",
+        "country_code": "string",
+        "country_name": "string",
+        "location": "string",
+        "gmt_offset": "string",
+        "year": "Int16"
+    },
+    "drivers_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "broadcast_name": "string",
+        "full_name": "string",
+        "first_name": "string",
+        "last_name": "string",
+        "name_acronym": "category",
+        "team_name": "category",
+        "team_colour": "category",
+        "country_code": "string",
+        "headshot_url": "string"
+    },
+    "laps_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "lap_number": "Int16",
+        "date_start": "datetime",
+        "lap_duration": "float32",
+        "duration_sector_1": "float32",
+        "duration_sector_2": "float32",
+        "duration_sector_3": "float32",
+        "i1_speed": "Int16",
+        "i2_speed": "Int16",
+        "st_speed": "Int16",
+        "is_pit_out_lap": "boolean"
+    },
+    "weather_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "date": "datetime",
+        "air_temperature": "float32",
+        "track_temperature": "float32",
+        "humidity": "float32",
+        "pressure": "float32",
+        "rainfall": "Int8",
+        "wind_direction": "Int16",
+        "wind_speed": "float32"
+    },
+    "car_data_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "date": "datetime",
+        "speed": "Int16",
+        "rpm": "Int16",
+        "n_gear": "Int8",
+        "throttle": "Int16",
+        "brake": "Int16",
+        "drs": "Int8"
+    },
+    "location_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "date": "datetime",
+        "x": "Int32",
+        "y": "Int32",
+        "z": "Int32"
+    },
+    "intervals_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "date": "datetime",
+        # Lapped cars report gaps like "+1 LAP", which become missing values
+        "gap_to_leader": "float32",
+        "interval": "float32"
+    },
+    "position_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "date": "datetime",
+        "position": "Int8"
+    },
+    "stints_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "stint_number": "Int8",
+        "lap_start": "Int16",
+        "lap_end": "Int16",
+        "compound": "category",
+        "tyre_age_at_start": "Int16"
+    },
+    "pit_raw": {
+        "session_key": "Int32",
+        "meeting_key": "Int32",
+        "driver_number": "Int16",
+        "date": "datetime",
+        "lap_number": "Int16",
+        "pit_duration": "float32"
+    }
+}
+
+def state_shard(raw_key):
+    # raw_data/{section}/{session or meeting}/... -> "{section}/{session or meeting}"; flat sections share one shard
+    parts = raw_key[len("raw_data/"):].split('/')
+    return '/'.join(parts[:2]) if len(parts) > 2 else parts[0]
 
 def list_all_json_keys(prefix):
     keys = []
     paginator = s3.get_paginator('list_objects_v2')
     for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix):
         for obj in page.get('Contents', []):
-            if obj['Key'].endswith('.json'):
+            if is_raw_key(obj['Key']):
                 keys.append(obj['Key'])
     return keys
 
 def read_json_from_s3(key):
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    data = json.loads(obj['Body'].read().decode('utf-8'))
-    if isinstance(data, dict):
-        return [data]  # wrap single object in list
-    elif isinstance(data, list):
-        return data
-    else:
-        return []
+    # Handles plain JSON and gzip/zstd NDJSON, decompressing while the body streams in
+    with metrics.timed("json.decode"):
+        return [record for record in read_records(s3, S3_BUCKET, key) if isinstance(record, dict)]
 
-def write_csv_to_s3(data, key):
-    df = pd.DataFrame(data)
+def records_to_csv(records):
+    # Same header and rows as pd.DataFrame(records).to_csv(index=False): columns are the union of
+    # the record keys in first-seen order and missing or null values are empty. None if no columns.
+    columns = list(dict.fromkeys(column for record in records for column in record))
+    if not columns:
+        return None
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+def pandas_to_csv(records):
+    import pandas as pd
+    with metrics.timed("pandas.frame"):
+        df = pd.DataFrame(records)
     if df.empty:
+        return None
+    with metrics.timed("pandas.to_csv"):
+        return df.to_csv(index=False)
+
+def write_csv_to_s3(data, key):
+    if CSV_WRITER == 'pandas':
+        body = pandas_to_csv(data)
+    else:
+        with metrics.timed("csv.encode") as span:
+            body = records_to_csv(data)
+            span.bytes = len(body or '')
+    if body is None:
         print(f"⚠️ Skipping empty CSV for {key}")
-        return
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False)
+        return []
     s3.put_object(
         Bucket=S3_BUCKET,
         Key=key,
-        Body=csv_buffer.getvalue()
+        Body=body
     )
     print(f"✅ Transformed and uploaded: {key}")
+    return [key]
+
+def apply_schema(df, schema):
+    import pandas as pd
+    # Every schema column is present in the output so readers can project columns safely
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            df[column] = None
+        if dtype == "datetime":
+            df[column] = pd.to_datetime(df[column], utc=True, errors='coerce', format='ISO8601')
+        elif dtype in ("string", "boolean"):
+            df[column] = df[column].astype(dtype)
+        elif dtype == "category":
+            # Categories are always strings so chunks and files concatenate and serialize alike
+            df[column] = df[column].astype("string").astype("category")
+        else:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(dtype)
+    return df
+
+def write_parquet_to_s3(data, section, raw_key):
+    import pandas as pd
+    with metrics.timed("pandas.frame"):
+        df = pd.DataFrame(data)
+    if df.empty:
+        print(f"⚠️ Skipping empty Parquet for {raw_key}")
+        return []
+    with metrics.timed("pandas.schema"):
+        df = apply_schema(df, SCHEMAS[section])
+
+    raw_prefix = RAW_FOLDER_PREFIXES[section]
+    transformed_prefix = TRANSFORMED_PREFIXES[section]
+    partition_column = PARTITION_COLUMNS[section]
+    # Keep the raw path in the file name so files from different drivers/dates never collide
+    file_name = strip_raw_suffix(raw_key)[len(raw_prefix):].replace('/', '_') + '.parquet'
+
+    keys = []
+    for partition_value, part_df in df.groupby(partition_column, dropna=False):
+        key = f"{transformed_prefix}{partition_column}={partition_value}/{file_name}"
+        write_frame(s3, S3_BUCKET, key, part_df)
+        print(f"✅ Transformed and uploaded: {key}")
+        keys.append(key)
+    return keys
+
+def write_transformed(data, section, raw_key):
+    # Returns the transformed keys written
+    if OUTPUT_FORMAT == 'parquet':
+        return write_parquet_to_s3(data, section, raw_key)
+    else:
+        raw_prefix = RAW_FOLDER_PREFIXES[section]
+        transformed_prefix = TRANSFORMED_PREFIXES[section]
+        transformed_key = strip_raw_suffix(raw_key).replace(raw_prefix, transformed_prefix) + '.csv'
+        return write_csv_to_s3(data, transformed_key)
+
+def iter_typed_chunks(raw_key, schema):
+    import pandas as pd
+    # Records stream out of the decompressed body; only one typed chunk is in memory at a time
+    obj = s3.get_object(Bucket=S3_BUCKET, Key=raw_key)
+    records = (
+        record for record in iter_records(obj['Body'].iter_chunks(STREAM_CHUNK_SIZE))
+        if isinstance(record, dict)
+    )
+    while True:
+        chunk = list(itertools.islice(records, TRANSFORM_CHUNK_ROWS))
+        if not chunk:
+            return
+        # Only schema columns are kept, so every chunk has the same layout
+        with metrics.timed("pandas.frame"):
+            df = apply_schema(pd.DataFrame(chunk), schema)[list(schema)]
+        yield df
+
+def write_chunked(section, raw_key):
+    # Same output layout as write_transformed, built one chunk at a time
+    raw_prefix = RAW_FOLDER_PREFIXES[section]
+    transformed_prefix = TRANSFORMED_PREFIXES[section]
+    chunks = iter_typed_chunks(raw_key, SCHEMAS[section])
+    rows = 0
+
+    if OUTPUT_FORMAT != 'parquet':
+        key = strip_raw_suffix(raw_key).replace(raw_prefix, transformed_prefix) + '.csv'
+        buffer = io.BytesIO()
+        for df in chunks:
+            with metrics.timed("pandas.to_csv") as span:
+                start = buffer.tell()
+                df.to_csv(buffer, index=False, header=rows == 0)
+                span.bytes = buffer.tell() - start
+            rows += len(df)
+        if not rows:
+            print(f"⚠️ Skipping empty CSV for {key}")
+            return []
+        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=buffer.getvalue())
+        print(f"✅ Transformed and uploaded: {key} ({rows} rows)")
+        return [key]
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    partition_column = PARTITION_COLUMNS[section]
+    file_name = strip_raw_suffix(raw_key)[len(raw_prefix):].replace('/', '_') + '.parquet'
+    # One writer per partition; each chunk becomes a row group
+    writers = {}
+    for df in chunks:
+        rows += len(df)
+        for partition_value, part_df in df.groupby(partition_column, dropna=False, observed=True):
+            with metrics.timed("pandas.to_parquet"):
+                table = pa.Table.from_pandas(part_df, preserve_index=False)
+                if partition_value not in writers:
+                    sink = pa.BufferOutputStream()
+                    writers[partition_value] = (sink, pq.ParquetWriter(sink, table.schema, compression=PARQUET_COMPRESSION))
+                _, writer = writers[partition_value]
+                writer.write_table(table.cast(writer.schema))
+
+    if not writers:
+        print(f"⚠️ Skipping empty Parquet for {raw_key}")
+        return []
+    keys = []
+    for partition_value, (sink, writer) in writers.items():
+        with metrics.timed("pandas.to_parquet"):
+            writer.close()
+        key = f"{transformed_prefix}{partition_column}={partition_value}/{file_name}"
+        s3.put_object(Bucket=S3_BUCKET, Key=key, Body=sink.getvalue().to_pybytes())
+        print(f"✅ Transformed and uploaded: {key}")
+        keys.append(key)
+    print(f"📏 {rows} rows of {section} typed in chunks of {TRANSFORM_CHUNK_ROWS}")
+    return keys
+
+def sector_stats_key(session_key, driver_number):
+    if OUTPUT_FORMAT == 'parquet':
+        return f"{SECTOR_STATS_PREFIX}session_key={session_key}/{driver_number}.parquet"
+    return f"{SECTOR_STATS_PREFIX}{session_key}/{driver_number}.csv"
+
+def session_driver_from_key(raw_key, section="laps_raw"):
+    # raw_data/{section}/{session_key}/{driver_number}/{endpoint}_{date}.json
+    parts = raw_key[len(RAW_FOLDER_PREFIXES[section]):].split('/')
+    return (parts[0], parts[1]) if len(parts) >= 3 else None
 
+def build_sector_stats(laps):
+    import pandas as pd
+    group_keys = ["session_key", "driver_number", "sector"]
+    laps = laps.reindex(columns=["session_key", "driver_number", "lap_number"] + SECTOR_COLUMNS)
+
+    # One row per (session, driver, sector, lap): cleaned, deduplicated and lap-sorted
+    stats = laps.melt(
+        id_vars=["session_key", "driver_number", "lap_number"],
+        value_vars=SECTOR_COLUMNS,
+        var_name="sector",
+        value_name="duration"
+    )
+    for column in ["lap_number", "duration"]:
+        stats[column] = pd.to_numeric(stats[column], errors='coerce')
+    stats = (
+        stats.dropna(subset=["lap_number", "duration"])
+        .drop_duplicates(subset=group_keys + ["lap_number", "duration"])
+        .sort_values(group_keys + ["lap_number"])
+    )
+
+    # All quantiles for every group come from a single groupby
+    quantiles = stats.groupby(group_keys)["duration"].quantile(list(SECTOR_QUANTILES.values())).unstack()
+    quantiles.columns = list(SECTOR_QUANTILES)
+    stats = stats.merge(quantiles.reset_index(), on=group_keys, how="left")
+    stats["delta_from_p85"] = stats["duration"] - stats["p85"]
+    stats["is_slow"] = stats["delta_from_p85"] > 0
+    return stats
+
+def read_driver_laps(session_drivers):
+    # {(session_key, driver_number): every raw lap record of that driver}, read once per invocation
+    # for both sector stats and laps with weather
+    driver_laps = {}
+    for session_key, driver_number in session_drivers:
+        raw_keys = list_all_json_keys(f"{RAW_FOLDER_PREFIXES['laps_raw']}{session_key}/{driver_number}/")
+        driver_laps[(session_key, driver_number)] = [lap for raw_key in raw_keys for lap in read_json_from_s3(raw_key)]
+    return driver_laps
+
+def update_sector_stats(driver_laps):
+    import pandas as pd
+    # Rebuild only the (session, driver) pairs that received new lap files
+    laps = [lap for records in driver_laps.values() for lap in records]
+    if not laps:
+        return []
+
+    with metrics.timed("pandas.sector_stats"):
+        stats = build_sector_stats(pd.DataFrame(laps))
+    keys = []
+    for (session_key, driver_number), driver_stats in stats.groupby(["session_key", "driver_number"]):
+        key = sector_stats_key(session_key, driver_number)
+        write_frame(s3, S3_BUCKET, key, driver_stats)
+        print(f"📊 Updated sector stats: {key}")
+        keys.append(key)
+    return keys
+
+def laps_weather_key(session_key, driver_number):
+    if OUTPUT_FORMAT == 'parquet':
+        return f"{LAPS_WEATHER_PREFIX}session_key={session_key}/{driver_number}.parquet"
+    return f"{LAPS_WEATHER_PREFIX}{session_key}/{driver_number}.csv"
+
+def build_laps_weather(laps, weather):
+    import pandas as pd
+    # One sorted as-of join for every session at once: each lap takes the last weather row of its
+    # own session (by="session_key") whose date is <= date_start
+    laps = apply_schema(laps, SCHEMAS["laps_raw"])[list(SCHEMAS["laps_raw"])]
+    laps = (
+        laps.dropna(subset=["session_key", "driver_number", "lap_number"])
+        .drop_duplicates(subset=["session_key", "driver_number", "lap_number"], keep="last")
+    )
+    weather = apply_schema(weather, SCHEMAS["weather_raw"])[["session_key", "date"] + WEATHER_COLUMNS]
+    weather = (
+        weather.dropna(subset=["session_key", "date"])
+        .drop_duplicates(subset=["session_key", "date"], keep="last")
+        .rename(columns={"date": "weather_date"})
+        .sort_values("weather_date", ignore_index=True)
+    )
+
+    # merge_asof needs non-null, sorted keys; undated laps are added back without weather
+    dated = laps["date_start"].notna()
+    enriched = pd.merge_asof(
+        laps[dated].sort_values("date_start"),
+        weather,
+        left_on="date_start",
+        right_on="weather_date",
+        by="session_key",
+        direction="backward"
+    )
+    enriched = pd.concat([enriched, laps[~dated]], ignore_index=True)
+    return enriched.sort_values(["session_key", "driver_number", "lap_number"], ignore_index=True)
+
+def update_laps_weather(driver_laps):
+    import pandas as pd
+    # Rebuild the (session, driver) pairs whose laps or session weather changed
+    laps = [lap for records in driver_laps.values() for lap in records]
+    if not laps:
+        return []
+    weather_keys = []
+    for session_key in sorted({session_key for session_key, _ in driver_laps}):
+        weather_keys.extend(list_all_json_keys(f"{RAW_FOLDER_PREFIXES['weather_raw']}{session_key}/"))
+    weather = [sample for raw_key in weather_keys for sample in read_json_from_s3(raw_key)]
+
+    with metrics.timed("pandas.laps_weather"):
+        enriched = build_laps_weather(pd.DataFrame(laps), pd.DataFrame(weather))
+    keys = []
+    for (session_key, driver_number), driver_laps in enriched.groupby(["session_key", "driver_number"]):
+        key = laps_weather_key(session_key, driver_number)
+        write_frame(s3, S3_BUCKET, key, driver_laps)
+        print(f"🌦️ Updated laps with weather: {key} ({driver_laps['weather_date'].notna().sum()} of "
+              f"{len(driver_laps)} laps matched)")
+        keys.append(key)
+    return keys
+
+def telemetry_tile_key(section, session_key, driver_number, buckets):
+    endpoint = section[:-len("_raw")]
+    if OUTPUT_FORMAT == 'parquet':
+        return f"{TELEMETRY_TILES_PREFIX}session_key={session_key}/{driver_number}/{endpoint}_{buckets}.parquet"
+    return f"{TELEMETRY_TILES_PREFIX}{session_key}/{driver_number}/{endpoint}_{buckets}.csv"
+
+def build_telemetry_tiles(samples, channels, buckets):
+    import pandas as pd
+    # samples: one driver's rows sorted by date. Buckets are equal slices of its first..last sample,
+    # labelled by their start time; empty buckets (gaps in the data) have no row.
+    start, end = samples["date"].iloc[0], samples["date"].iloc[-1]
+    width = max(((end - start) / buckets).ceil("ms"), pd.Timedelta(milliseconds=1))
+    bucket = ((samples["date"] - start) // width).clip(upper=buckets - 1).to_numpy()
+    grouped = samples.groupby(bucket)
+    tiles = grouped.agg({channel: aggs for channel, aggs in channels.items()})
+    tiles.columns = [f"{channel}_{agg}" for channel, agg in tiles.columns]
+    tiles = tiles.astype("float32")
+    tiles.insert(0, "samples", grouped.size().astype("int32"))
+    tiles.insert(0, "date", start + width * tiles.index.to_numpy())
+    return tiles.reset_index(drop=True)
+
+def update_telemetry_tiles(section_drivers):
+    import pandas as pd
+    # Rebuild every level for the (section, session, driver) triplets that received new telemetry;
+    # one driver's samples are in memory at a time
+    keys = []
+    for section, session_key, driver_number in section_drivers:
+        channels = TELEMETRY_TILE_CHANNELS[section]
+        raw_keys = list_all_json_keys(f"{RAW_FOLDER_PREFIXES[section]}{session_key}/{driver_number}/")
+        frames = [
+            df[["date"] + list(channels)]
+            for raw_key in raw_keys
+            for df in iter_typed_chunks(raw_key, SCHEMAS[section])
+        ]
+        if not frames:
+            continue
+        with metrics.timed("pandas.telemetry_tiles"):
+            # Overlapping fetches of the same session repeat samples; keep one per timestamp
+            samples = (
+                pd.concat(frames, ignore_index=True)
+                .dropna(subset=["date"])
+                .drop_duplicates(subset="date", keep="last")
+                .sort_values("date", ignore_index=True)
+            )
+            if samples.empty:
+                continue
+            levels = {buckets: build_telemetry_tiles(samples, channels, buckets) for buckets in TELEMETRY_TILE_LEVELS}
+        for buckets, tiles in levels.items():
+            key = telemetry_tile_key(section, session_key, driver_number, buckets)
+            write_frame(s3, S3_BUCKET, key, tiles)
+            keys.append(key)
+        print(f"🗺️ Updated {section} tiles for session {session_key} driver {driver_number}: "
+              f"{len(samples)} samples -> {', '.join(str(len(tiles)) for tiles in levels.values())} rows")
+    return keys
+
+def section_of(raw_key):
+    # raw_data/{section}/... -> section, or None for sections this function doesn't transform
+    parts = raw_key.split('/')
+    if len(parts) > 2 and parts[0] == "raw_data" and parts[1] in RAW_FOLDER_PREFIXES:
+        return parts[1]
+    return None
+
+def raw_keys_from_message(body):
+    # Ingestion messages list the keys they wrote; S3 ObjectCreated notifications carry one key per record
+    if "raw_keys" in body:
+        return list(body["raw_keys"])
+    return [
+        unquote_plus(s3_record['s3']['object']['key'])
+        for s3_record in body.get("Records", [])
+        if s3_record.get('eventSource') == 'aws:s3' and s3_record.get('eventName', '').startswith('ObjectCreated')
+    ]
+
+@metrics.instrumented("transformation")
 def lambda_handler(event, context):
-    metadata = load_metadata()
-    already_processed = set(metadata.get("processed", []))
+    state = ShardedStateStore(s3, S3_BUCKET, STATE_PREFIX)
+    import_legacy(s3, S3_BUCKET, LEGACY_METADATA_KEY, state, state_shard, lambda metadata: metadata.get("processed", []))
+    result = BatchResult(s3, S3_BUCKET, "transformation")
     newly_processed = []
+    stats_to_update = set()
+    weather_sessions = set()
+    tiles_to_update = set()
+    written_keys = []
 
-    for record in event['Records']:
-        body = json.loads(record['body'])
+    # Failures are retried with the messages behind them: each raw key remembers the messages that
+    # carried it, and each derived table the raw keys and messages that asked for it. Keys behind a
+    # failure are not recorded as transformed, so the retry transforms them and rebuilds the tables.
+    records = {}
+    direct_events = set()
+    key_messages = {}
+    update_keys = {name: set() for name in ("sector_stats", "laps_weather", "telemetry_tiles")}
+    update_messages = {name: set() for name in update_keys}
+    failed_keys = set()
+    errors = {}
 
-        for section, do_process in body.items():
-            if not do_process or section not in RAW_FOLDER_PREFIXES:
+    def fail(message_ids, error):
+        for message_id in message_ids:
+            errors.setdefault(message_id, []).append(error)
+
+    def fail_update(name, error):
+        failed_keys.update(update_keys[name])
+        fail(update_messages[name], f"{name}: {error}")
+
+    for index, record in enumerate(event['Records']):
+        if record.get('eventSource') == 'aws:s3':
+            # An S3 notification invoking the function directly rather than through the queue
+            message_id = f"s3-event-{index}"
+            direct_events.add(message_id)
+            body = {"Records": [record]}
+            message_keys = raw_keys_from_message(body)
+        else:
+            message_id = record['messageId']
+            try:
+                body = json.loads(record['body'])
+                message_keys = raw_keys_from_message(body)
+            except (json.JSONDecodeError, AttributeError, KeyError, TypeError) as e:
+                result.dead_letter(record, f"unreadable body: {e}")
                 continue
+        records[message_id] = record
 
-            raw_prefix = RAW_FOLDER_PREFIXES[section]
-            transformed_prefix = TRANSFORMED_PREFIXES[section]
+        # Backfill: rebuild sector stats for every (session, driver) already in the raw zone
+        if body.get("rebuild_sector_stats"):
+            for raw_key in list_all_json_keys(RAW_FOLDER_PREFIXES["laps_raw"]):
+                session_driver = session_driver_from_key(raw_key)
+                if session_driver:
+                    stats_to_update.add(session_driver)
+            update_messages["sector_stats"].add(message_id)
 
-            json_keys = list_all_json_keys(raw_prefix)
-            print(f"📦 Found {len(json_keys)} raw files for {section}")
+        # Backfill: rejoin weather for every session with weather in the raw zone
+        if body.get("rebuild_laps_weather"):
+            for raw_key in list_all_json_keys(RAW_FOLDER_PREFIXES["weather_raw"]):
+                weather_sessions.add(raw_key[len(RAW_FOLDER_PREFIXES["weather_raw"]):].split('/')[0])
+            update_messages["laps_weather"].add(message_id)
 
-            for raw_key in json_keys:
-                if raw_key in already_processed:
-                    print(f"🔁 Already transformed {raw_key}, skipping...")
-                    continue
+        # Backfill: rebuild the telemetry tiles of every (session, driver) already in the raw zone
+        if body.get("rebuild_telemetry_tiles"):
+            for section in TELEMETRY_TILE_CHANNELS:
+                for raw_key in list_all_json_keys(RAW_FOLDER_PREFIXES[section]):
+                    session_driver = session_driver_from_key(raw_key, section)
+                    if session_driver:
+                        tiles_to_update.add((section, *session_driver))
+            update_messages["telemetry_tiles"].add(message_id)
 
-                try:
-                    data = read_json_from_s3(raw_key)
-                    transformed_key = raw_key.replace(raw_prefix, transformed_prefix).replace('.json', '.csv')
-                    write_csv_to_s3(data, transformed_key)
-                    newly_processed.append(raw_key)
-                except Exception as e:
-                    print(f"❌ Failed transforming {raw_key}: {str(e)}")
+        # Backfill: {"laps_raw": true, ...} still rescans whole sections
+        for section, do_process in body.items():
+            if do_process is True and section in RAW_FOLDER_PREFIXES:
+                json_keys = list_all_json_keys(RAW_FOLDER_PREFIXES[section])
+                print(f"📦 Found {len(json_keys)} raw files for {section}")
+                message_keys.extend(json_keys)
 
-    metadata["processed"] = list(set(already_processed).union(newly_processed))
-    save_metadata(metadata)
+        for raw_key in message_keys:
+            if is_raw_key(raw_key) and section_of(raw_key):
+                key_messages.setdefault(raw_key, []).append(message_id)
 
-    return {
-        "statusCode": 200,
-        "body": f"✅ Transformed {len(newly_processed)} new files."
-    }
+    # Duplicate deliveries and keys listed twice are transformed once
+    raw_keys = list(key_messages)
+    print(f"📦 Received {len(raw_keys)} raw files to transform")
 
+    def feeds(name, raw_key):
+        update_keys[name].add(raw_key)
+        update_messages[name].update(key_messages[raw_key])
+
+    for raw_key in raw_keys:
+        if state.contains(state_shard(raw_key), raw_key):
+            print(f"🔁 Already transformed {raw_key}, skipping...")
+            continue
+
+        section = section_of(raw_key)
+        try:
+            if section in CHUNKED_SECTIONS:
+                written_keys.extend(write_chunked(section, raw_key))
+            else:
+                data = read_json_from_s3(raw_key)
+                written_keys.extend(write_transformed(data, section, raw_key))
+        except Exception as e:
+            print(f"❌ Failed transforming {raw_key}: {str(e)}")
+            failed_keys.add(raw_key)
+            fail(key_messages[raw_key], f"{raw_key}: {e}")
+            continue
+        newly_processed.append(raw_key)
+        if section == "laps_raw" and session_driver_from_key(raw_key):
+            stats_to_update.add(session_driver_from_key(raw_key))
+            feeds("sector_stats", raw_key)
+        if section == "weather_raw":
+            weather_sessions.add(raw_key[len(RAW_FOLDER_PREFIXES[section]):].split('/')[0])
+            feeds("laps_weather", raw_key)
+        if section in TELEMETRY_TILE_CHANNELS and session_driver_from_key(raw_key, section):
+            tiles_to_update.add((section, *session_driver_from_key(raw_key, section)))
+            feeds("telemetry_tiles", raw_key)
+
+    # New laps are rejoined for their driver; new weather rejoins every driver of the session
+    laps_weather_to_update = set(stats_to_update)
+    update_keys["laps_weather"].update(update_keys["sector_stats"])
+    update_messages["laps_weather"].update(update_messages["sector_stats"])
+    for session_key in weather_sessions:
+        for raw_key in list_all_json_keys(f"{RAW_FOLDER_PREFIXES['laps_raw']}{session_key}/"):
+            if session_driver_from_key(raw_key):
+                laps_weather_to_update.add(session_driver_from_key(raw_key))
+    # Both tables are built from the same raw laps, so each driver's files are read once
+    driver_laps = {}
+    if laps_weather_to_update:
+        try:
+            driver_laps = read_driver_laps(sorted(laps_weather_to_update))
+        except Exception as e:
+            print(f"❌ Failed reading raw laps: {str(e)}")
+            fail_update("sector_stats", e)
+            fail_update("laps_weather", e)
+
+    stats_keys = []
+    if stats_to_update and driver_laps:
+        try:
+            stats_keys = update_sector_stats({pair: driver_laps[pair] for pair in sorted(stats_to_update)})
+        except Exception as e:
+            print(f"❌ Failed updating sector stats: {str(e)}")
+            fail_update("sector_stats", e)
+
+    laps_weather_keys = []
+    if driver_laps:
+        try:
+            laps_weather_keys = update_laps_weather(driver_laps)
+        except Exception as e:
+            print(f"❌ Failed joining weather to laps: {str(e)}")
+            fail_update("laps_weather", e)
+
+    tile_keys = []
+    if tiles_to_update:
+        try:
+            tile_keys = update_telemetry_tiles(sorted(tiles_to_update))
+        except Exception as e:
+            print(f"❌ Failed updating telemetry tiles: {str(e)}")
+            fail_update("telemetry_tiles", e)
+
+    # Ask the compaction stage to merge the small files of every unit that changed
+    units = sorted({unit_prefix(key) for key in written_keys + stats_keys + laps_weather_keys} - {None})
+    if units:
+        publisher = BatchPublisher(sqs, COMPACT_QUEUE_URL)
+        for i in range(0, len(units), RAW_KEYS_PER_MESSAGE):
+            publisher.send({"units": units[i:i + RAW_KEYS_PER_MESSAGE]})
+        publisher.flush()
+
+    transformed = [raw_key for raw_key in newly_processed if raw_key not in failed_keys]
+    for raw_key in transformed:
+        state.add(state_shard(raw_key), raw_key)
+    state.flush()
+
+    # Direct S3 invocations have no batch to report into; raising makes Lambda retry the event
+    if direct_events & set(errors):
+        raise RuntimeError(f"❌ Failed transforming S3 event: {errors}")
+    for message_id, message_errors in errors.items():
+        result.fail(records[message_id], "; ".join(message_errors))
+
+    return result.response(
+        f"✅ Transformed {len(transformed)} new files, updated sector stats for {len(stats_keys)} drivers, "
+        f"weather for {len(laps_weather_keys)} drivers and {len(tile_keys)} telemetry tiles."
+    )
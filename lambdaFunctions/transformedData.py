@@ -0,0 +1,90 @@
+import io
+import metrics
+import os
+
+# Layout of transformed_data/ and the frame writer, shared by transformation and compaction.
+# Nothing here creates a client or imports pandas, so importing it is free at cold start.
+
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+
+# A unit is the set of small files that gets merged into one: a whole dataset for the
+# small meetings/sessions tables, one session partition for the per-driver datasets.
+# Rows are deduplicated on "keys" (last fragment wins) and sorted by them; for "replace"
+# datasets a newer fragment replaces every compacted row with the same replace columns.
+DATASETS = {
+    "transformed_data/meetings_transformed/": {"level": "dataset", "keys": ["meeting_key"]},
+    "transformed_data/sessions_transformed/": {"level": "dataset", "keys": ["session_key"]},
+    "transformed_data/drivers_transformed/": {"level": "partition", "keys": ["session_key", "driver_number"]},
+    "transformed_data/laps_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "lap_number"]
+    },
+    "transformed_data/weather_transformed/": {"level": "partition", "keys": ["session_key", "date"]},
+    "transformed_data/car_data_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "date"]
+    },
+    "transformed_data/location_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "date"]
+    },
+    "transformed_data/intervals_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "date"]
+    },
+    "transformed_data/position_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "date"]
+    },
+    "transformed_data/stints_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "stint_number"]
+    },
+    "transformed_data/pit_transformed/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "lap_number"]
+    },
+    "transformed_data/sector_stats/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "sector", "lap_number"],
+        "replace": ["session_key", "driver_number"]
+    },
+    "transformed_data/laps_weather/": {
+        "level": "partition",
+        "keys": ["session_key", "driver_number", "lap_number"],
+        "replace": ["session_key", "driver_number"]
+    }
+}
+
+
+def dataset_of(key):
+    for prefix in DATASETS:
+        if key.startswith(prefix):
+            return prefix
+    return None
+
+
+def unit_prefix(key):
+    # transformed_data/laps_transformed/9158/1/laps_x.csv -> transformed_data/laps_transformed/9158/
+    # transformed_data/laps_transformed/session_key=9158/1_laps_x.parquet -> .../session_key=9158/
+    dataset = dataset_of(key)
+    if dataset is None:
+        return None
+    rest = key[len(dataset):].split('/')
+    if DATASETS[dataset]["level"] == "dataset" or len(rest) < 2:
+        return dataset
+    return f"{dataset}{rest[0]}/"
+
+
+def write_frame(s3, bucket, key, df):
+    # Parquet or CSV by the key's extension
+    buffer = io.BytesIO()
+    if key.endswith('.parquet'):
+        with metrics.timed("pandas.to_parquet") as span:
+            df.to_parquet(buffer, index=False, compression=PARQUET_COMPRESSION)
+            span.bytes = buffer.tell()
+    else:
+        with metrics.timed("pandas.to_csv") as span:
+            df.to_csv(buffer, index=False)
+            span.bytes = buffer.tell()
+    s3.put_object(Bucket=bucket, Key=key, Body=buffer.getvalue())
@@ -0,0 +1,143 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+KEY_COLUMNS = ["session_key", "driver_number"]
+
+# Distinguishes rebuilt SessionLaps, e.g. in the dashboard's chart cache keys
+_versions = itertools.count(1)
+
+
+def normalize_keys(df):
+    # CSV and Parquet frames disagree on key dtypes (int64 vs Int32/Int16); joins need them equal
+    return df.assign(
+        session_key=pd.to_numeric(df["session_key"], errors="coerce").astype("Int32"),
+        driver_number=pd.to_numeric(df["driver_number"], errors="coerce").astype("Int16")
+    ).dropna(subset=KEY_COLUMNS)
+
+
+class Dimensions:
+    # meeting name -> meeting_key -> race sessions, looked up without scanning the tables
+
+    def __init__(self, meetings_df, sessions_df):
+        meetings = meetings_df.dropna(subset=["meeting_name", "meeting_key"]).drop_duplicates("meeting_name")
+        self.meeting_names = list(meetings["meeting_name"])
+        self.meeting_keys = dict(zip(meetings["meeting_name"], meetings["meeting_key"].astype(int)))
+
+        races = sessions_df[sessions_df["session_type"].str.lower() == "race"]
+        races = races.dropna(subset=["meeting_key", "session_key"]).drop_duplicates(subset="session_key")
+        self.race_sessions = {
+            int(meeting_key): dict(zip(group["session_key"].astype(int), group["session_name"]))
+            for meeting_key, group in races.groupby("meeting_key")
+        }
+
+    def races_for(self, meeting_name):
+        # {session_key: session_name} of the Race-type sessions of a meeting; sprint weekends have two
+        return self.race_sessions.get(self.meeting_keys.get(meeting_name), {})
+
+
+class SessionLaps:
+    # One session's laps joined to its drivers on (session_key, driver_number), with row
+    # indexes per driver so widget changes only touch the selected rows
+
+    def __init__(self, session_key, drivers_df, laps_df, sector_stats_df):
+        self.version = next(_versions)
+        drivers = normalize_keys(drivers_df)
+        drivers = (
+            drivers[drivers["session_key"] == session_key]
+            .drop_duplicates(subset=KEY_COLUMNS, keep="last")[KEY_COLUMNS + ["full_name"]]
+        )
+        laps = normalize_keys(laps_df)
+        laps = laps[laps["session_key"] == session_key]
+        # drivers has one row per key, so the join never multiplies lap rows
+        self.laps = laps.merge(drivers, on=KEY_COLUMNS, how="left", validate="many_to_one")
+        self.laps["full_name"] = self.laps["full_name"].astype("category")
+        self.laps["driver_number"] = self.laps["driver_number"].astype("category")
+
+        self.driver_names = [name for name in self.laps["full_name"].unique() if pd.notna(name)]
+        self.driver_numbers = {
+            name: list(group["driver_number"])
+            for name, group in drivers.groupby("full_name", sort=False)
+        }
+        self.drivers = drivers
+        self.lap_rows = self.laps.groupby("full_name", observed=True, sort=False).indices
+
+        stats = normalize_keys(sector_stats_df)
+        stats = stats[stats["session_key"] == session_key].reset_index(drop=True)
+        stats["sector"] = stats["sector"].astype("category")
+        self.sector_stats = stats
+        self.stats_rows = stats.groupby(["driver_number", "sector"], observed=True, sort=False).indices
+        self.grid = None
+
+    def driver_laps(self, full_name):
+        return self.laps.iloc[self.lap_rows.get(full_name, [])]
+
+    def driver_sector_stats(self, full_name, sector):
+        rows = [
+            self.stats_rows[(driver_number, sector)]
+            for driver_number in self.driver_numbers.get(full_name, [])
+            if (driver_number, sector) in self.stats_rows
+        ]
+        if not rows:
+            return self.sector_stats.iloc[[]]
+        return self.sector_stats.iloc[sorted(row for group in rows for row in group)]
+
+    def sector_grid(self):
+        # Every driver x sector at once, from one groupby over the precomputed sector stats, so the
+        # grid shows the same cleaned laps and p85 thresholds as the driver view; computed on first
+        # use per session
+        if self.grid is not None:
+            return self.grid
+        long = self.sector_stats.merge(
+            self.drivers[["driver_number", "full_name"]], on="driver_number", how="inner"
+        )
+        long["duration"] = pd.to_numeric(long["duration"], errors="coerce")
+        long["slow_delta"] = pd.to_numeric(long["delta_from_p85"], errors="coerce").clip(lower=0)
+        long["is_slow"] = long["is_slow"].astype(bool)
+
+        groups = ["full_name", "sector"]
+        self.grid = long.groupby(groups, observed=True).agg(
+            laps=("duration", "size"),
+            p85=("p85", "first"),
+            best=("duration", "min"),
+            slow_laps=("is_slow", "sum"),
+            total_slow_delta=("slow_delta", "sum"),
+            max_slow_delta=("slow_delta", "max")
+        ).reset_index()
+        return self.grid
+
+
+class LapStore:
+    # Built views are reused until the frame store reports new frame versions (i.e. after a refresh).
+    # Sessions are kept least recently used first, up to max_sessions.
+
+    def __init__(self, max_sessions=8):
+        self.lock = threading.Lock()
+        self.max_sessions = max_sessions
+        self.dimensions_entry = None
+        self.sessions = OrderedDict()
+
+    def dimensions(self, version, meetings_df, sessions_df):
+        with self.lock:
+            entry = self.dimensions_entry
+        if entry is None or entry[0] != version:
+            entry = (version, Dimensions(meetings_df, sessions_df))
+            with self.lock:
+                self.dimensions_entry = entry
+        return entry[1]
+
+    def session(self, session_key, version, drivers_df, laps_df, sector_stats_df):
+        with self.lock:
+            entry = self.sessions.get(session_key)
+            if entry is not None:
+                self.sessions.move_to_end(session_key)
+        if entry is None or entry[0] != version:
+            entry = (version, SessionLaps(session_key, drivers_df, laps_df, sector_stats_df))
+            with self.lock:
+                self.sessions[session_key] = entry
+                self.sessions.move_to_end(session_key)
+                while len(self.sessions) > self.max_sessions:
+                    self.sessions.popitem(last=False)
+        return entry[1]
@@ -0,0 +1,339 @@
+import io
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+# Written by lambdaFunctions/compaction.py: a unit's _manifest.json names its current compacted
+# file and the fragments (key -> ETag) merged into it, which readers must then skip, plus the
+# dataset's "keys" and "replace" columns for merging the unit's newer fragments into it
+MANIFEST_NAME = "_manifest.json"
+COMPACTED_DIR = "_compacted/"
+
+
+def read_frame(body, key, columns):
+    if key.endswith('.parquet'):
+        return pd.read_parquet(body, columns=columns)
+    return pd.read_csv(body, usecols=lambda c: c in columns)
+
+
+def visible_keys(listed, manifests):
+    # The current compacted files plus every fragment not merged into them (late data)
+    current = {}
+    hidden = set()
+    for manifest_key, manifest in manifests.items():
+        current[manifest_key[:-len(MANIFEST_NAME)]] = manifest["compacted"]
+        hidden.update(
+            key for key, etag in manifest["fragments"].items()
+            if key in listed and listed[key]["etag"] == etag
+        )
+
+    visible = set()
+    for key in listed:
+        if key in hidden or key.endswith(MANIFEST_NAME):
+            continue
+        unit, compacted_dir, _ = key.partition(COMPACTED_DIR)
+        # Compacted files not yet (or no longer) named by a manifest are in flux
+        if compacted_dir and current.get(unit) != key:
+            continue
+        visible.add(key)
+    return visible
+
+
+def merge_groups(visible, listed, manifests):
+    # [(keys, rules)]: each compacted file with the unit's visible fragments in write order, merged
+    # with the manifest's rules; every other object stands alone (rules None)
+    groups, grouped = [], set()
+    for manifest_key, manifest in sorted(manifests.items()):
+        unit = manifest_key[:-len(MANIFEST_NAME)]
+        if manifest["compacted"] not in visible or not manifest.get("keys"):
+            continue
+        fragments = sorted(
+            (key for key in visible if key.startswith(unit) and key != manifest["compacted"]),
+            key=lambda key: (listed[key]["last_modified"], key)
+        )
+        groups.append(([manifest["compacted"]] + fragments, {"keys": manifest["keys"], "replace": manifest.get("replace")}))
+        grouped.update(groups[-1][0])
+    groups.extend(([key], None) for key in visible if key not in grouped)
+    return sorted(groups, key=lambda group: group[0])
+
+
+def merge_frames(frames, rules):
+    # Same rules as compaction: fragment rows replace the compacted rows with the same "replace"
+    # values, then rows are deduplicated on "keys" with the later file winning. The key columns
+    # are among the columns every dataset is read with
+    compacted = frames[0]
+    fragment_dfs = [df for df in frames[1:] if not df.empty]
+    if not fragment_dfs:
+        return compacted
+    fragments = pd.concat(fragment_dfs, ignore_index=True)
+    replace = rules.get("replace")
+    if replace and all(column in fragments.columns for column in replace):
+        replaced = fragments[replace].drop_duplicates()
+        compacted = compacted.merge(replaced, on=replace, how="left", indicator=True)
+        compacted = compacted[compacted["_merge"] == "left_only"].drop(columns="_merge")
+    merged = pd.concat([df for df in (compacted, fragments) if not df.empty], ignore_index=True)
+
+    keys = [column for column in rules["keys"] if column in merged.columns]
+    if keys:
+        merged = merged.drop_duplicates(subset=keys, keep="last").sort_values(keys, kind="stable")
+    return merged.reset_index(drop=True)
+
+
+class S3ObjectCache:
+    # Persistent local copy of S3 objects, keyed by S3 key and validated by ETag/LastModified
+
+    def __init__(self, s3, bucket, cache_dir, executor):
+        self.s3 = s3
+        self.bucket = bucket
+        self.cache_dir = cache_dir
+        self.executor = executor
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_manifest(self):
+        with self.lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.manifest_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+
+    def local_path(self, key):
+        return os.path.join(self.cache_dir, "objects", *key.split("/"))
+
+    def list_objects(self, prefix, suffix):
+        # Page through every key; a single list_objects_v2 call stops at 1,000
+        objects = {}
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith((suffix, MANIFEST_NAME)):
+                    objects[obj['Key']] = {
+                        "etag": obj['ETag'],
+                        "last_modified": obj['LastModified'].isoformat()
+                    }
+        return objects
+
+    def _is_fresh(self, key, listed):
+        cached = self.manifest.get(key)
+        return (
+            cached is not None
+            and cached["etag"] == listed["etag"]
+            and cached["last_modified"] == listed["last_modified"]
+            and os.path.exists(self.local_path(key))
+        )
+
+    def _download(self, key, listed):
+        # False if the object was deleted after listing, e.g. a fragment removed by compaction
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return False
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Unique per download: concurrent syncs of the same object must not share a temp file
+        tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+        with open(tmp_path, "wb") as f:
+            f.write(response['Body'].read())
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.manifest[key] = {
+                "etag": response.get('ETag', listed["etag"]),
+                "last_modified": listed["last_modified"]
+            }
+        return True
+
+    def _remove(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+        with self.lock:
+            self.manifest.pop(key, None)
+
+    def sync(self, prefixes, suffix):
+        # List the prefixes and download only objects that are new or whose ETag/LastModified changed
+        listed = {}
+        for objects in self.executor.map(lambda prefix: self.list_objects(prefix, suffix), prefixes):
+            listed.update(objects)
+
+        with self.lock:
+            changed = {key for key, obj in listed.items() if not self._is_fresh(key, obj)}
+
+        # Compaction manifests first: they decide which data objects are worth downloading
+        manifest_keys = [key for key in listed if key.endswith(MANIFEST_NAME)]
+        fetched = dict(zip(manifest_keys, self.executor.map(
+            lambda key: key not in changed or self._download(key, listed[key]), manifest_keys
+        )))
+        manifests = {}
+        for key in manifest_keys:
+            if fetched[key]:
+                with open(self.local_path(key)) as f:
+                    manifests[key] = json.load(f)
+        visible = visible_keys(listed, manifests)
+
+        to_download = sorted(changed & visible)
+        downloaded = dict(zip(to_download, self.executor.map(lambda key: self._download(key, listed[key]), to_download)))
+        missing = {key for key, ok in downloaded.items() if not ok}
+        if missing:
+            print(f"⚠️ Skipped {len(missing)} objects deleted since listing")
+        visible -= missing
+        manifests_changed = any(key in changed for key in manifest_keys)
+        changed = (changed & visible) - missing
+
+        with self.lock:
+            removed = {
+                key for key in self.manifest
+                if key.endswith(suffix) and key not in visible and any(key.startswith(p) for p in prefixes)
+            }
+        for key in removed:
+            self._remove(key)
+        if changed or removed or manifests_changed:
+            self._save_manifest()
+
+        return merge_groups(visible, listed, manifests), changed, removed
+
+    def read_frame(self, key, columns):
+        with open(self.local_path(key), "rb") as f:
+            return read_frame(io.BytesIO(f.read()), key, columns)
+
+
+class FrameStore:
+    # In-memory frames per dataset, shared by every dashboard session in the process.
+    # Each entry is one concatenated frame; spans remember which rows came from which group of
+    # objects (a compacted file merged with its unit's late fragments, or a single object), so a
+    # refresh re-parses only the groups that changed and reuses the other rows as slices.
+    # Only that one copy is held and counted against max_bytes. Entries (a dataset for one race's
+    # partitions, or a whole small table) are evicted least recently used first once their
+    # memory exceeds max_bytes. load() hands out shallow views; with pandas copy-on-write
+    # enabled, a caller modifying its view never touches the shared frame.
+
+    def __init__(self, object_cache, max_bytes=None):
+        self.object_cache = object_cache
+        self.max_bytes = max_bytes
+        self.spans = {}
+        self.frames = OrderedDict()
+        self.sizes = {}
+        self.versions = {}
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self.lock = threading.Lock()
+        # One loader per entry: concurrent misses wait for its frame instead of syncing again
+        self.entry_locks = {}
+
+    def _sync(self, entry, columns, suffix):
+        name, prefixes = entry
+        groups, changed, removed = self.object_cache.sync(prefixes, suffix)
+
+        with self.lock:
+            cached = self.frames.get(entry)
+            spans = self.spans.get(entry, {})
+        previous = cached[0] if cached is not None else None
+        reused = {
+            tuple(keys) for keys, _ in groups
+            if tuple(keys) in spans and not changed.intersection(keys) and previous is not None
+        }
+        to_parse = [key for keys, _ in groups if tuple(keys) not in reused for key in keys]
+        parsed = dict(zip(to_parse, self.object_cache.executor.map(
+            lambda key: self.object_cache.read_frame(key, columns), to_parse
+        )))
+
+        # Rows of unchanged groups are sliced out of the previous frame rather than kept separately
+        dfs, new_spans, start = [], {}, 0
+        for keys, rules in groups:
+            if tuple(keys) in reused:
+                part = previous.iloc[slice(*spans[tuple(keys)])]
+            elif rules is None:
+                part = parsed[keys[0]]
+            else:
+                part = merge_frames([parsed[key] for key in keys], rules)
+            new_spans[tuple(keys)] = (start, start + len(part))
+            start += len(part)
+            if not part.empty:
+                dfs.append(part)
+        df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame(columns=columns)
+        size = df.memory_usage(deep=True).sum()
+        with self.lock:
+            self.spans[entry] = new_spans
+            self.frames[entry] = (df, columns, suffix)
+            self.frames.move_to_end(entry)
+            self.sizes[entry] = int(size)
+            self.versions[entry] = self.versions.get(entry, 0) + 1
+            version = self.versions[entry]
+            self._evict(keep=entry)
+        return df.copy(deep=False), {"files": sum(len(keys) for keys in new_spans), "downloaded": len(changed),
+                                     "removed": len(removed), "version": version}
+
+    def _evict(self, keep):
+        # Called with the lock held; the entry just loaded always stays
+        if self.max_bytes is None:
+            return
+        while sum(self.sizes.values()) > self.max_bytes and len(self.frames) > 1:
+            entry = next(iter(self.frames))
+            if entry == keep:
+                self.frames.move_to_end(entry)
+                continue
+            del self.frames[entry]
+            self.spans.pop(entry, None)
+            self.sizes.pop(entry, None)
+            self.counters["evictions"] += 1
+            print(f"🧹 Evicted {entry[0]} {list(entry[1])} from the frame cache")
+
+    def _entry_lock(self, entry):
+        with self.lock:
+            return self.entry_locks.setdefault(entry, threading.Lock())
+
+    def _hit(self, entry):
+        # The cached frame and its stats, or None; called with the lock held
+        cached = self.frames.get(entry)
+        if cached is None:
+            return None
+        self.frames.move_to_end(entry)
+        self.counters["hits"] += 1
+        files = sum(len(keys) for keys in self.spans[entry])
+        return cached[0].copy(deep=False), {"files": files, "downloaded": 0, "removed": 0,
+                                            "version": self.versions[entry]}
+
+    def load(self, name, prefixes, columns, suffix):
+        # Evicted entries reload from the local object cache, so a miss rarely costs more than a LIST
+        entry = (name, tuple(prefixes))
+        with self.lock:
+            hit = self._hit(entry)
+        if hit is not None:
+            return hit
+        with self._entry_lock(entry):
+            # Another caller may have loaded it while this one waited
+            with self.lock:
+                hit = self._hit(entry)
+                if hit is None:
+                    self.counters["misses"] += 1
+            if hit is not None:
+                return hit
+            return self._sync(entry, columns, suffix)
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, "entries": len(self.frames), "bytes": sum(self.sizes.values())}
+
+    def refresh(self):
+        # Re-sync every dataset loaded so far; unchanged objects cost one LIST entry, not a GET
+        with self.lock:
+            loaded = {entry: (columns, suffix) for entry, (_, columns, suffix) in self.frames.items()}
+        summary = {"files": 0, "downloaded": 0, "removed": 0}
+        for entry, (columns, suffix) in loaded.items():
+            with self._entry_lock(entry):
+                _, stats = self._sync(entry, columns, suffix)
+            for name in summary:
+                summary[name] += stats[name]
+        return summary
@@ -0,0 +1,26 @@
+import pandas as pd
+
+# Written by lambdaFunctions/transformation.py: per (session_key, driver_number) and telemetry
+# endpoint, one file per level, where a level splits the driver's session into that many equal
+# time buckets ({"date": bucket start, "samples", "{channel}_{agg}": ...}; empty buckets have no row).
+
+
+def pick_level(levels, fraction, target_points):
+    # Coarsest level that still has target_points buckets in a window covering `fraction` of the
+    # session; the finest level once the window is narrower than that
+    for buckets in sorted(levels):
+        if buckets * fraction >= target_points:
+            return buckets
+    return max(levels)
+
+
+def prepare(tiles):
+    # Frames read from CSV carry dates as strings; every level is small, so this is bounded work
+    tiles = tiles.assign(date=pd.to_datetime(tiles["date"], utc=True, format="ISO8601"))
+    return tiles.sort_values("date", ignore_index=True)
+
+
+def in_window(tiles, start, end):
+    # Binary search on the sorted dates: cost depends on the rows returned, not the session length
+    dates = tiles["date"]
+    return tiles.iloc[dates.searchsorted(start, side="left"):dates.searchsorted(end, side="right")]
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The lambdas create their clients at import; tests swap in fresh in-memory backends per test
+os.environ.setdefault("F1_STORAGE_BACKEND", "memory")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "lambdaFunctions"))
@@ -0,0 +1,73 @@
+import json
+
+import batchResults
+from batchResults import BatchResult
+from storageBackends import InMemoryS3
+
+BUCKET = "f1-75"
+
+
+def record(message_id, body, receive_count=1):
+    return {"messageId": message_id, "body": body, "attributes": {"ApproximateReceiveCount": str(receive_count)}}
+
+
+def test_failed_messages_are_reported_for_redelivery():
+    s3 = InMemoryS3()
+    result = BatchResult(s3, BUCKET, "test")
+    result.fail(record("m1", "{}"), "status 500")
+    result.fail(record("m2", "{}", batchResults.MAX_RECEIVES - 1), "status 500")
+
+    response = result.response("✅ Done.")
+    assert response["batchItemFailures"] == [{"itemIdentifier": "m1"}, {"itemIdentifier": "m2"}]
+    assert "2 to retry, 0 re-sent for later, 0 dead-lettered" in response["body"]
+    assert not s3.objects
+
+
+def test_message_out_of_deliveries_is_dead_lettered_instead():
+    s3 = InMemoryS3()
+    result = BatchResult(s3, BUCKET, "test")
+    result.fail(record("m1", '{"meeting_key": 1229}', batchResults.MAX_RECEIVES), "status 500")
+
+    response = result.response("✅ Done.")
+    assert response["batchItemFailures"] == []
+    stored = json.loads(s3.get_object(Bucket=BUCKET, Key=f"{batchResults.DEAD_LETTER_PREFIX}test/m1.json")["Body"].read())
+    assert stored["body"] == '{"meeting_key": 1229}'
+    assert stored["receive_count"] == batchResults.MAX_RECEIVES
+    assert "status 500" in stored["error"]
+
+
+def test_records_without_attributes_count_as_a_first_delivery():
+    assert batchResults.receive_count({"messageId": "m1", "body": "{}"}) == 1
+
+
+class RecordingSQS:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, **kwargs):
+        self.sent.append(kwargs)
+
+
+def test_message_waiting_on_a_claim_is_re_sent_to_its_queue():
+    sqs = RecordingSQS()
+    result = BatchResult(InMemoryS3(), BUCKET, "test")
+    held = {**record("m1", '{"session_key": 9158}', batchResults.MAX_RECEIVES),
+            "eventSourceARN": "arn:aws:sqs:us-east-2:253613561634:Driver_id_Q"}
+    result.retry_later(held, sqs, "claimed by another consumer")
+
+    # Re-sent as a new message rather than failed, so it is never dead-lettered while it waits
+    assert result.response("✅ Done.")["batchItemFailures"] == []
+    assert sqs.sent == [{
+        "QueueUrl": "https://sqs.us-east-2.amazonaws.com/253613561634/Driver_id_Q",
+        "MessageBody": '{"session_key": 9158}',
+        "DelaySeconds": batchResults.CLAIM_RETRY_DELAY_SECONDS
+    }]
+
+
+def test_message_without_a_source_queue_is_failed_instead():
+    sqs = RecordingSQS()
+    result = BatchResult(InMemoryS3(), BUCKET, "test")
+    result.retry_later(record("m1", "{}"), sqs, "claimed by another consumer")
+
+    assert result.response("✅ Done.")["batchItemFailures"] == [{"itemIdentifier": "m1"}]
+    assert sqs.sent == []
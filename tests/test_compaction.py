@@ -0,0 +1,126 @@
+import io
+import json
+
+import pytest
+
+import compaction
+from storageBackends import InMemoryS3
+
+pd = pytest.importorskip("pandas")
+
+BUCKET = compaction.S3_BUCKET
+LAPS = "transformed_data/laps_transformed/9158/"
+SECTORS = "transformed_data/sector_stats/9158/"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = InMemoryS3()
+    monkeypatch.setattr(compaction, "s3", s3)
+    return s3
+
+
+def put_csv(s3, key, rows):
+    s3.put_object(Bucket=BUCKET, Key=key, Body=pd.DataFrame(rows).to_csv(index=False))
+
+
+def read_csv(s3, key):
+    return pd.read_csv(io.BytesIO(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read()))
+
+
+def keys(s3, prefix):
+    return sorted(key for bucket, key in s3.objects if key.startswith(prefix))
+
+
+def manifest(s3, unit):
+    return json.loads(s3.get_object(Bucket=BUCKET, Key=f"{unit}{compaction.MANIFEST_NAME}")["Body"].read())
+
+
+def lap(driver, lap_number, duration):
+    return {"session_key": 9158, "driver_number": driver, "lap_number": lap_number, "lap_duration": duration}
+
+
+def test_unit_prefix_groups_fragments_by_session():
+    assert compaction.unit_prefix(f"{LAPS}1/laps_a.csv") == LAPS
+    assert compaction.unit_prefix("transformed_data/meetings_transformed/1229/meetings.csv") == \
+        "transformed_data/meetings_transformed/"
+    assert compaction.unit_prefix("raw_data/9158/laps.json") is None
+
+
+def test_compaction_merges_fragments_and_switches_the_manifest(s3):
+    put_csv(s3, f"{LAPS}1/laps_a.csv", [lap(1, 1, 92.1), lap(1, 2, 91.5)])
+    put_csv(s3, f"{LAPS}1/laps_b.csv", [lap(1, 2, 90.9), lap(44, 1, 93.0)])
+
+    assert compaction.compact_unit(LAPS) == 2
+
+    current = manifest(s3, LAPS)
+    assert keys(s3, LAPS) == sorted([current["compacted"], f"{LAPS}{compaction.MANIFEST_NAME}"])
+    merged = read_csv(s3, current["compacted"])
+    # Deduplicated on the keys with the later fragment winning, and sorted by them
+    assert merged[["driver_number", "lap_number"]].values.tolist() == [[1, 1], [1, 2], [44, 1]]
+    assert merged["lap_duration"].tolist() == [92.1, 90.9, 93.0]
+
+
+def test_single_fragment_waits_for_more_data(s3):
+    put_csv(s3, f"{LAPS}1/laps_a.csv", [lap(1, 1, 92.1)])
+    assert compaction.compact_unit(LAPS) == 0
+    assert keys(s3, LAPS) == [f"{LAPS}1/laps_a.csv"]
+
+
+def test_late_fragment_is_folded_into_a_compacted_unit(s3):
+    put_csv(s3, f"{LAPS}1/laps_a.csv", [lap(1, 1, 92.1)])
+    put_csv(s3, f"{LAPS}1/laps_b.csv", [lap(1, 2, 91.5)])
+    compaction.compact_unit(LAPS)
+    first = manifest(s3, LAPS)["compacted"]
+
+    put_csv(s3, f"{LAPS}1/laps_c.csv", [lap(1, 3, 90.8)])
+    assert compaction.compact_unit(LAPS) == 1
+
+    current = manifest(s3, LAPS)["compacted"]
+    assert current != first
+    assert first not in keys(s3, LAPS)
+    assert read_csv(s3, current)["lap_number"].tolist() == [1, 2, 3]
+
+
+def test_fragment_rewritten_during_compaction_is_kept_for_the_next_run(s3, monkeypatch):
+    put_csv(s3, f"{SECTORS}stats_1.csv", [{"session_key": 9158, "driver_number": 1, "sector": 1, "lap_number": 1, "p85": 30.0}])
+    put_csv(s3, f"{SECTORS}stats_44.csv", [{"session_key": 9158, "driver_number": 44, "sector": 1, "lap_number": 1, "p85": 31.0}])
+
+    list_unit = compaction.list_unit
+
+    def list_then_rewrite(unit):
+        listed = list_unit(unit)
+        # Driver 1's stats are recomputed at the same key after the listing
+        put_csv(s3, f"{SECTORS}stats_1.csv", [{"session_key": 9158, "driver_number": 1, "sector": 1, "lap_number": 2, "p85": 29.5}])
+        return listed
+
+    monkeypatch.setattr(compaction, "list_unit", list_then_rewrite)
+    assert compaction.compact_unit(SECTORS) == 2
+    assert f"{SECTORS}stats_1.csv" in keys(s3, SECTORS)
+    assert f"{SECTORS}stats_44.csv" not in keys(s3, SECTORS)
+
+    monkeypatch.setattr(compaction, "list_unit", list_unit)
+    assert compaction.compact_unit(SECTORS) == 1
+    assert f"{SECTORS}stats_1.csv" not in keys(s3, SECTORS)
+    # sector_stats replaces every compacted row of a driver with the newer fragment's rows
+    merged = read_csv(s3, manifest(s3, SECTORS)["compacted"])
+    assert merged[["driver_number", "lap_number"]].values.tolist() == [[1, 2], [44, 1]]
+
+
+def test_losing_the_manifest_race_leaves_fragments_for_the_winner(s3, monkeypatch):
+    put_csv(s3, f"{LAPS}1/laps_a.csv", [lap(1, 1, 92.1)])
+    put_csv(s3, f"{LAPS}1/laps_b.csv", [lap(1, 2, 91.5)])
+
+    list_unit = compaction.list_unit
+
+    def list_while_another_run_switches(unit):
+        listed = list_unit(unit)
+        s3.put_object(Bucket=BUCKET, Key=f"{unit}{compaction.MANIFEST_NAME}",
+                      Body=json.dumps({"compacted": f"{unit}{compaction.COMPACTED_DIR}other.csv", "fragments": {}}))
+        return listed
+
+    monkeypatch.setattr(compaction, "list_unit", list_while_another_run_switches)
+    assert compaction.compact_unit(LAPS) == 0
+
+    assert keys(s3, f"{LAPS}{compaction.COMPACTED_DIR}") == []
+    assert keys(s3, f"{LAPS}1/") == [f"{LAPS}1/laps_a.csv", f"{LAPS}1/laps_b.csv"]
@@ -0,0 +1,191 @@
+import json
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("urllib3")
+
+import driverListIngestion  # noqa: E402
+import endPointsIngestion  # noqa: E402
+import sessionKeyIngestion  # noqa: E402
+from rawCodec import put_records, raw_key  # noqa: E402
+from stateStore import ShardedStateStore  # noqa: E402
+from storageBackends import InMemoryS3, InMemorySQS  # noqa: E402
+
+BUCKET = "f1-75"
+SOURCE_QUEUE_ARN = "arn:aws:sqs:us-east-2:253613561634:Input_Q"
+SOURCE_QUEUE_URL = "https://sqs.us-east-2.amazonaws.com/253613561634/Input_Q"
+
+
+class FakeResponse:
+    def __init__(self, status, data, headers=None):
+        self.status = status
+        self.data = data
+        self.headers = headers or {}
+
+    def stream(self, chunk_size=65536):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def read(self, amt=None):
+        return self.data
+
+    def release_conn(self):
+        pass
+
+    def drain_conn(self):
+        pass
+
+
+class FakeHttp:
+    # Answers each request with routes(endpoint, params) -> (status, records)
+    def __init__(self, routes):
+        self.routes = routes
+        self.urls = []
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+        parsed = urlparse(url)
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+        status, records = self.routes(parsed.path.rsplit('/', 1)[-1], params)
+        return FakeResponse(status, json.dumps(records).encode('utf-8'))
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    # Fresh S3 and SQS for every handler, shared between them like the real ones
+    s3, sqs = InMemoryS3(), InMemorySQS()
+    for module in (sessionKeyIngestion, driverListIngestion, endPointsIngestion):
+        monkeypatch.setattr(module, "s3", s3)
+        monkeypatch.setattr(module, "sqs", sqs)
+    return s3, sqs
+
+
+def event(*bodies):
+    return {"Records": [
+        {"messageId": f"m{i}", "body": body if isinstance(body, str) else json.dumps(body),
+         "attributes": {"ApproximateReceiveCount": "1"}, "eventSourceARN": SOURCE_QUEUE_ARN}
+        for i, body in enumerate(bodies)
+    ]}
+
+
+def sent(sqs, queue_url):
+    return [json.loads(record["body"]) for batch in sqs.drain(queue_url) for record in batch["Records"]]
+
+
+def failures(response):
+    return [failure["itemIdentifier"] for failure in response["batchItemFailures"]]
+
+
+def sessions(endpoint, params):
+    if params["meeting_key"] == "500":
+        return 500, {"detail": "Internal Server Error"}
+    meeting_key = int(params["meeting_key"])
+    return 200, [{"meeting_key": meeting_key, "session_key": meeting_key * 10 + 1, "session_name": "Race"}]
+
+
+def test_session_messages_fail_or_dead_letter_independently(backends, monkeypatch):
+    s3, sqs = backends
+    monkeypatch.setattr(sessionKeyIngestion, "http", FakeHttp(sessions))
+
+    response = sessionKeyIngestion.lambda_handler(
+        event("not json", {"year": 2025}, {"meeting_key": 1229}, {"meeting_key": 500}), None
+    )
+
+    assert failures(response) == ["m3"]
+    assert sorted(key for bucket, key in s3.objects if key.startswith("dead_letters/")) == [
+        "dead_letters/sessionKeyIngestion/m0.json", "dead_letters/sessionKeyIngestion/m1.json"
+    ]
+    assert [msg["session_key"] for msg in sent(sqs, sessionKeyIngestion.SESSION_QUEUE_URL)] == [12291]
+    assert ShardedStateStore(s3, BUCKET, sessionKeyIngestion.STATE_PREFIX).contains(1229, 12291)
+
+
+def test_session_claimed_elsewhere_is_sent_back_without_using_a_delivery(backends, monkeypatch):
+    s3, sqs = backends
+    monkeypatch.setattr(sessionKeyIngestion, "http", FakeHttp(sessions))
+    ShardedStateStore(s3, BUCKET, sessionKeyIngestion.STATE_PREFIX).claim(1229, 12291)
+
+    response = sessionKeyIngestion.lambda_handler(event({"meeting_key": 1229}), None)
+
+    assert failures(response) == []
+    assert sent(sqs, SOURCE_QUEUE_URL) == [{"meeting_key": 1229}]
+    assert sent(sqs, sessionKeyIngestion.SESSION_QUEUE_URL) == []
+    assert not ShardedStateStore(s3, BUCKET, sessionKeyIngestion.STATE_PREFIX).contains(1229, 12291)
+
+
+def test_session_stored_by_a_failed_attempt_is_queued_on_retry(backends, monkeypatch):
+    s3, sqs = backends
+    monkeypatch.setattr(sessionKeyIngestion, "http", FakeHttp(sessions))
+    s3_key = f"{sessionKeyIngestion.S3_FOLDER}1229/12291"
+    put_records(s3, BUCKET, s3_key, [{"meeting_key": 1229, "session_key": 12291, "session_name": "Race"}])
+
+    response = sessionKeyIngestion.lambda_handler(event({"meeting_key": 1229}), None)
+
+    assert failures(response) == []
+    assert [msg["session_key"] for msg in sent(sqs, sessionKeyIngestion.SESSION_QUEUE_URL)] == [12291]
+    transform = sent(sqs, sessionKeyIngestion.TRANSFORM_QUEUE_URL)
+    assert raw_key(s3_key) in json.dumps(transform)
+    assert ShardedStateStore(s3, BUCKET, sessionKeyIngestion.STATE_PREFIX).contains(1229, 12291)
+
+
+def test_driver_list_claimed_elsewhere_is_sent_back(backends, monkeypatch):
+    s3, sqs = backends
+    http = FakeHttp(lambda endpoint, params: (200, [{"session_key": 12291, "driver_number": 1}]))
+    monkeypatch.setattr(driverListIngestion, "http", http)
+    ShardedStateStore(s3, BUCKET, driverListIngestion.STATE_PREFIX).claim(1229, "1229_12291")
+
+    response = driverListIngestion.lambda_handler(
+        event({"meeting_key": 1229, "session_key": 12291}, {"meeting_key": 1229, "session_key": 12292}), None
+    )
+
+    assert failures(response) == []
+    assert sent(sqs, SOURCE_QUEUE_URL) == [{"meeting_key": 1229, "session_key": 12291}]
+    assert all("session_key=12291" not in url for url in http.urls)
+    assert sent(sqs, driverListIngestion.DRIVER_ID_QUEUE_URL) == [{"session_key": 12292, "driver_number": 1}]
+
+
+def test_endpoint_claimed_elsewhere_is_sent_back_and_keeps_the_claim(backends, monkeypatch):
+    s3, sqs = backends
+    http = FakeHttp(lambda endpoint, params: (200, [{"session_key": 12291, "driver_number": int(params["driver_number"])}]))
+    monkeypatch.setattr(endPointsIngestion, "http", http)
+    other = ShardedStateStore(s3, BUCKET, endPointsIngestion.STATE_PREFIX)
+    other.claim(12291, "12291_1_laps")
+
+    response = endPointsIngestion.lambda_handler(
+        event({"session_key": 12291, "driver_number": 1}, {"session_key": 12291, "driver_number": 44}), None
+    )
+
+    assert failures(response) == []
+    assert sent(sqs, SOURCE_QUEUE_URL) == [{"session_key": 12291, "driver_number": 1}]
+    assert not any("/laps?" in url and url.endswith("driver_number=1") for url in http.urls)
+    assert any("/laps?" in url and url.endswith("driver_number=44") for url in http.urls)
+    state = ShardedStateStore(s3, BUCKET, endPointsIngestion.STATE_PREFIX)
+    assert not state.contains(12291, "12291_1_laps")
+    assert state.contains(12291, "12291_1_car_data")
+    assert state.contains(12291, "12291_44_laps")
+    # Still held by the other consumer, not released by this one
+    assert not state.claim(12291, "12291_1_laps")
+
+
+@pytest.mark.parametrize("fetch_mode", ["driver", "session"])
+def test_endpoint_without_data_is_skipped_and_throttling_is_retried(backends, monkeypatch, fetch_mode):
+    s3, sqs = backends
+
+    def routes(endpoint, params):
+        if endpoint == "team_radio":
+            return 404, {"detail": "No results found."}
+        if endpoint == "pit":
+            return 429, {"detail": "Too Many Requests"}
+        return 200, [{"session_key": 12291, "driver_number": 1}]
+
+    monkeypatch.setattr(endPointsIngestion, "http", FakeHttp(routes))
+    monkeypatch.setattr(endPointsIngestion, "FETCH_MODE", fetch_mode)
+    monkeypatch.setattr(endPointsIngestion, "RETRY_BACKOFF_SECONDS", 0)
+
+    response = endPointsIngestion.lambda_handler(event({"session_key": 12291, "driver_number": 1}), None)
+
+    assert failures(response) == ["m0"]
+    state = ShardedStateStore(s3, BUCKET, endPointsIngestion.STATE_PREFIX)
+    assert state.contains(12291, "12291_1_team_radio")
+    assert not state.contains(12291, "12291_1_pit")
+    assert state.contains(12291, "12291_1_laps")
@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import compaction
+from storageBackends import InMemoryS3
+
+pd = pytest.importorskip("pandas")
+
+from s3Cache import FrameStore, S3ObjectCache  # noqa: E402
+
+BUCKET = compaction.S3_BUCKET
+SECTORS = "transformed_data/sector_stats/9158/"
+LAPS = "transformed_data/laps_transformed/9158/"
+SECTOR_COLUMNS = ["session_key", "driver_number", "sector", "lap_number", "duration"]
+LAP_COLUMNS = ["session_key", "driver_number", "lap_number", "lap_duration"]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = InMemoryS3()
+    monkeypatch.setattr(compaction, "s3", s3)
+    return s3
+
+
+@pytest.fixture
+def store(s3, tmp_path):
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        yield FrameStore(S3ObjectCache(s3, BUCKET, str(tmp_path), executor))
+
+
+def put_csv(s3, key, rows):
+    s3.put_object(Bucket=BUCKET, Key=key, Body=pd.DataFrame(rows).to_csv(index=False))
+
+
+def sector_rows(driver, laps, duration):
+    return [{"session_key": 9158, "driver_number": driver, "sector": 1, "lap_number": lap, "duration": duration}
+            for lap in laps]
+
+
+def test_fragment_rewritten_after_compaction_replaces_its_rows(s3, store):
+    put_csv(s3, f"{SECTORS}1.csv", sector_rows(1, [1, 2], 30.0))
+    put_csv(s3, f"{SECTORS}44.csv", sector_rows(44, [1, 2], 31.0))
+    assert compaction.compact_unit(SECTORS) == 2
+
+    df, _ = store.load("sector_stats", [SECTORS], SECTOR_COLUMNS, ".csv")
+    assert len(df) == 4
+
+    # Driver 1's stats are recomputed with one more lap; the rewrite replaces the compacted rows
+    put_csv(s3, f"{SECTORS}1.csv", sector_rows(1, [1, 2, 3], 29.0))
+    store.refresh()
+    df, stats = store.load("sector_stats", [SECTORS], SECTOR_COLUMNS, ".csv")
+
+    assert stats["files"] == 2
+    driver_1 = df[df["driver_number"] == 1]
+    assert driver_1["lap_number"].tolist() == [1, 2, 3]
+    assert driver_1["duration"].tolist() == [29.0, 29.0, 29.0]
+    assert df[df["driver_number"] == 44]["lap_number"].tolist() == [1, 2]
+
+
+def test_late_fragment_overrides_compacted_rows_with_the_same_keys(s3, store):
+    put_csv(s3, f"{LAPS}1/laps_a.csv", [{"session_key": 9158, "driver_number": 1, "lap_number": 1, "lap_duration": 92.1}])
+    put_csv(s3, f"{LAPS}1/laps_b.csv", [{"session_key": 9158, "driver_number": 1, "lap_number": 2, "lap_duration": 91.5}])
+    compaction.compact_unit(LAPS)
+    put_csv(s3, f"{LAPS}1/laps_c.csv", [{"session_key": 9158, "driver_number": 1, "lap_number": 2, "lap_duration": 90.9},
+                                        {"session_key": 9158, "driver_number": 1, "lap_number": 3, "lap_duration": 90.4}])
+
+    df, _ = store.load("laps", [LAPS], LAP_COLUMNS, ".csv")
+
+    assert df["lap_number"].tolist() == [1, 2, 3]
+    assert df["lap_duration"].tolist() == [92.1, 90.9, 90.4]
+
+
+def test_concurrent_syncs_of_a_cold_cache_all_succeed(s3, tmp_path):
+    for driver in range(1, 61):
+        put_csv(s3, f"{SECTORS}{driver}.csv", sector_rows(driver, [1, 2], 30.0))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        cache = S3ObjectCache(s3, BUCKET, str(tmp_path), executor)
+        with ThreadPoolExecutor(max_workers=8) as callers:
+            results = list(callers.map(lambda _: cache.sync([SECTORS], ".csv"), range(8)))
+
+    assert all(len(groups) == 60 for groups, _, _ in results)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names if name.endswith(".part")]
+
+
+def test_concurrent_misses_load_an_entry_once(s3, store, monkeypatch):
+    put_csv(s3, f"{SECTORS}1.csv", sector_rows(1, [1, 2], 30.0))
+    syncs = []
+    sync = store.object_cache.sync
+    monkeypatch.setattr(store.object_cache, "sync", lambda *args: syncs.append(args) or sync(*args))
+
+    with ThreadPoolExecutor(max_workers=8) as callers:
+        frames = list(callers.map(lambda _: store.load("sector_stats", [SECTORS], SECTOR_COLUMNS, ".csv")[0], range(8)))
+
+    assert len(syncs) == 1
+    assert all(len(df) == 2 for df in frames)
+    assert store.stats()["misses"] == 1 and store.stats()["hits"] == 7
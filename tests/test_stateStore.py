@@ -0,0 +1,159 @@
+import json
+
+import stateStore
+from stateStore import ShardedStateStore, import_legacy
+from storageBackends import InMemoryS3
+
+BUCKET = "f1-75"
+PREFIX = "metadata/test/"
+
+
+def keys(s3, prefix=PREFIX):
+    return sorted(key for bucket, key in s3.objects if key.startswith(prefix))
+
+
+class InterleavingS3(InMemoryS3):
+    # Runs before_base() once, right before the next write of a shard's _base.json, to let another
+    # writer act between a compaction's read and its conditional write
+    def __init__(self):
+        super().__init__()
+        self.before_base = None
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        if Key.endswith(f"/{stateStore.BASE_NAME}") and self.before_base:
+            hook, self.before_base = self.before_base, None
+            hook()
+        return super().put_object(Bucket=Bucket, Key=Key, Body=Body, **kwargs)
+
+
+def test_flushed_items_are_seen_by_a_new_store():
+    s3 = InMemoryS3()
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    state.add("9158", "9158_1_laps")
+    state.add("9158", "9158_1_laps")
+    state.add("9159", "9159_4_pit")
+    assert state.flush() == 2
+
+    reloaded = ShardedStateStore(s3, BUCKET, PREFIX)
+    assert reloaded.contains("9158", "9158_1_laps")
+    assert reloaded.contains(9159, "9159_4_pit")
+    assert not reloaded.contains("9158", "9158_4_pit")
+
+
+def test_flush_writes_one_delta_per_changed_shard_and_nothing_when_idle():
+    s3 = InMemoryS3()
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    state.add("9158", "a")
+    state.add("9158", "b")
+    state.flush()
+    assert len(keys(s3, f"{PREFIX}9158/")) == 1
+
+    state.add("9158", "a")
+    assert state.flush() == 0
+    assert len(keys(s3, f"{PREFIX}9158/")) == 1
+
+
+def test_concurrent_stores_never_overwrite_each_other():
+    s3 = InMemoryS3()
+    first = ShardedStateStore(s3, BUCKET, PREFIX)
+    second = ShardedStateStore(s3, BUCKET, PREFIX)
+    first.load("9158")
+    second.load("9158")
+    first.add("9158", "a")
+    second.add("9158", "b")
+    first.flush()
+    second.flush()
+
+    assert ShardedStateStore(s3, BUCKET, PREFIX).load("9158") == {"a", "b"}
+
+
+def test_import_legacy_moves_items_into_shards_once():
+    s3 = InMemoryS3()
+    legacy_key = "metadata/processed_test.json"
+    s3.put_object(Bucket=BUCKET, Key=legacy_key, Body=json.dumps({"ingested": ["9158_1_laps", "9159_4_pit"]}))
+
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    shard_of = lambda item: item.split("_")[0]  # noqa: E731
+    assert import_legacy(s3, BUCKET, legacy_key, state, shard_of, lambda data: data["ingested"]) == 2
+    assert import_legacy(s3, BUCKET, legacy_key, state, shard_of, lambda data: data["ingested"]) == 0
+
+    reloaded = ShardedStateStore(s3, BUCKET, PREFIX)
+    assert reloaded.contains("9158", "9158_1_laps")
+    assert reloaded.contains("9159", "9159_4_pit")
+    assert keys(s3, "metadata/processed_test") == [f"{legacy_key}.migrated"]
+
+
+def test_claim_is_exclusive_until_released():
+    s3 = InMemoryS3()
+    first = ShardedStateStore(s3, BUCKET, PREFIX)
+    second = ShardedStateStore(s3, BUCKET, PREFIX)
+    assert first.claim("9158", "9158_1_laps")
+    assert not second.claim("9158", "9158_1_laps")
+    assert second.claim("9158", "9158_1_pit")
+
+    first.release("9158", "9158_1_laps")
+    assert second.claim("9158", "9158_1_laps")
+
+
+def test_abandoned_claim_is_taken_over_after_the_ttl(monkeypatch):
+    s3 = InMemoryS3()
+    now = [1_000_000.0]
+    monkeypatch.setattr(stateStore.time, "time", lambda: now[0])
+    assert ShardedStateStore(s3, BUCKET, PREFIX).claim("9158", "item")
+
+    now[0] += stateStore.CLAIM_TTL_SECONDS - 1
+    assert not ShardedStateStore(s3, BUCKET, PREFIX).claim("9158", "item")
+    now[0] += 2
+    assert ShardedStateStore(s3, BUCKET, PREFIX).claim("9158", "item")
+    # The takeover renewed the claim, so nobody else gets it
+    assert not ShardedStateStore(s3, BUCKET, PREFIX).claim("9158", "item")
+
+
+def test_flush_compacts_deltas_into_the_base(monkeypatch):
+    monkeypatch.setattr(stateStore, "COMPACT_THRESHOLD", 3)
+    s3 = InMemoryS3()
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    for item in ("a", "b", "c"):
+        state.add("9158", item)
+        state.flush()
+
+    assert keys(s3, f"{PREFIX}9158/") == [f"{PREFIX}9158/{stateStore.BASE_NAME}"]
+    assert ShardedStateStore(s3, BUCKET, PREFIX).load("9158") == {"a", "b", "c"}
+
+
+def test_compaction_keeps_deltas_written_while_it_runs():
+    s3 = InterleavingS3()
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    for item in ("a", "b"):
+        state.add("9158", item)
+        state.flush()
+
+    def late_writer():
+        other = ShardedStateStore(s3, BUCKET, PREFIX)
+        other.add("9158", "late")
+        other.flush()
+
+    s3.before_base = late_writer
+    assert state.compact("9158")
+
+    # The late delta was not folded into the base, so it must not have been deleted either
+    assert len(keys(s3, f"{PREFIX}9158/")) == 2
+    assert ShardedStateStore(s3, BUCKET, PREFIX).load("9158") == {"a", "b", "late"}
+
+
+def test_compaction_that_loses_the_base_race_merges_again():
+    s3 = InterleavingS3()
+    state = ShardedStateStore(s3, BUCKET, PREFIX)
+    state.add("9158", "a")
+    state.flush()
+
+    def concurrent_compaction():
+        # Another compaction wrote a base first, folding in a delta it then deleted
+        s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}9158/{stateStore.BASE_NAME}", Body=json.dumps(["z"]))
+
+    s3.before_base = concurrent_compaction
+    assert state.compact("9158")
+
+    base = s3.get_object(Bucket=BUCKET, Key=f"{PREFIX}9158/{stateStore.BASE_NAME}")
+    assert json.loads(base["Body"].read()) == ["a", "z"]
+    assert ShardedStateStore(s3, BUCKET, PREFIX).load("9158") == {"a", "z"}
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+import transformation
+from rawCodec import put_records
+from stateStore import ShardedStateStore
+from storageBackends import InMemoryS3, InMemorySQS
+
+BUCKET = transformation.S3_BUCKET
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    s3 = InMemoryS3()
+    monkeypatch.setattr(transformation, "s3", s3)
+    monkeypatch.setattr(transformation, "sqs", InMemorySQS())
+    return s3
+
+
+def event(*bodies):
+    return {"Records": [
+        {"messageId": f"m{i}", "body": json.dumps(body), "attributes": {"ApproximateReceiveCount": "1"}}
+        for i, body in enumerate(bodies)
+    ]}
+
+
+def failures(response):
+    return [failure["itemIdentifier"] for failure in response["batchItemFailures"]]
+
+
+def transformed(s3, raw_key):
+    return ShardedStateStore(s3, BUCKET, transformation.STATE_PREFIX).contains(transformation.state_shard(raw_key), raw_key)
+
+
+def put_meeting(s3, meeting_key):
+    return put_records(s3, BUCKET, f"raw_data/meetings_raw/{meeting_key}/meetings_2025-03-16",
+                       [{"meeting_key": meeting_key, "meeting_name": "Australian Grand Prix"}])
+
+
+def put_laps(s3, session_key, driver_number):
+    return put_records(s3, BUCKET, f"raw_data/laps_raw/{session_key}/{driver_number}/laps_2025-03-16", [
+        {"session_key": session_key, "driver_number": driver_number, "lap_number": lap,
+         "duration_sector_1": 30.1, "duration_sector_2": 25.4, "duration_sector_3": 28.0}
+        for lap in (1, 2, 3)
+    ])
+
+
+def test_failed_raw_key_retries_only_its_message(s3):
+    good = put_meeting(s3, 1229)
+    missing = "raw_data/meetings_raw/1230/meetings_2025-03-16.ndjson.gz"
+
+    response = transformation.lambda_handler(event({"raw_keys": [good]}, {"raw_keys": [missing]}), None)
+
+    assert failures(response) == ["m1"]
+    assert transformed(s3, good)
+    assert not transformed(s3, missing)
+
+
+def test_unreadable_message_is_dead_lettered(s3):
+    response = transformation.lambda_handler({"Records": [{"messageId": "m0", "body": "not json"}]}, None)
+
+    assert failures(response) == []
+    assert ("f1-75", "dead_letters/transformation/m0.json") in s3.objects
+
+
+def test_failed_derived_update_retries_the_messages_behind_it(s3, monkeypatch):
+    def broken(driver_laps):
+        raise RuntimeError("out of memory")
+
+    monkeypatch.setattr(transformation, "update_sector_stats", broken)
+    monkeypatch.setattr(transformation, "update_laps_weather", lambda driver_laps: [])
+    laps = put_laps(s3, 9158, 1)
+    meeting = put_meeting(s3, 1229)
+
+    response = transformation.lambda_handler(event({"raw_keys": [laps]}, {"raw_keys": [meeting]}), None)
+
+    assert failures(response) == ["m0"]
+    # The laps file is transformed again on the retry, which rebuilds its sector stats
+    assert not transformed(s3, laps)
+    assert transformed(s3, meeting)
+
+
+def test_failed_key_from_a_direct_s3_event_raises(s3):
+    missing = "raw_data/meetings_raw/1230/meetings_2025-03-16.ndjson.gz"
+    s3_event = {"Records": [{
+        "eventSource": "aws:s3", "eventName": "ObjectCreated:Put", "s3": {"object": {"key": missing}}
+    }]}
+
+    with pytest.raises(RuntimeError):
+        transformation.lambda_handler(s3_event, None)